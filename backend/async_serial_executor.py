@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+asyncio serial transport for AIConsole
+Drives many consoles from one event loop using non-blocking tty reads
+
+This is the lean path for fanning simple batches out to many serial ports:
+it shares prompt, pager and error detection with SerialExecutor, but has no
+username or network logins, no separation of console log messages from
+output, no mode prediction (the mode is only read off prompts, so latencies
+are classed as in SerialExecutor) and none of the delta, transaction, show
+cache or spooling features. Use SerialExecutor for anything beyond plain batches.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import sys
+import termios
+import time
+import tty
+
+from latency_model import DEFAULT_PROFILE_PATH, LatencyModel
+from serial_executor import (MORE_BYTES_PATTERN, PAGER_OVERLAP, PROMPT_PATTERN, PROMPT_WINDOW,
+                             mode_from_prompt, response_has_error)
+from transports import device_key
+
+READ_CHUNK_SIZE = 4096
+
+def is_login_prompt(response):
+    """Return True once the device asks for a password or shows a CLI prompt"""
+    return 'assword:' in response or PROMPT_PATTERN.search(response) is not None
+
+class AsyncSerialExecutor:
+    def __init__(self, port='/dev/ttyUSB0', baudrate=9600, timeout=3, password='',
+                 command_timeout=10, latency_model=None):
+        """Initialize serial connection parameters; deadlines come from latency_model as in SerialExecutor"""
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.password = password
+        self.command_timeout = command_timeout
+        self.latency_model = latency_model if latency_model is not None else LatencyModel()
+        self.fd = None
+        self.loop = None
+        self.authenticated = False
+        self.last_prompt = None
+        self.mode = None
+        self.last_command_time = 0.0
+        self.paging_disabled = False
+        self._pending = bytearray()
+        self._data_ready = None
+
+    def open_port(self):
+        """Open the tty non-blocking in raw 8N1 mode and register it with the event loop"""
+        speed = getattr(termios, f'B{self.baudrate}', None)
+        if speed is None:
+            raise ValueError(f"Unsupported baud rate {self.baudrate}")
+
+        self.fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            # The same lock as serial.Serial(exclusive=True) in the other executors
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self.fd)
+            self.fd = None
+            raise OSError(f"Port {self.port} is already in use") from None
+        tty.setraw(self.fd)
+        attrs = termios.tcgetattr(self.fd)
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        termios.tcflush(self.fd, termios.TCIOFLUSH)
+
+        self.loop = asyncio.get_running_loop()
+        self._data_ready = asyncio.Event()
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            # Device went away; wake the reader so its deadline handling takes over
+            self.loop.remove_reader(self.fd)
+            self._data_ready.set()
+            return
+        self._pending += data
+        self._data_ready.set()
+
+    def _take_pending(self):
+        data = bytes(self._pending)
+        self._pending.clear()
+        self._data_ready.clear()
+        return data
+
+    async def _wait_writable(self):
+        ready = self.loop.create_future()
+        self.loop.add_writer(self.fd, ready.set_result, None)
+        try:
+            await ready
+        finally:
+            self.loop.remove_writer(self.fd)
+
+    async def write(self, data):
+        """Write all of data without blocking the event loop"""
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                await self._wait_writable()
+
+    async def read_until(self, is_done, timeout):
+        """Read until is_done(tail) holds or the timeout passes.
+
+        tail is the decoded last PROMPT_WINDOW bytes of the output. As in
+        SerialExecutor, only newly arrived bytes are scanned and the output is
+        decoded once at the end. Returns a tuple (response, done).
+        """
+        received = bytearray()
+
+        async def reader():
+            while True:
+                if not self._pending:
+                    await self._data_ready.wait()
+                scan_start = max(0, len(received) - PAGER_OVERLAP)
+                received.extend(self._take_pending())
+
+                # Fallback when paging is still on: answer --More-- and drop it from the output
+                if received.find(b'--More--', scan_start) != -1 or received.find(b'\x08', scan_start) != -1:
+                    if received[-PROMPT_WINDOW:].rstrip().endswith(b'--More--'):
+                        await self.write(b' ')
+                    received[scan_start:] = MORE_BYTES_PATTERN.sub(b'', received[scan_start:])
+
+                if is_done(received[-PROMPT_WINDOW:].decode('utf-8', errors='ignore')):
+                    return True
+
+        try:
+            done = await asyncio.wait_for(reader(), timeout)
+        except asyncio.TimeoutError:
+            done = False
+        return received.decode('utf-8', errors='ignore'), done
+
+    async def read_until_prompt(self, timeout):
+        """Read until the device prints a prompt; returns (response, prompt_seen)"""
+        response, prompt_seen = await self.read_until(
+            lambda text: PROMPT_PATTERN.search(text) is not None, timeout)
+        if prompt_seen:
+            match = PROMPT_PATTERN.search(response[-PROMPT_WINDOW:])
+            self.last_prompt = match.group(0).strip()
+            self.mode = mode_from_prompt(match.group(2), match.group(3))
+        else:
+            self.mode = None
+        return response, prompt_seen
+
+    async def connect(self):
+        """Establish serial connection and authenticate"""
+        try:
+            self.open_port()
+
+            # Wake the device, waiting on output rather than fixed sleeps
+            initial_output = ""
+            for _ in range(3):
+                await self.write(b'\r\n')
+                output, ready = await self.read_until(is_login_prompt, self.timeout)
+                initial_output += output
+                if ready:
+                    break
+
+            # Check if password is required
+            if 'Password:' in initial_output or 'password:' in initial_output:
+                await self.write(f"{self.password}\r\n".encode('utf-8'))
+                auth_response, _ = await self.read_until(is_login_prompt, self.timeout)
+
+                # Check if we got to a prompt
+                if PROMPT_PATTERN.search(auth_response):
+                    self.authenticated = True
+
+                    # Try to enter privileged mode
+                    await self.write(b"enable\r\n")
+                    enable_response, _ = await self.read_until(is_login_prompt, self.timeout)
+
+                    # If it asks for password again, send empty
+                    if 'Password:' in enable_response:
+                        await self.write(f"{self.password}\r\n".encode('utf-8'))
+                        await self.read_until_prompt(self.timeout)
+            else:
+                # No password required, try to get to prompt
+                self.authenticated = True
+
+            await self.disable_paging()
+            return True
+        except Exception as e:
+            print(f"Connection error: {e}", file=sys.stderr)
+            return False
+
+    async def disable_paging(self):
+        """Turn off the pager once per session so long output arrives in one pass"""
+        if self.paging_disabled:
+            return
+        await self.send_command("terminal length 0")
+        await self.send_command("terminal width 0")
+        self.paging_disabled = True
+
+    async def get_current_prompt(self):
+        """Get the current prompt from the switch (e.g., Switch>, Switch#, Switch(config)#)"""
+        if self.fd is None:
+            return "Switch>"
+
+        self._take_pending()
+        await self.write(b"\r\n")
+        _, prompt_seen = await self.read_until_prompt(2)
+        return self.last_prompt if prompt_seen else "Switch>"
+
+    async def send_command(self, command, timeout=None):
+        """Send single command and read the response up to the next prompt"""
+        self.last_command_time = 0.0
+        if self.fd is None:
+            return "No connection established"
+
+        try:
+            self._take_pending()
+            mode = self.mode
+            if timeout is None:
+                timeout = self.latency_model.deadline(device_key(self.port), command, mode,
+                                                      default=self.command_timeout)
+            start_time = time.monotonic()
+            await self.write(f"{command}\r\n".encode('utf-8'))
+            response, prompt_seen = await self.read_until_prompt(timeout)
+            self.last_command_time = time.monotonic() - start_time
+            self.latency_model.observe(device_key(self.port), command, mode, self.last_command_time,
+                                       timed_out=not prompt_seen)
+
+            return response.strip() if response else "No response from device"
+        except OSError as e:
+            return f"Command error: {e}"
+
+    async def iter_commands(self, commands_string):
+        """Execute commands on the open connection, yielding each result as its prompt returns"""
+        commands = [cmd.strip() for cmd in commands_string.split('\n') if cmd.strip()]
+
+        for command in commands:
+            response = await self.send_command(command)
+            yield {
+                "command": command,
+                "response": response,
+                "elapsed": round(self.last_command_time, 3),
+                "error": response_has_error(response)
+            }
+
+    async def run_commands(self, commands_string):
+        """Execute multiple commands on the already open connection"""
+        try:
+            current_prompt = await self.get_current_prompt()
+            results = [result async for result in self.iter_commands(commands_string)]
+            return {
+                "success": True,
+                "results": results,
+                "initial_prompt": current_prompt
+            }
+        except OSError as e:
+            return {"success": False, "error": str(e)}
+
+    async def execute_commands(self, commands_string):
+        """Execute multiple commands from string"""
+        if not await self.connect():
+            self.close()
+            return {"success": False, "error": "Failed to connect"}
+
+        try:
+            return await self.run_commands(commands_string)
+        finally:
+            self.close()
+
+    def close(self):
+        """Unregister and close the tty"""
+        if self.fd is not None:
+            if self.loop:
+                self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+        self.fd = None
+        self.authenticated = False
+        self.paging_disabled = False
+        self.mode = None
+        self._pending.clear()
+        self.latency_model.save()
+
+async def execute_many(batches, **executor_options):
+    """Run {port: commands_string} concurrently on one event loop"""
+    async def run_device(port, commands_string):
+        start_time = time.monotonic()
+        result = await AsyncSerialExecutor(port=port, **executor_options).execute_commands(commands_string)
+        result["elapsed"] = round(time.monotonic() - start_time, 3)
+        return port, result
+
+    start_time = time.monotonic()
+    devices = dict(await asyncio.gather(*(run_device(port, commands) for port, commands in batches.items())))
+    return {
+        "success": all(result.get("success") for result in devices.values()),
+        "devices": devices,
+        "elapsed": round(time.monotonic() - start_time, 3)
+    }
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Execute command batches on serial consoles with asyncio")
+    parser.add_argument('batches', help='JSON file mapping port to commands, e.g. {"/dev/ttyUSB0": "show version"}')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--latency-profile', default=DEFAULT_PROFILE_PATH,
+                        help="JSON file of learned command latencies ('' keeps them in memory)")
+    args = parser.parse_args()
+
+    with open(args.batches) as f:
+        batches = json.load(f)
+
+    result = asyncio.run(execute_many(batches, password=args.password,
+                                      latency_model=LatencyModel(args.latency_profile or None)))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
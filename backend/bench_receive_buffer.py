@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Receive-path benchmark for AIConsole
+Compares string concatenation with full rescans against the bytearray
+receive buffer used by SerialExecutor.read_until_prompt. The gain is CPU
+time: both paths hold an unspooled output once as bytes and once decoded,
+so their peak memory is about the same. retained_bytes is what the
+receive path still holds once the reply has been returned.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from serial_executor import MORE_PATTERN, PROMPT_PATTERN, SerialExecutor
+
+class ReplayConnection:
+    """In-memory stand-in for serial.Serial that hands out a canned reply in chunks"""
+
+    def __init__(self, payload, chunk_size):
+        self.payload = payload
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.timeout = None
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk_size, len(self.payload) - self.offset)
+
+    def read(self, size):
+        data = self.payload[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        return len(data)
+
+def legacy_read_until_prompt(connection, deadline):
+    """The previous receive loop: decode every chunk and rescan the whole string"""
+    response = ""
+    while time.monotonic() < deadline:
+        data = connection.read(max(1, connection.in_waiting))
+        if not data:
+            continue
+        response += data.decode('utf-8', errors='ignore')
+        if '--More--' in response or '\x08' in response:
+            response = MORE_PATTERN.sub('', response)
+        if PROMPT_PATTERN.search(response):
+            return response, True
+    return response, False
+
+def build_payload(size):
+    """A 'show mac address-table' style reply of roughly size bytes ending in a prompt"""
+    line = b"  10    0011.2233.4455    DYNAMIC     Gi1/0/24\r\n"
+    return line * (size // len(line)) + b"SW-Office-Main#"
+
+def measure(read, payload, chunk_size):
+    connection = ReplayConnection(payload, chunk_size)
+    tracemalloc.start()
+    cpu_start = time.process_time()
+    response, prompt_seen, retained = read(connection)
+    cpu = time.process_time() - cpu_start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert prompt_seen and response.endswith("SW-Office-Main#")
+    return {"cpu_seconds": round(cpu, 4), "peak_bytes": peak, "retained_bytes": retained}
+
+def run(size, chunk_size):
+    payload = build_payload(size)
+
+    def legacy(connection):
+        return legacy_read_until_prompt(connection, time.monotonic() + 600) + (0,)
+
+    def buffered(connection):
+        executor = SerialExecutor()
+        executor.connection = connection
+        response, prompt_seen = executor.read_until_prompt(time.monotonic() + 600)
+        return response, prompt_seen, len(executor.receive_buffer)
+
+    return {
+        "output_bytes": len(payload),
+        "chunk_bytes": chunk_size,
+        "legacy": measure(legacy, payload, chunk_size),
+        "receive_buffer": measure(buffered, payload, chunk_size)
+    }
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Benchmark the serial receive path")
+    parser.add_argument('--size', type=int, default=1024 * 1024, help="Output size in bytes")
+    parser.add_argument('--chunk', type=int, default=1024, help="Bytes available per read")
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.chunk), indent=2))
+
+if __name__ == "__main__":
+    main()
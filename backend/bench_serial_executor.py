@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Serial executor benchmark suite for AIConsole
+Runs representative workloads against the simulated console and reports
+latency percentiles, throughput and connect time as JSON
+"""
+
+import argparse
+import json
+import math
+import platform
+import time
+
+from device_simulator import start_simulator
+from serial_executor import SerialExecutor, response_has_error
+
+WORKLOADS = ('single_show', 'config_push', 'running_config_dump', 'error_batch')
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values (fraction in 0..1)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(latencies, total_bytes, elapsed, errors):
+    return {
+        "commands": len(latencies),
+        "errors": errors,
+        "p50": round(percentile(latencies, 0.50), 6),
+        "p95": round(percentile(latencies, 0.95), 6),
+        "p99": round(percentile(latencies, 0.99), 6),
+        "max": round(max(latencies), 6),
+        "commands_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "bytes": total_bytes,
+        "bytes_per_second": round(total_bytes / elapsed, 1) if elapsed else None,
+        "elapsed": round(elapsed, 6)
+    }
+
+def config_push_commands(lines=50):
+    """A config batch of the given length: VLAN definitions with names"""
+    commands = ["configure terminal"]
+    vlan = 100
+    while len(commands) < lines - 1:
+        commands += [f"vlan {vlan}", f"name BENCH-{vlan}"]
+        vlan += 1
+    commands = commands[:lines - 1] + ["end"]
+    return commands
+
+def error_batch_commands(lines=50):
+    """Alternate valid shows with rejected and incomplete commands"""
+    pool = ["show clock", "show vrsion", "show ip interface brief", "show", "interface gi0/99", "show arp"]
+    return [pool[index % len(pool)] for index in range(lines)]
+
+def dump_config(vlans):
+    """Config text that makes 'show running-config' about 3 lines per VLAN long"""
+    return '\n'.join(f"vlan {vlan}\n name DUMP-{vlan}" for vlan in range(2, vlans + 2))
+
+def run_batch(executor, commands, iterations):
+    latencies = []
+    total_bytes = 0
+    errors = 0
+    start_time = time.monotonic()
+    for _ in range(iterations):
+        for command in commands:
+            response = executor.send_command(command)
+            latencies.append(executor.last_command_time)
+            total_bytes += len(response)
+            errors += response_has_error(response)
+    return summarize(latencies, total_bytes, time.monotonic() - start_time, errors)
+
+def run_workload(name, iterations, device_options, executor_options):
+    device_options = dict(device_options)
+    if name == 'running_config_dump':
+        device_options.setdefault('mac_entries', 0)
+    console = start_simulator(**device_options)
+    try:
+        if name == 'running_config_dump':
+            # ~10k lines of running-config
+            console.device.load_config(dump_config(3300))
+
+        executor = SerialExecutor(port=console.port, **executor_options)
+        connect_start = time.monotonic()
+        if not executor.connect():
+            return {"success": False, "error": "Failed to connect"}
+        connect_time = time.monotonic() - connect_start
+
+        try:
+            executor.send_command("enable")
+            if name == 'single_show':
+                result = run_batch(executor, ["show version"], iterations)
+            elif name == 'config_push':
+                result = run_batch(executor, config_push_commands(), iterations)
+            elif name == 'running_config_dump':
+                result = run_batch(executor, ["show running-config"], iterations)
+            else:
+                result = run_batch(executor, error_batch_commands(), iterations)
+        finally:
+            executor.close()
+
+        result["connect_time"] = round(connect_time, 6)
+        result["success"] = True
+        return result
+    finally:
+        console.stop()
+
+def compare(report, baseline):
+    """Ratio of each metric to the same metric in a previous report (>1 means larger now)"""
+    changes = {}
+    for name, result in report["workloads"].items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous or not result.get("success") or not previous.get("success"):
+            continue
+        changes[name] = {
+            metric: round(result[metric] / previous[metric], 3)
+            for metric in ("p50", "p95", "p99", "commands_per_second", "bytes_per_second", "connect_time")
+            if result.get(metric) and previous.get(metric)
+        }
+    return changes
+
+def run(workloads, iterations, latency, baudrate, command_timeout):
+    device_options = {"latency": latency, "baudrate": baudrate}
+    executor_options = {"baudrate": baudrate or 9600, "command_timeout": command_timeout}
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "iterations": iterations,
+            "latency": latency,
+            "baudrate": baudrate,
+            "command_timeout": command_timeout
+        },
+        "workloads": {name: run_workload(name, iterations, device_options, executor_options)
+                      for name in workloads}
+    }
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Benchmark SerialExecutor against the simulated console")
+    parser.add_argument('--workload', action='append', choices=WORKLOADS,
+                        help="Workload to run (repeatable; default: all)")
+    parser.add_argument('--iterations', type=int, default=20, help="Repetitions of each workload's batch")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated per-command device latency")
+    parser.add_argument('--baudrate', type=int, help="Simulated console line speed (default: unthrottled)")
+    parser.add_argument('--command-timeout', type=float, default=120)
+    parser.add_argument('--output', help="Write the JSON report to this file as well as stdout")
+    parser.add_argument('--baseline', help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run(args.workload or WORKLOADS, args.iterations, args.latency, args.baudrate, args.command_timeout)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["compared_to_baseline"] = compare(report, json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+if __name__ == "__main__":
+    main()
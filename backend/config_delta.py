@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Running-config delta engine for AIConsole
+Compares intended config commands with the device's running-config and
+keeps only the lines that would change something
+"""
+
+import argparse
+import json
+import re
+from collections import OrderedDict, namedtuple
+from itertools import islice
+
+# A planned command and why it is not sent (None when it is sent)
+PlannedCommand = namedtuple('PlannedCommand', 'command skip_reason')
+
+# Interface types, most common first, for expanding abbreviations such as 'gi0/1'
+INTERFACE_TYPES = ('GigabitEthernet', 'FastEthernet', 'TenGigabitEthernet', 'Ethernet', 'Vlan',
+                   'Port-channel', 'Loopback', 'Tunnel')
+
+# Section headers in global config: (keyword, shortest abbreviation)
+SECTION_KEYWORDS = (('interface', 3), ('vlan', 2), ('line', 2), ('router', 3))
+
+INTERFACE_PATTERN = re.compile(r'^([A-Za-z][A-Za-z-]*)\s*(\d+(?:/\d+)*(?:\.\d+)?)$')
+RANGE_ITEM_PATTERN = re.compile(r'^([A-Za-z][A-Za-z-]*)\s*((?:\d+/)*)(\d+)(?:\s*-\s*(\d+))?$')
+BANNER_PATTERN = re.compile(r'^banner\s+(\S+)\s+(\^C|\S)(.*?)(?:\2)?\s*$', re.DOTALL)
+
+# Interfaces that can be deleted with 'no interface'; physical ones can only be reset
+VIRTUAL_INTERFACES = ('Vlan', 'Loopback', 'Port-channel', 'Tunnel')
+
+# Lines that the running-config shows when they are set and omits when they
+# are not, so 'no X' with X absent changes nothing. Defaults that are on
+# (ip domain-lookup, cdp run, ...) only ever show up as 'no X'.
+SHOWN_WHEN_SET = ('shutdown', 'description', 'switchport access vlan', 'switchport port-security',
+                  'switchport nonegotiate', 'spanning-tree portfast', 'channel-group', 'name',
+                  'vlan', 'interface', 'ip route', 'username', 'banner', 'logging host', 'ntp server')
+
+SKIP_PRESENT = "already in running-config"
+SKIP_NO_CHANGES = "no changes in this config block"
+SKIP_SECTION_UNCHANGED = "section unchanged"
+
+def is_keyword(word, keyword, min_length):
+    return len(word) >= min_length and keyword.startswith(word)
+
+def canonical_interface(text):
+    """'gi0/1', 'vlan 99' or 'GigabitEthernet0/1' -> 'GigabitEthernet0/1' (None if not an interface)"""
+    match = INTERFACE_PATTERN.match(text.strip())
+    if not match:
+        return None
+    kind = match.group(1).lower()
+    for full in INTERFACE_TYPES:
+        if full.lower().startswith(kind):
+            return full + match.group(2)
+    return None
+
+def expand_interface_range(text):
+    """Member interfaces of 'gi0/1 - 10, gi0/12', or None if the range cannot be read"""
+    members = []
+    for item in text.split(','):
+        match = RANGE_ITEM_PATTERN.match(item.strip())
+        if not match:
+            return None
+        kind, slot, first, last = match.groups()
+        for number in range(int(first), int(last or first) + 1):
+            name = canonical_interface(f'{kind}{slot}{number}')
+            if name is None:
+                return None
+            members.append(name)
+    return members
+
+def canonical(line):
+    """Normalize a config line so that typed and running-config forms compare equal"""
+    words = line.split()
+    if not words:
+        return ''
+    if words[0] == 'no' and len(words) > 1:
+        return 'no ' + canonical(' '.join(words[1:]))
+    if words[0] == 'banner':
+        match = BANNER_PATTERN.match(line.strip())
+        if match:
+            return f'banner {match.group(1)} ^C{match.group(3)}^C'
+    if is_keyword(words[0].lower(), 'interface', 3) and len(words) > 1:
+        if words[1].lower() == 'range':
+            return 'interface range ' + ' '.join(words[2:])
+        name = canonical_interface(' '.join(words[1:]))
+        if name:
+            return f'interface {name}'
+    return ' '.join(words)
+
+def parse_config(text):
+    """Parse running-config text into a tree: OrderedDict of canonical line -> children
+
+    text is a string or a re-iterable of lines, such as a spooled output.
+    The echoed command and trailing prompt of a raw 'show running-config'
+    reply are ignored: parsing starts after the 'Current configuration'
+    header when there is one and stops at 'end'.
+    """
+    root = OrderedDict()
+    stack = [(-1, root)]
+    if isinstance(text, str):
+        text = text.splitlines()
+    start = next((index + 1 for index, raw in enumerate(text) if raw.startswith('Current configuration')), 0)
+    lines = islice(text, start, None)
+    for raw in lines:
+        line = raw.rstrip()
+        stripped = line.strip()
+        if line == 'end':
+            break
+        if not stripped or stripped.startswith('!') or stripped.startswith('Building configuration'):
+            continue
+        depth = len(line) - len(line.lstrip(' '))
+
+        if depth == 0 and stripped.startswith('banner '):
+            # Multi-line banners run until the delimiter comes back
+            match = BANNER_PATTERN.match(stripped)
+            delimiter = match.group(2) if match else None
+            body = stripped
+            while delimiter and body.count(delimiter) < 2:
+                try:
+                    body += '\n' + next(lines)
+                except StopIteration:
+                    break
+            stripped = body
+
+        while stack[-1][0] >= depth:
+            stack.pop()
+        children = OrderedDict()
+        stack[-1][1][canonical(stripped)] = children
+        stack.append((depth, children))
+    return root
+
+def has_line(children, line):
+    """Return True if line would not change a section whose current lines are children"""
+    line = canonical(line)
+    if line in children:
+        return True
+    if line.startswith('no '):
+        # 'no X' is a no-op when X is not configured, if X would show when it is
+        target = line[3:]
+        if not any(target == setting or target.startswith(setting + ' ') for setting in SHOWN_WHEN_SET):
+            return False
+        return not any(existing == target or existing.startswith(target + ' ') for existing in children)
+    return False
+
+class DeltaPlanner:
+    """Walks a batch, tracking the config level, and decides which lines to send"""
+
+    def __init__(self, running):
+        self.running = running
+        self.plan = []
+        self.level = 'exec'
+        self.block_start = None
+        self.block_sent = False
+        self.section = None
+
+    def send(self, command):
+        self.plan.append(PlannedCommand(command, None))
+        if self.level != 'exec':
+            self.block_sent = True
+
+    def skip(self, command, reason):
+        self.plan.append(PlannedCommand(command, reason))
+
+    def open_section(self, command):
+        header = canonical(command)
+        if header.startswith('interface range '):
+            members = expand_interface_range(header[len('interface range '):])
+            sections = None if members is None else [self.running.get(f'interface {name}') for name in members]
+        else:
+            sections = [self.running.get(header)]
+        # The header keeps its place in the plan; it is only sent once the section changes
+        self.section = {
+            "index": len(self.plan),
+            "sections": sections,
+            "sent": False
+        }
+        self.skip(command, SKIP_SECTION_UNCHANGED)
+        self.level = 'section'
+
+    def send_section_header(self):
+        if not self.section["sent"]:
+            index = self.section["index"]
+            self.plan[index] = PlannedCommand(self.plan[index].command, None)
+            self.block_sent = True
+            self.section["sent"] = True
+
+    def close_section(self):
+        """Leave the current section, creating it if it does not exist yet"""
+        section = self.section
+        if section is None:
+            return False
+        sections = section["sections"]
+        if sections is None or any(children is None for children in sections):
+            self.send_section_header()
+        self.section = None
+        return section["sent"]
+
+    def section_child(self, command):
+        sections = self.section["sections"] if self.section else None
+        if sections is not None and all(children is not None and has_line(children, command)
+                                        for children in sections):
+            self.skip(command, SKIP_PRESENT)
+            return
+        if self.section:
+            self.send_section_header()
+        self.send(command)
+
+    def leave_config(self, command):
+        self.close_section()
+        if self.block_start is not None and not self.block_sent:
+            start = self.block_start
+            self.plan[start] = PlannedCommand(self.plan[start].command, SKIP_NO_CHANGES)
+            self.skip(command, SKIP_NO_CHANGES)
+        else:
+            self.send(command)
+        self.level = 'exec'
+        self.block_start = None
+
+    def step(self, command):
+        words = command.lower().split()
+        first = words[0] if words else ''
+
+        if self.level == 'exec':
+            if is_keyword(first, 'configure', 4) and (len(words) == 1 or is_keyword(words[1], 'terminal', 1)):
+                self.block_start = len(self.plan)
+                self.block_sent = False
+                self.level = 'config'
+                self.plan.append(PlannedCommand(command, None))
+            else:
+                self.send(command)
+            return
+
+        if first == 'end':
+            self.leave_config(command)
+        elif first == 'do':
+            self.send(command)
+        elif is_keyword(first, 'exit', 3):
+            if self.level == 'section':
+                if self.close_section():
+                    self.send(command)
+                else:
+                    self.skip(command, SKIP_SECTION_UNCHANGED)
+                self.level = 'config'
+            else:
+                self.leave_config(command)
+        elif len(words) > 1 and any(is_keyword(first, keyword, length) for keyword, length in SECTION_KEYWORDS):
+            self.close_section()
+            self.open_section(command)
+        elif self.level == 'section':
+            self.section_child(command)
+        elif has_line(self.running, command):
+            self.skip(command, SKIP_PRESENT)
+        else:
+            self.send(command)
+
+    def finish(self):
+        self.close_section()
+        return self.plan
+
+def plan_delta(running, commands):
+    """Plan a batch against a parsed running-config.
+
+    Returns a PlannedCommand per input command, in order. A section header
+    is sent when the section is new or one of its lines is; otherwise it is
+    skipped as SKIP_SECTION_UNCHANGED. Commands outside configure blocks
+    are always sent.
+    """
+    planner = DeltaPlanner(running)
+    for command in commands:
+        planner.step(command)
+    return planner.finish()
+
+def negate(line):
+    """The config line that undoes line"""
+    if line.startswith('no '):
+        return line[3:]
+    if line.startswith('banner '):
+        return 'no ' + ' '.join(line.split()[:2])
+    return 'no ' + line
+
+def is_removable_section(header):
+    if header.startswith(('vlan ', 'router ')):
+        return True
+    return header.startswith('interface ') and header[len('interface '):].startswith(VIRTUAL_INTERFACES)
+
+def restore_commands(target, current):
+    """Config-mode lines that turn the current running-config tree into target.
+
+    Lines only in current are negated, then lines only in target are added;
+    sections are entered once for both and left with 'exit'.
+    """
+    commands = []
+    for line, children in current.items():
+        if line in target:
+            continue
+        if is_removable_section(line):
+            commands.append(negate(line))
+        elif children:
+            commands += [line] + [negate(child) for child in children] + ['exit']
+        else:
+            commands.append(negate(line))
+
+    for line, children in target.items():
+        current_children = current.get(line)
+        if current_children is None:
+            commands += [line] + list(children) + ['exit'] if children else [line]
+            continue
+        additions = [child for child in children if child not in current_children]
+        # A disabled default ('no X') is undone by the X line being added
+        removals = [negate(child) for child in current_children
+                    if child not in children and not (child.startswith('no ') and
+                                                      any(added.startswith(child[3:]) for added in additions))]
+        if removals or additions:
+            commands += [line] + removals + additions + ['exit']
+    return commands
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Show which config lines would change a saved running-config")
+    parser.add_argument('running_config', help="File with 'show running-config' output")
+    parser.add_argument('commands', help="File with the intended commands, one per line")
+    args = parser.parse_args()
+
+    with open(args.running_config) as f:
+        running = parse_config(f.read())
+    with open(args.commands) as f:
+        commands = [line.strip() for line in f if line.strip()]
+
+    plan = plan_delta(running, commands)
+    print(json.dumps({
+        "send": [item.command for item in plan if item.skip_reason is None],
+        "skipped": [item._asdict() for item in plan if item.skip_reason is not None]
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+pytest fixtures for the AIConsole backend
+Tests drive the simulated IOS device in device_simulator.py, never real hardware
+"""
+
+import pytest
+
+from device_simulator import start_simulator
+from latency_model import LatencyModel
+from serial_executor import SerialExecutor
+
+# Manual scripts that talk to a switch on /dev/ttyUSB0 as soon as they are imported
+collect_ignore = ['test_serial.py']
+
+@pytest.fixture
+def simulator():
+    """A simulated switch on a fresh pty"""
+    console = start_simulator(hostname='SW1')
+    yield console
+    console.stop()
+
+@pytest.fixture
+def executor(simulator):
+    """A connected executor on the simulator, in privileged mode, with an in-memory latency model"""
+    executor = SerialExecutor(port=simulator.port, latency_model=LatencyModel())
+    assert executor.connect()
+    executor.send_command("enable")
+    yield executor
+    executor.close()
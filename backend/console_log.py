@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unsolicited console message handling for AIConsole
+Recognizes IOS log lines (%FACILITY-SEVERITY-MNEMONIC) printed in the middle
+of command output and keeps them in a bounded stream of their own
+"""
+
+import re
+import threading
+import time
+from collections import deque, namedtuple
+
+# A log line, as separated from the console output
+LogMessage = namedtuple('LogMessage', 'facility severity mnemonic text timestamp sequence received_at')
+
+# Optional sequence number / timestamp prefix ("000123: *Oct 17 06:34:18.123: "),
+# then %FACILITY-SEVERITY-MNEMONIC: text, up to and including the line break
+LOG_LINE_PATTERN = re.compile(
+    rb'^(?:(?P<sequence>\d+):[ \t]+)?(?:(?P<timestamp>[^\r\n%]{1,64}?):[ \t]+)?'
+    rb'%(?P<facility>[A-Z][A-Z0-9_]*)-(?P<severity>[0-7])-(?P<mnemonic>[A-Z][A-Z0-9_]*):'
+    rb'[ \t]*(?P<text>[^\r\n]*)\r?\n', re.MULTILINE)
+
+SEVERITY_NAMES = ('emergencies', 'alerts', 'critical', 'errors', 'warnings', 'notifications',
+                  'informational', 'debugging')
+
+DEFAULT_MAX_MESSAGES = 1000
+
+def message_from_match(match):
+    """Build a LogMessage from a LOG_LINE_PATTERN match"""
+    timestamp = match.group('timestamp')
+    sequence = match.group('sequence')
+    return LogMessage(match.group('facility').decode('ascii'), int(match.group('severity')),
+                      match.group('mnemonic').decode('ascii'),
+                      match.group('text').decode('utf-8', errors='ignore').rstrip(),
+                      timestamp.decode('utf-8', errors='ignore').strip() if timestamp else None,
+                      int(sequence) if sequence else None, time.time())
+
+def parse_log_line(line):
+    """LogMessage for one console line, or None if it is not a log message"""
+    if isinstance(line, str):
+        line = line.encode('utf-8')
+    match = LOG_LINE_PATTERN.match(line.rstrip(b'\r\n') + b'\n')
+    return message_from_match(match) if match else None
+
+def message_as_dict(message):
+    entry = message._asdict()
+    entry["severity_name"] = SEVERITY_NAMES[message.severity]
+    return entry
+
+class ConsoleLog:
+    def __init__(self, max_messages=DEFAULT_MAX_MESSAGES, callback=None):
+        """Bounded stream of log messages; the oldest are dropped when it is full.
+
+        callback(message) is called for every message as it is separated
+        from the output, on the reading thread; it should return quickly.
+        """
+        self.max_messages = max_messages
+        self.callback = callback
+        self.messages = deque()
+        self.condition = threading.Condition()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, message):
+        with self.condition:
+            if len(self.messages) >= self.max_messages:
+                self.messages.popleft()
+                self.dropped += 1
+            self.messages.append(message)
+            self.received += 1
+            self.condition.notify()
+        if self.callback is not None:
+            try:
+                self.callback(message)
+            except Exception:
+                pass
+
+    def get(self, timeout=None):
+        """Remove and return the oldest message, waiting up to timeout; None if there is none"""
+        with self.condition:
+            if not self.messages and not self.condition.wait_for(lambda: self.messages, timeout):
+                return None
+            return self.messages.popleft()
+
+    def drain(self):
+        """Remove and return every queued message, oldest first"""
+        with self.condition:
+            messages = list(self.messages)
+            self.messages.clear()
+            return messages
+
+    def stats(self):
+        with self.condition:
+            return {
+                "queued": len(self.messages),
+                "received": self.received,
+                "dropped": self.dropped,
+                "max_messages": self.max_messages
+            }
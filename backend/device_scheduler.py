@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Per-device command scheduler for AIConsole
+Serializes access to a console, lets read-only show batches run ahead of
+config pushes, and merges identical in-flight show requests into one run
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from show_cache import normalize_show
+from transports import device_key
+
+# A waiting config batch lets at most this many show batches go ahead of it
+MAX_OVERTAKES = 8
+
+# Wait times kept per class for the queue metrics
+WAIT_SAMPLES = 256
+
+# Exec commands that may appear in a read-only batch besides shows
+READ_ONLY_COMMANDS = ('enable', 'terminal length', 'terminal width')
+
+def batch_lines(commands_string):
+    return [line.strip() for line in commands_string.splitlines() if line.strip()]
+
+def is_read_only(commands):
+    """True if every command only reads state: shows, 'enable' and terminal settings"""
+    return bool(commands) and all(
+        normalize_show(command) is not None or ' '.join(command.lower().split()).startswith(READ_ONLY_COMMANDS)
+        for command in commands)
+
+def coalesce_key(commands, *options):
+    """Key under which identical read-only batches are merged, or None if the batch changes state"""
+    if not is_read_only(commands):
+        return None
+    return (tuple(normalize_show(command) or ' '.join(command.lower().split()) for command in commands),) + options
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Ticket:
+    """A caller waiting for its turn on the device"""
+
+    def __init__(self, read_only):
+        self.read_only = read_only
+        self.enqueued_at = time.monotonic()
+        self.overtaken = 0
+        self.wait = None
+
+class Shared:
+    """The result of a keyed run, handed to every caller that joined it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class DeviceScheduler:
+    def __init__(self, max_overtakes=MAX_OVERTAKES):
+        """Turn-taking for one device: reads first, configs never starved, one caller at a time"""
+        self.max_overtakes = max_overtakes
+        self.condition = threading.Condition()
+        self.reads = deque()
+        self.writes = deque()
+        self.current = None
+        self.inflight = {}
+        self.completed = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.waits = {True: deque(maxlen=WAIT_SAMPLES), False: deque(maxlen=WAIT_SAMPLES)}
+
+    def next_ticket(self):
+        """Oldest show batch, unless the oldest config batch has waited through enough of them"""
+        if self.writes and (not self.reads or self.writes[0].overtaken >= self.max_overtakes):
+            return self.writes[0]
+        return self.reads[0] if self.reads else None
+
+    @contextmanager
+    def turn(self, read_only=False):
+        """Hold the device for the duration of the with block"""
+        ticket = Ticket(read_only)
+        with self.condition:
+            (self.reads if read_only else self.writes).append(ticket)
+            self.max_depth = max(self.max_depth, len(self.reads) + len(self.writes))
+            while self.current is not None or self.next_ticket() is not ticket:
+                self.condition.wait()
+            (self.reads if read_only else self.writes).popleft()
+            if read_only and self.writes:
+                self.writes[0].overtaken += 1
+            self.current = ticket
+            ticket.wait = time.monotonic() - ticket.enqueued_at
+            self.waits[read_only].append(ticket.wait)
+        try:
+            yield ticket
+        finally:
+            with self.condition:
+                self.current = None
+                self.completed += 1
+                self.condition.notify_all()
+
+    def idle(self):
+        """True if nobody holds or waits for the device"""
+        with self.condition:
+            return self.current is None and not self.reads and not self.writes
+
+    def run(self, function, read_only=False, key=None):
+        """Call function() in turn and return its result.
+
+        Callers passing the same key while a keyed run is queued or running
+        get that run's result instead of touching the device again; only
+        read-only work should be keyed.
+        """
+        if key is None:
+            with self.turn(read_only):
+                return function()
+
+        with self.condition:
+            shared = self.inflight.get(key)
+            joined = shared is not None
+            if joined:
+                self.coalesced += 1
+            else:
+                shared = self.inflight[key] = Shared()
+        if joined:
+            shared.done.wait()
+            if shared.error is not None:
+                raise shared.error
+            return dict(shared.result, coalesced=True) if isinstance(shared.result, dict) else shared.result
+
+        try:
+            with self.turn(read_only):
+                shared.result = function()
+            return shared.result
+        except Exception as e:
+            shared.error = e
+            raise
+        finally:
+            with self.condition:
+                self.inflight.pop(key, None)
+            shared.done.set()
+
+    def stats(self):
+        """Queue depth, wait times and coalescing counters"""
+        with self.condition:
+            waits = {}
+            for read_only, name in ((True, 'read'), (False, 'write')):
+                samples = list(self.waits[read_only])
+                waits[name] = {
+                    "samples": len(samples),
+                    "avg": round(sum(samples) / len(samples), 6) if samples else None,
+                    "p95": round(percentile(samples, 0.95), 6) if samples else None,
+                    "max": round(max(samples), 6) if samples else None
+                }
+            return {
+                "queued_reads": len(self.reads),
+                "queued_writes": len(self.writes),
+                "busy": self.current is not None,
+                "max_depth": self.max_depth,
+                "completed": self.completed,
+                "coalesced": self.coalesced,
+                "wait": waits
+            }
+
+# One scheduler per resolved device, shared by everything in the process
+# (sessions and fleet runs alike), so it is the only lock a port has
+_schedulers = {}
+_schedulers_guard = threading.Lock()
+
+def scheduler_for(port):
+    """Return the process-wide scheduler of a serial port or device URL"""
+    key = device_key(port)
+    with _schedulers_guard:
+        if key not in _schedulers:
+            _schedulers[key] = DeviceScheduler()
+        return _schedulers[key]
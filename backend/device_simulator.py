@@ -0,0 +1,1175 @@
+#!/usr/bin/env python3
+"""
+Cisco IOS console simulator for AIConsole
+Exposes a pseudo-terminal that SerialExecutor can open like /dev/ttyUSB0,
+so the executor can be tested and benchmarked without a physical switch.
+The same device can also be reached over telnet and SSH on loopback ports.
+"""
+
+import argparse
+import os
+import pty
+import re
+import select
+import socket
+import termios
+import threading
+import time
+import tty
+import weakref
+from collections import OrderedDict
+
+from transports import ECHO, SGA, TelnetCodec
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+# Physical ports are GigabitEthernet0/1..N; these prefixes may be created on demand
+VIRTUAL_INTERFACES = ('Vlan', 'Loopback', 'Port-channel')
+
+INTERFACE_ABBREVIATIONS = (
+    ('gigabitethernet', 'GigabitEthernet'),
+    ('fastethernet', 'FastEthernet'),
+    ('port-channel', 'Port-channel'),
+    ('loopback', 'Loopback'),
+    ('vlan', 'Vlan'),
+)
+
+SHORT_INTERFACE_NAMES = {
+    'GigabitEthernet': 'Gi',
+    'FastEthernet': 'Fa',
+    'Port-channel': 'Po',
+}
+
+# Delay before a log message triggered by a command is printed, so it lands
+# after the prompt as on real consoles
+LOG_DELAY = 0.002
+
+# Section commands and the sub-mode they enter
+SECTION_MODES = OrderedDict([
+    ('vlan', 'config-vlan'),
+    ('interface', 'config-if'),
+    ('router', 'config-router'),
+    ('line', 'config-line'),
+])
+
+# First words accepted inside each sub-mode, and at global config level
+SUBMODE_COMMANDS = {
+    'config-vlan': ('name', 'state', 'shutdown'),
+    'config-if': ('description', 'switchport', 'ip', 'shutdown', 'speed', 'duplex', 'spanning-tree',
+                  'channel-group', 'storm-control', 'power', 'mdix'),
+    'config-line': ('password', 'login', 'speed', 'exec-timeout', 'logging', 'transport', 'privilege',
+                    'history', 'stopbits', 'databits'),
+    'config-router': ('network', 'router-id', 'passive-interface', 'default-information', 'redistribute',
+                      'area', 'auto-summary'),
+}
+SUBMODE_COMMANDS['config-if-range'] = SUBMODE_COMMANDS['config-if']
+
+GLOBAL_COMMANDS = ('ip', 'service', 'logging', 'snmp-server', 'spanning-tree', 'access-list', 'username',
+                   'enable', 'ntp', 'clock', 'vtp', 'archive', 'errdisable', 'cdp', 'lldp', 'aaa', 'boot',
+                   'mac', 'crypto')
+
+# Lines that hold a single value, so a new one replaces the old one (longest prefix first)
+SINGLE_VALUED = ('switchport port-security maximum', 'switchport port-security violation',
+                 'switchport access vlan', 'switchport trunk native vlan', 'switchport mode',
+                 'ip default-gateway', 'ip domain-name', 'ip address', 'description', 'name', 'speed',
+                 'duplex', 'exec-timeout', 'password', 'enable secret', 'enable password', 'router-id')
+
+EXEC_COMMANDS = (
+    ('show', 'version'),
+    ('show', 'running-config'),
+    ('show', 'startup-config'),
+    ('show', 'vlan', 'brief'),
+    ('show', 'ip', 'interface', 'brief'),
+    ('show', 'interfaces', 'status'),
+    ('show', 'mac', 'address-table'),
+    ('show', 'arp'),
+    ('show', 'clock'),
+    ('terminal', 'length'),
+    ('terminal', 'width'),
+    ('enable',),
+    ('disable',),
+    ('configure', 'terminal'),
+    ('write',),
+    ('write', 'memory'),
+    ('copy', 'running-config', 'startup-config'),
+    ('copy', 'running-config'),
+    ('configure', 'replace'),
+    ('exit',),
+    ('logout',),
+)
+
+# Exec commands available before 'enable'
+USER_COMMANDS = {
+    ('show', 'version'), ('show', 'vlan', 'brief'), ('show', 'ip', 'interface', 'brief'),
+    ('show', 'interfaces', 'status'), ('show', 'mac', 'address-table'), ('show', 'arp'), ('show', 'clock'),
+    ('terminal', 'length'), ('terminal', 'width'), ('enable',), ('exit',), ('logout',),
+}
+
+PAGER_PROMPT = b' --More-- '
+PAGER_ERASE = b'\x08' * 10 + b' ' * 10 + b'\x08' * 10
+
+class CommandError(Exception):
+    """A command the simulated IOS parser rejects; the message is printed to the console"""
+
+def resolve_command(words, table):
+    """Expand IOS abbreviations against a table of keyword tuples.
+
+    Returns (keywords, remaining_words). Raises CommandError for unknown,
+    ambiguous or incomplete input.
+    """
+    candidates = list(table)
+    for position, word in enumerate(words):
+        word = word.lower()
+        complete = [entry for entry in candidates if len(entry) == position]
+        longer = [entry for entry in candidates if len(entry) > position and entry[position].startswith(word)]
+        exact = [entry for entry in longer if entry[position] == word]
+        if exact:
+            longer = exact
+        if not longer:
+            if complete:
+                return complete[0], words[position:]
+            raise CommandError("% Invalid input detected at '^' marker.")
+        if len({entry[position] for entry in longer}) > 1:
+            raise CommandError(f'% Ambiguous command:  "{" ".join(words)}"')
+        candidates = longer
+
+    complete = [entry for entry in candidates if len(entry) == len(words)]
+    if not complete:
+        raise CommandError("% Incomplete command.")
+    return complete[0], []
+
+def normalize_interface(text):
+    """Turn 'gi0/1', 'g 0/1', 'vlan 99' or 'GigabitEthernet0/1' into the canonical name"""
+    compact = text.replace(' ', '')
+    lower = compact.lower()
+    for full_lower, full in INTERFACE_ABBREVIATIONS:
+        for length in range(len(full_lower), 0, -1):
+            prefix = full_lower[:length]
+            rest = lower[length:]
+            if lower.startswith(prefix) and rest[:1].isdigit():
+                return full + compact[length:]
+    raise CommandError("% Invalid input detected at '^' marker.")
+
+def expand_interface_range(text):
+    """'GigabitEthernet0/1-10, gi0/12' -> ['GigabitEthernet0/1', ..., 'GigabitEthernet0/12']"""
+    names = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.rsplit('-', 1)
+            base, number = re.match(r'(.*?)(\d+)$', normalize_interface(start)).groups()
+            for index in range(int(number), int(end.strip()) + 1):
+                names.append(f"{base}{index}")
+        else:
+            names.append(normalize_interface(part))
+    return names
+
+def expand_vlan_list(text):
+    """'10,20-22' -> [10, 20, 21, 22]"""
+    vlans = []
+    for part in text.split(','):
+        if '-' in part:
+            start, end = part.split('-', 1)
+            vlans.extend(range(int(start), int(end) + 1))
+        else:
+            vlans.append(int(part))
+    for vlan in vlans:
+        if not 1 <= vlan <= 4094:
+            raise CommandError("% Invalid input detected at '^' marker.")
+    return vlans
+
+def short_interface(name):
+    for full, short in SHORT_INTERFACE_NAMES.items():
+        if name.startswith(full):
+            return short + name[len(full):]
+    return name
+
+def single_value_key(line):
+    for prefix in SINGLE_VALUED:
+        if line == prefix or line.startswith(prefix + ' '):
+            return prefix
+    return None
+
+def store_line(lines, line):
+    """Add a config line, replacing the previous value of single-valued commands.
+
+    'no X' removes X; if X was not set, 'no X' itself is kept (a disabled
+    default), except for 'no shutdown' which IOS never shows.
+    """
+    if line.startswith('no '):
+        target = line[3:]
+        key = single_value_key(target)
+        kept = [existing for existing in lines
+                if not (existing == target or existing.startswith(target + ' ') or
+                        (key and single_value_key(existing) == key))]
+        removed = len(kept) != len(lines)
+        lines[:] = kept
+        if not removed and target != 'shutdown' and line not in lines:
+            lines.append(line)
+        return
+    key = single_value_key(line)
+    for negated in ('no ' + line, 'no ' + (key or line)):
+        if negated in lines:
+            lines.remove(negated)
+    if key:
+        for index, existing in enumerate(lines):
+            if single_value_key(existing) == key:
+                lines[index] = line
+                return
+    if line not in lines:
+        lines.append(line)
+
+class SimulatedDevice:
+    def __init__(self, hostname='Switch', password='', enable_password='', ports=24,
+                 latency=0.0, baudrate=None, page_length=24, mac_entries=16, connected_ports=2,
+                 exec_timeout=0, console_logging=False):
+        """Shared device state: running-config, credentials and timing behaviour
+
+        latency is seconds per command, or a dict of {command prefix: seconds}
+        with '' as the default. baudrate simulates the console line speed:
+        output is paced to it, and a client tty at another speed only reads
+        line noise. exec_timeout logs idle sessions out after that many
+        seconds (0: never). console_logging prints log messages such as
+        %SYS-5-CONFIG_I to every session, as 'logging console' does.
+        """
+        self.hostname = hostname
+        self.password = password
+        self.enable_password = enable_password
+        self.latency = latency
+        self.line_speed = baudrate
+        self.page_length = page_length
+        self.mac_entries = mac_entries
+        self.connected_ports = connected_ports
+        self.ports = ports
+        self.exec_timeout = exec_timeout
+        self.console_logging = console_logging
+        self.sessions = weakref.WeakSet()
+        self.boot_time = time.time()
+        self.lock = threading.RLock()
+
+        self.startup_config = None
+        self.files = {}
+        self.command_count = 0
+        self.reset_config()
+
+    def log(self, *messages, delay=LOG_DELAY):
+        """Print '%FAC-SEV-MNEMONIC: text' messages on every session shortly, if console logging is on"""
+        if not self.console_logging:
+            return
+        now = time.time()
+        stamp = time.strftime('*%b %d %H:%M:%S', time.gmtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+        lines = [f'{stamp}: {message}'.encode('utf-8') for message in messages]
+
+        def deliver():
+            for session in list(self.sessions):
+                for line in lines:
+                    session.send_log(line)
+        threading.Timer(delay, deliver).start()
+
+    def reset_config(self):
+        """Return the running-config to factory defaults"""
+        self.global_lines = []
+        self.banner = None
+        self.sections = OrderedDict()
+        self.sections['vlan 1'] = []
+        for port in range(1, self.ports + 1):
+            self.sections[f'interface GigabitEthernet0/{port}'] = []
+        self.sections['interface Vlan1'] = ['no ip address']
+        self.sections['line con 0'] = []
+        self.sections['line vty 0 4'] = ['login']
+        if self.line_speed:
+            self.sections['line con 0'].append(f'speed {self.line_speed}')
+
+    def command_latency(self, line):
+        """Seconds the device 'thinks' before answering line"""
+        if not isinstance(self.latency, dict):
+            return self.latency
+        matches = [prefix for prefix in self.latency if line.startswith(prefix)]
+        return self.latency[max(matches, key=len)] if matches else 0.0
+
+    def load_config(self, text):
+        """Apply config lines (indented children under section headers) as if typed in config mode"""
+        session = ConsoleSession(self, lambda data: None)
+        session.mode = 'config'
+        for raw in text.splitlines():
+            line = raw.strip()
+            if not line or line.startswith('!') or line == 'end':
+                continue
+            if not raw.startswith(' ') and session.mode != 'config':
+                session.mode = 'config'
+            try:
+                session.run_line(line)
+            except CommandError:
+                # Header lines such as 'version' or 'Current configuration' are not commands
+                pass
+
+    # Running-config rendering
+
+    def section_order(self, header):
+        kind = header.split()[0]
+        return list(SECTION_MODES).index(kind) if kind in SECTION_MODES else len(SECTION_MODES)
+
+    def running_config_lines(self):
+        with self.lock:
+            lines = ['Building configuration...', '']
+            body = ['!', 'version 15.0', f'hostname {self.hostname}', '!']
+            if self.banner is not None:
+                body += [f'banner motd ^C{self.banner}^C', '!']
+            body += self.global_lines
+            if self.global_lines:
+                body.append('!')
+            headers = sorted(self.sections, key=self.section_order)
+            for header in headers:
+                if header == 'vlan 1':
+                    continue
+                body.append(header)
+                body += [f' {child}' for child in self.sections[header]]
+                body.append('!')
+            body.append('end')
+            size = sum(len(line) + 1 for line in body)
+            return lines + [f'Current configuration : {size} bytes'] + body
+
+    def interfaces(self):
+        return [header.split(' ', 1)[1] for header in self.sections if header.startswith('interface ')]
+
+    def interface_lines(self, name):
+        return self.sections.get(f'interface {name}', [])
+
+    def access_vlan(self, name):
+        lines = self.interface_lines(name)
+        if 'switchport mode trunk' in lines:
+            return 'trunk'
+        for line in lines:
+            if line.startswith('switchport access vlan '):
+                return line.split()[-1]
+        return '1'
+
+    def interface_state(self, index, name):
+        """(status, protocol) for show ip interface brief"""
+        if 'shutdown' in self.interface_lines(name):
+            return 'administratively down', 'down'
+        if name.startswith(('Vlan', 'Loopback')) or index < self.connected_ports:
+            return 'up', 'up'
+        return 'down', 'down'
+
+    def interface_address(self, name):
+        for line in self.interface_lines(name):
+            if line.startswith('ip address '):
+                return line.split()[2], line.split()[3]
+        return None, None
+
+    def mac_address(self, index):
+        value = 0x001122000000 + index
+        text = f'{value:012x}'
+        return f'{text[0:4]}.{text[4:8]}.{text[8:12]}'
+
+    # Show command output
+
+    def show_version(self):
+        uptime = int(time.time() - self.boot_time)
+        ports = sum(1 for name in self.interfaces() if name.startswith('GigabitEthernet'))
+        return [
+            'Cisco IOS Software, C2960 Software (C2960-LANBASEK9-M), Version 15.0(2)SE11, RELEASE SOFTWARE (fc3)',
+            'Technical Support: http://www.cisco.com/techsupport',
+            'Copyright (c) 1986-2017 by Cisco Systems, Inc.',
+            'Compiled Sat 19-Aug-17 09:34 by prod_rel_team',
+            '',
+            'ROM: Bootstrap program is C2960 boot loader',
+            'BOOTLDR: C2960 Boot Loader (C2960-HBOOT-M) Version 12.2(44)SE5, RELEASE SOFTWARE (fc1)',
+            '',
+            f'{self.hostname} uptime is {uptime // 86400} days, {uptime % 86400 // 3600} hours, '
+            f'{uptime % 3600 // 60} minutes',
+            'System returned to ROM by power-on',
+            'System image file is "flash:/c2960-lanbasek9-mz.150-2.SE11.bin"',
+            '',
+            'cisco WS-C2960-24TT-L (PowerPC405) processor (revision B0) with 65536K bytes of memory.',
+            'Processor board ID FOC1010X104',
+            'Last reset from power-on',
+            f'{ports} Gigabit Ethernet interfaces',
+            '64K bytes of flash-simulated non-volatile configuration memory.',
+            'Base ethernet MAC Address       : 00:11:22:33:44:00',
+            'Model number                    : WS-C2960-24TT-L',
+            'System serial number            : FOC1010X104',
+            '',
+            'Configuration register is 0xF',
+            '',
+        ]
+
+    def show_ip_interface_brief(self):
+        lines = ['Interface              IP-Address      OK? Method Status                Protocol']
+        for index, name in enumerate(self.interfaces()):
+            address, _ = self.interface_address(name)
+            status, protocol = self.interface_state(index, name)
+            method = 'manual' if address else 'unset'
+            lines.append(f'{name:<23}{address or "unassigned":<16}YES {method:<7}{status:<22}{protocol}')
+        return lines
+
+    def show_vlan_brief(self):
+        lines = [
+            '',
+            'VLAN Name                             Status    Ports',
+            '---- -------------------------------- --------- -------------------------------',
+        ]
+        vlans = sorted(int(header.split()[1]) for header in self.sections if header.startswith('vlan '))
+        for vlan in vlans:
+            name = 'default' if vlan == 1 else f'VLAN{vlan:04d}'
+            for child in self.sections[f'vlan {vlan}']:
+                if child.startswith('name '):
+                    name = child[5:]
+            ports = [short_interface(port) for port in self.interfaces()
+                     if port.startswith('GigabitEthernet') and self.access_vlan(port) == str(vlan)]
+            groups = [', '.join(ports[i:i + 4]) for i in range(0, len(ports), 4)] or ['']
+            lines.append(f'{vlan:<5}{name[:32]:<33}{"active":<10}{groups[0]}'.rstrip())
+            for group in groups[1:]:
+                lines.append(' ' * 48 + group)
+        for vlan, name in ((1002, 'fddi-default'), (1003, 'token-ring-default'),
+                           (1004, 'fddinet-default'), (1005, 'trnet-default')):
+            lines.append(f'{vlan:<5}{name:<33}act/unsup')
+        return lines
+
+    def show_interfaces_status(self):
+        lines = ['', 'Port      Name               Status       Vlan       Duplex  Speed Type']
+        for index, name in enumerate(self.interfaces()):
+            if not name.startswith('GigabitEthernet'):
+                continue
+            description = ''
+            for line in self.interface_lines(name):
+                if line.startswith('description '):
+                    description = line[12:]
+            status, _ = self.interface_state(index, name)
+            status = {'up': 'connected', 'down': 'notconnect'}.get(status, 'disabled')
+            duplex, speed = ('a-full', 'a-1000') if status == 'connected' else ('auto', 'auto')
+            lines.append(f'{short_interface(name):<10}{description[:18]:<19}{status:<13}'
+                         f'{self.access_vlan(name):<11}{duplex:>6} {speed:>6} 10/100/1000BaseTX')
+        return lines
+
+    def show_mac_address_table(self):
+        ports = [name for name in self.interfaces() if name.startswith('GigabitEthernet')]
+        lines = [
+            '          Mac Address Table',
+            '-------------------------------------------',
+            '',
+            'Vlan    Mac Address       Type        Ports',
+            '----    -----------       --------    -----',
+        ]
+        for index in range(self.mac_entries):
+            port = ports[index % len(ports)] if ports else 'CPU'
+            vlan = self.access_vlan(port) if ports else '1'
+            vlan = '1' if vlan == 'trunk' else vlan
+            lines.append(f'{vlan:>4}    {self.mac_address(index)}    DYNAMIC     {short_interface(port)}')
+        lines.append(f'Total Mac Addresses for this criterion: {self.mac_entries}')
+        return lines
+
+    def show_arp(self):
+        lines = ['Protocol  Address          Age (min)  Hardware Addr   Type   Interface']
+        for index, name in enumerate(self.interfaces()):
+            address, _ = self.interface_address(name)
+            if not address:
+                continue
+            lines.append(f'Internet  {address:<17}{"-":>9}   {self.mac_address(0xff00 + index)}  ARPA   {name}')
+            octets = address.split('.')
+            neighbor = '.'.join(octets[:3] + [str((int(octets[3]) % 254) + 1)])
+            lines.append(f'Internet  {neighbor:<17}{"0":>9}   {self.mac_address(index)}  ARPA   {name}')
+        return lines
+
+    def show_clock(self):
+        return [time.strftime('*%H:%M:%S.000 UTC %a %b %d %Y', time.gmtime())]
+
+class ConsoleSession:
+    """One console connection: login state, CLI mode, pager and line editing"""
+
+    def __init__(self, device, send, hangup=None):
+        self.device = device
+        self.send = send
+        # Called on 'exit' by vty sessions, which disconnect instead of logging out
+        self.hangup = hangup
+        self.state = 'login' if device.password else 'cli'
+        self.awaiting_password = False
+        self.mode = 'user'
+        self.context = []
+        self.page_length = device.page_length
+        self.line = bytearray()
+        self.last_byte = None
+        self.pending_lines = None
+        self.confirm_action = None
+        self.last_input = time.monotonic()
+        self.logged_out = False
+        device.sessions.add(self)
+
+    # Input handling
+
+    def feed(self, data):
+        """Process bytes received from the client"""
+        if data:
+            self.last_input = time.monotonic()
+            self.logged_out = False
+        for byte in data:
+            if self.pending_lines is not None:
+                self.pager_key(byte)
+            elif byte in (10, 13):
+                if not (byte == 10 and self.last_byte == 13):
+                    self.end_of_line()
+            elif byte in (8, 127):
+                if self.line:
+                    self.line.pop()
+                    if not self.awaiting_password:
+                        self.send(b'\x08 \x08')
+            else:
+                self.line.append(byte)
+                if not self.awaiting_password:
+                    self.send(bytes([byte]))
+            self.last_byte = byte
+
+    def end_of_line(self):
+        line = self.line.decode('utf-8', errors='ignore').strip()
+        self.line.clear()
+        self.send(b'\r\n')
+
+        if self.state == 'login':
+            self.handle_login(line)
+        elif self.state == 'enable':
+            self.handle_enable_password(line)
+        elif self.state == 'confirm':
+            self.handle_confirm(line)
+        else:
+            self.handle_command(line)
+
+    def handle_login(self, line):
+        if not self.awaiting_password:
+            self.awaiting_password = True
+            self.send(b'\r\nUser Access Verification\r\n\r\nPassword: ')
+            return
+        if line == self.device.password:
+            self.awaiting_password = False
+            self.state = 'cli'
+            self.send_prompt()
+        else:
+            self.send(b'% Login invalid\r\n\r\nPassword: ')
+
+    def handle_enable_password(self, line):
+        self.awaiting_password = False
+        self.state = 'cli'
+        if line == self.device.enable_password:
+            self.mode = 'privileged'
+        else:
+            self.send(b'% Access denied\r\n\r\n')
+        self.send_prompt()
+
+    def handle_confirm(self, line):
+        action = self.confirm_action
+        self.confirm_action = None
+        self.state = 'cli'
+        with self.device.lock:
+            output = action(line)
+        self.send_lines(output)
+
+    def ask(self, question, action):
+        """Print a confirmation question; action(answer) returns the output lines"""
+        self.state = 'confirm'
+        self.confirm_action = action
+        self.send(question.encode('utf-8'))
+        return None
+
+    def handle_command(self, line):
+        if line:
+            delay = self.device.command_latency(line)
+            if delay:
+                time.sleep(delay)
+        try:
+            output = self.run_line(line) if line else []
+        except CommandError as e:
+            marker = ' ' * len(self.prompt()) + '^' if 'Invalid input' in str(e) else ''
+            output = [marker, str(e), '']
+        if output is None:
+            return
+        self.send_lines(output)
+
+    # Output
+
+    def prompt(self):
+        hostname = self.device.hostname
+        if self.mode == 'user':
+            return f'{hostname}>'
+        if self.mode == 'privileged':
+            return f'{hostname}#'
+        return f'{hostname}({self.mode})#'
+
+    def logout(self):
+        """End the exec session: vty lines disconnect, the console goes back to its banner"""
+        self.logged_out = True
+        if self.hangup:
+            self.hangup()
+            return
+        self.mode = 'user'
+        self.context = []
+        if self.device.password:
+            self.state = 'login'
+            self.awaiting_password = False
+        self.send(b'\r\n' + f'{self.device.hostname} con0 is now available'.encode('utf-8') +
+                  b'\r\n\r\n\r\n\r\n\r\nPress RETURN to get started.\r\n')
+
+    def send_log(self, line):
+        """Print an unsolicited log line, framed by line breaks like IOS does"""
+        try:
+            self.send(b'\r\n' + line + b'\r\n')
+        except OSError:
+            self.device.sessions.discard(self)
+
+    def check_exec_timeout(self):
+        """Log the session out once it has been idle for the device's exec_timeout"""
+        timeout = self.device.exec_timeout
+        if (timeout and not self.logged_out and self.state != 'login'
+                and time.monotonic() - self.last_input >= timeout):
+            self.line.clear()
+            self.pending_lines = None
+            self.logout()
+
+    def send_prompt(self):
+        self.send(self.prompt().encode('utf-8'))
+
+    def send_lines(self, lines):
+        """Send command output through the pager, then the prompt"""
+        page = self.page_length - 1 if self.page_length else 0
+        if page > 0 and len(lines) > page:
+            self.send(''.join(line + '\r\n' for line in lines[:page]).encode('utf-8'))
+            self.pending_lines = lines[page:]
+            self.send(PAGER_PROMPT)
+            return
+        self.send(''.join(line + '\r\n' for line in lines).encode('utf-8'))
+        self.send_prompt()
+
+    def pager_key(self, byte):
+        lines = self.pending_lines
+        self.pending_lines = None
+        self.send(PAGER_ERASE)
+        if byte in (ord('q'), ord('Q')):
+            self.send_prompt()
+        elif byte in (10, 13) and len(lines) > 1:
+            # RETURN shows one more line
+            self.send((lines[0] + '\r\n').encode('utf-8'))
+            self.pending_lines = lines[1:]
+            self.send(PAGER_PROMPT)
+        else:
+            self.send_lines(lines)
+
+    # Command execution
+
+    def run_line(self, line):
+        """Execute one CLI line; returns output lines, or None when a prompt must not follow"""
+        device = self.device
+        with device.lock:
+            device.command_count += 1
+            if self.mode in ('user', 'privileged'):
+                return self.run_exec(line)
+            return self.run_config(line)
+
+    def run_exec(self, line):
+        words = line.split()
+        table = USER_COMMANDS if self.mode == 'user' else EXEC_COMMANDS
+        keywords, args = resolve_command(words, table)
+
+        if keywords == ('enable',):
+            if self.mode == 'user' and self.device.enable_password:
+                self.state = 'enable'
+                self.awaiting_password = True
+                self.send(b'Password: ')
+                return None
+            self.mode = 'privileged'
+            return []
+        if keywords == ('disable',):
+            self.mode = 'user'
+            return []
+        if keywords == ('configure', 'terminal'):
+            self.mode = 'config'
+            return ['Enter configuration commands, one per line.  End with CNTL/Z.']
+        if keywords in (('exit',), ('logout',)):
+            self.logout()
+            return None
+        if keywords[0] == 'terminal':
+            if not args or not args[0].isdigit():
+                raise CommandError("% Incomplete command.")
+            if keywords[1] == 'length':
+                self.page_length = int(args[0])
+            return []
+        if keywords in (('write',), ('write', 'memory'), ('copy', 'running-config', 'startup-config')):
+            self.device.startup_config = self.device.running_config_lines()
+            return ['Building configuration...', '[OK]']
+        if keywords == ('copy', 'running-config'):
+            return self.copy_running_config(args)
+        if keywords == ('configure', 'replace'):
+            return self.configure_replace(args)
+        if args:
+            raise CommandError("% Invalid input detected at '^' marker.")
+        return self.run_show(keywords)
+
+    def copy_running_config(self, args):
+        if len(args) != 1 or not args[0].startswith('flash:'):
+            raise CommandError("% Invalid input detected at '^' marker.")
+        name = args[0][len('flash:'):]
+
+        def save(answer):
+            filename = answer or name
+            if not filename:
+                return ['%Error opening flash: (Invalid file name)']
+            lines = self.device.running_config_lines()[2:]
+            self.device.files[filename] = lines
+            size = sum(len(line) + 1 for line in lines)
+            return [f'{size} bytes copied in 0.052 secs']
+
+        return self.ask(f'Destination filename [{name}]? ', save)
+
+    def configure_replace(self, args):
+        if not args or not args[0].startswith('flash:') or args[1:] not in ([], ['force']):
+            raise CommandError("% Invalid input detected at '^' marker.")
+        filename = args[0][len('flash:'):]
+        device = self.device
+        if filename not in device.files:
+            return [f'%Error opening {args[0]} (File not found)']
+
+        def replace(answer='y'):
+            if answer.lower() not in ('y', 'yes'):
+                return []
+            device.reset_config()
+            device.load_config('\n'.join(device.files[filename]))
+            return ['Total number of passes: 1', 'Rollback Done', '']
+
+        if args[1:] == ['force']:
+            return replace()
+        return self.ask('This will apply all necessary additions and deletions\r\n'
+                        'to replace the current running configuration with the\r\n'
+                        'contents of the specified configuration file, which is\r\n'
+                        'assumed to be a complete configuration, not a partial\r\n'
+                        'configuration. Enter Y if you are sure you want to proceed. ? [no]: ', replace)
+
+    def run_show(self, keywords):
+        device = self.device
+        if keywords == ('show', 'running-config'):
+            return device.running_config_lines()
+        if keywords == ('show', 'startup-config'):
+            return device.startup_config or ['startup-config is not present']
+        handlers = {
+            ('show', 'version'): device.show_version,
+            ('show', 'vlan', 'brief'): device.show_vlan_brief,
+            ('show', 'ip', 'interface', 'brief'): device.show_ip_interface_brief,
+            ('show', 'interfaces', 'status'): device.show_interfaces_status,
+            ('show', 'mac', 'address-table'): device.show_mac_address_table,
+            ('show', 'arp'): device.show_arp,
+            ('show', 'clock'): device.show_clock,
+        }
+        return handlers[keywords]()
+
+    def run_config(self, line):
+        words = line.split()
+        first = words[0].lower()
+
+        if first == 'end':
+            self.mode = 'privileged'
+            self.context = []
+            self.device.log('%SYS-5-CONFIG_I: Configured from console by console')
+            return []
+        if first == 'exit':
+            if self.mode == 'config':
+                self.mode = 'privileged'
+            else:
+                self.mode = 'config'
+            self.context = []
+            return []
+        if first == 'do':
+            saved_mode = self.mode
+            self.mode = 'privileged'
+            try:
+                return self.run_exec(' '.join(words[1:]))
+            finally:
+                self.mode = saved_mode
+
+        if self.mode != 'config':
+            allowed = SUBMODE_COMMANDS[self.mode]
+            keyword = words[1] if first == 'no' and len(words) > 1 else first
+            if keyword.lower() in allowed:
+                self.apply_child(line)
+                return []
+            # Anything else is parsed at global level, as IOS does
+        return self.run_global(words)
+
+    def apply_child(self, line):
+        device = self.device
+        words = line.lower().split()
+        for header in self.context:
+            store_line(device.sections.setdefault(header, []), line)
+            if header.startswith('interface ') and words[-1:] == ['shutdown']:
+                self.log_link_change(header.split(None, 1)[1], 'up' if words[0] == 'no' else 'down')
+            if header == 'line con 0' and line.split()[0] == 'speed' and device.line_speed:
+                device.line_speed = int(line.split()[1])
+
+    def log_link_change(self, interface, state):
+        if state == 'down':
+            link = f'%LINK-5-CHANGED: Interface {interface}, changed state to administratively down'
+        else:
+            link = f'%LINK-3-UPDOWN: Interface {interface}, changed state to up'
+        self.device.log(link, f'%LINEPROTO-5-UPDOWN: Line protocol on Interface {interface}, changed state to {state}')
+
+    def run_global(self, words):
+        device = self.device
+        negate = words[0].lower() == 'no'
+        if negate:
+            words = words[1:]
+            if not words:
+                raise CommandError("% Incomplete command.")
+        first = words[0].lower()
+
+        if first == 'hostname':
+            if len(words) < 2:
+                raise CommandError("% Incomplete command.")
+            device.hostname = 'Switch' if negate else words[1]
+            return []
+        if first == 'banner':
+            return self.run_banner(words, negate)
+
+        for keyword, mode in SECTION_MODES.items():
+            if len(first) >= 2 and keyword.startswith(first):
+                return self.enter_section(keyword, mode, words[1:], negate)
+
+        if not any(keyword.startswith(first) and len(first) >= 2 for keyword in GLOBAL_COMMANDS):
+            raise CommandError("% Invalid input detected at '^' marker.")
+        store_line(device.global_lines, ('no ' if negate else '') + ' '.join(words))
+        self.mode = 'config'
+        self.context = []
+        return []
+
+    def run_banner(self, words, negate):
+        if negate:
+            self.device.banner = None
+            return []
+        text = ' '.join(words[2:])
+        if len(words) < 3 or len(text) < 2:
+            raise CommandError("% Incomplete command.")
+        # running-config shows the delimiter as ^C
+        delimiter = '^C' if text.startswith('^C') else text[0]
+        self.device.banner = text[len(delimiter):].split(delimiter, 1)[0]
+        return []
+
+    def enter_section(self, keyword, mode, args, negate):
+        device = self.device
+        if not args:
+            raise CommandError("% Incomplete command.")
+
+        if keyword == 'vlan':
+            headers = [f'vlan {vlan}' for vlan in expand_vlan_list(args[0])]
+        elif keyword == 'interface':
+            if args[0].lower() == 'range':
+                names = expand_interface_range(' '.join(args[1:]))
+                mode = 'config-if-range'
+            else:
+                names = [normalize_interface(' '.join(args))]
+            for name in names:
+                if f'interface {name}' not in device.sections and not name.startswith(VIRTUAL_INTERFACES):
+                    raise CommandError("% Invalid input detected at '^' marker.")
+            headers = [f'interface {name}' for name in names]
+        elif keyword == 'line':
+            kind = 'con' if 'console'.startswith(args[0].lower()) else args[0].lower()
+            headers = [' '.join(['line', kind] + args[1:])]
+        else:
+            headers = [' '.join(['router'] + args)]
+
+        if negate:
+            for header in headers:
+                if header != 'vlan 1':
+                    device.sections.pop(header, None)
+            return []
+
+        for header in headers:
+            if header not in device.sections:
+                device.sections[header] = ['no ip address'] if header.startswith('interface Vlan') else []
+        self.mode = mode
+        self.context = headers
+        return []
+
+class PtyConsole:
+    """Serves a SimulatedDevice on a pseudo-terminal"""
+
+    def __init__(self, device):
+        self.device = device
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Create the pty and start answering on it; returns the device path"""
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.session = ConsoleSession(self.device, self.write)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master = self.slave = None
+
+    def client_speed_matches(self):
+        """True unless a line speed is simulated and the client tty is set to another rate"""
+        if not self.device.line_speed:
+            return True
+        expected = getattr(termios, f'B{self.device.line_speed}', None)
+        try:
+            return termios.tcgetattr(self.slave)[5] == expected
+        except termios.error:
+            return True
+
+    def write(self, data):
+        """Write to the client, paced to the simulated line speed"""
+        if not self.client_speed_matches():
+            data = bytes((byte * 7 + 0x81) & 0xff for byte in data)
+        speed = self.device.line_speed
+        if not speed:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.master, view):]
+            return
+        # 10 bits per byte on an 8N1 line, sent in 10 ms slices
+        chunk = max(1, speed // 1000)
+        started = time.monotonic()
+        for offset in range(0, len(data), chunk):
+            os.write(self.master, data[offset:offset + chunk])
+            due = started + (offset + chunk) * 10 / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def run(self):
+        while self.running:
+            try:
+                ready, _, _ = select.select([self.master], [], [], 0.1)
+                if not ready:
+                    self.session.check_exec_timeout()
+                    continue
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            # Input is always accepted: a pty cannot tell which speed queued bytes
+            # were sent at, so a speed mismatch only garbles the output side
+            try:
+                self.session.feed(data)
+            except OSError:
+                return
+
+class NetworkConsole:
+    """Serves a SimulatedDevice on a loopback TCP port, one session per client like vty lines"""
+
+    scheme = None
+
+    def __init__(self, device, host='127.0.0.1', port=0):
+        self.device = device
+        self.host = host
+        self.port = port
+        self.listener = None
+        self.thread = None
+        self.running = False
+        self.clients = []
+
+    @property
+    def url(self):
+        return f'{self.scheme}://{self.host}:{self.port}'
+
+    def start(self):
+        """Start listening; returns the URL to give SerialExecutor as its port"""
+        self.listener = socket.create_server((self.host, self.port))
+        self.port = self.listener.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self.accept_loop, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.running = False
+        if self.listener:
+            self.listener.close()
+        for client in list(self.clients):
+            try:
+                client.close()
+            except OSError:
+                pass
+        if self.thread:
+            self.thread.join(timeout=1)
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                ready, _, _ = select.select([self.listener], [], [], 0.1)
+                if not ready:
+                    continue
+                client, _ = self.listener.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients.append(client)
+            threading.Thread(target=self.run_client, args=(client,), daemon=True).start()
+
+    def run_client(self, client):
+        try:
+            self.serve_client(client)
+        except (OSError, EOFError):
+            pass
+        finally:
+            if client in self.clients:
+                self.clients.remove(client)
+            try:
+                client.close()
+            except OSError:
+                pass
+
+class TelnetConsole(NetworkConsole):
+    """Telnet vty: the device echoes and suppresses go-ahead, as IOS does"""
+
+    scheme = 'telnet'
+
+    def serve_client(self, client):
+        codec = TelnetCodec(peer_options=(SGA,), local_options=(ECHO, SGA))
+        closed = threading.Event()
+        session = ConsoleSession(self.device, lambda data: client.sendall(TelnetCodec.encode(data)),
+                                 hangup=closed.set)
+        client.sendall(codec.offer(ECHO) + codec.offer(SGA))
+        while self.running and not closed.is_set():
+            ready, _, _ = select.select([client], [], [], 0.1)
+            if not ready:
+                session.check_exec_timeout()
+                continue
+            data = client.recv(4096)
+            if not data:
+                return
+            payload, replies = codec.decode(data)
+            if replies:
+                client.sendall(replies)
+            session.feed(payload)
+
+class SshConsole(NetworkConsole):
+    """SSH vty (needs the optional paramiko package); the password is the device's login password"""
+
+    scheme = 'ssh'
+
+    def __init__(self, device, host='127.0.0.1', port=0):
+        if paramiko is None:
+            raise RuntimeError("The SSH console needs paramiko: pip install paramiko")
+        super().__init__(device, host, port)
+        self.host_key = paramiko.RSAKey.generate(2048)
+
+    def serve_client(self, client):
+        transport = paramiko.Transport(client)
+        try:
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=SshLogin(self.device.password))
+            channel = transport.accept(10)
+            if channel is None:
+                return
+            closed = threading.Event()
+            session = ConsoleSession(self.device, channel.sendall, hangup=closed.set)
+            # SSH has already checked the password
+            session.state = 'cli'
+            channel.settimeout(0.1)
+            while self.running and not closed.is_set():
+                try:
+                    data = channel.recv(4096)
+                except socket.timeout:
+                    session.check_exec_timeout()
+                    continue
+                if not data:
+                    return
+                session.feed(data)
+        finally:
+            transport.close()
+
+if paramiko is not None:
+    class SshLogin(paramiko.ServerInterface):
+        """Password login for SshConsole; any username, no password needed if the device has none"""
+
+        def __init__(self, password):
+            self.password = password
+
+        def get_allowed_auths(self, username):
+            return 'password,none'
+
+        def check_auth_none(self, username):
+            return paramiko.AUTH_FAILED if self.password else paramiko.AUTH_SUCCESSFUL
+
+        def check_auth_password(self, username, password):
+            return paramiko.AUTH_SUCCESSFUL if password == self.password else paramiko.AUTH_FAILED
+
+        def check_channel_request(self, kind, chanid):
+            if kind == 'session':
+                return paramiko.OPEN_SUCCEEDED
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+        def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+            return True
+
+        def check_channel_shell_request(self, channel):
+            return True
+
+def start_simulator(**device_options):
+    """Start a simulated device on a new pty; returns the running PtyConsole"""
+    console = PtyConsole(SimulatedDevice(**device_options))
+    console.start()
+    return console
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Simulated Cisco IOS console on a pseudo-terminal")
+    parser.add_argument('--hostname', default='Switch')
+    parser.add_argument('--password', default='', help="Console login password (empty: no login)")
+    parser.add_argument('--enable-password', default='')
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds of delay per command")
+    parser.add_argument('--baudrate', type=int, help="Simulated console line speed")
+    parser.add_argument('--mac-entries', type=int, default=16)
+    parser.add_argument('--config', help="File with config lines to load at start")
+    parser.add_argument('--exec-timeout', type=float, default=0, help="Log idle sessions out after this many seconds")
+    parser.add_argument('--console-logging', action='store_true',
+                        help="Print log messages (%%SYS-5-CONFIG_I, %%LINK-3-UPDOWN, ...) on the sessions")
+    parser.add_argument('--telnet-port', type=int, help="Also serve the device over telnet on this loopback port")
+    parser.add_argument('--ssh-port', type=int, help="Also serve the device over SSH on this loopback port (needs paramiko)")
+    args = parser.parse_args()
+
+    device = SimulatedDevice(hostname=args.hostname, password=args.password,
+                             enable_password=args.enable_password, latency=args.latency,
+                             baudrate=args.baudrate, mac_entries=args.mac_entries,
+                             exec_timeout=args.exec_timeout, console_logging=args.console_logging)
+    if args.config:
+        with open(args.config) as f:
+            device.load_config(f.read())
+
+    consoles = [PtyConsole(device)]
+    if args.telnet_port is not None:
+        consoles.append(TelnetConsole(device, port=args.telnet_port))
+    if args.ssh_port is not None:
+        consoles.append(SshConsole(device, port=args.ssh_port))
+    for console in consoles:
+        print(f"Simulated {args.hostname} console on {console.start()}", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for console in consoles:
+            console.stop()
+
+if __name__ == "__main__":
+    main()
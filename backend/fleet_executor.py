@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Concurrent multi-port execution for AIConsole
+Runs command batches on many serial consoles at once, one session per port
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from device_scheduler import batch_lines, is_read_only, scheduler_for
+from serial_executor import SerialExecutor
+from transports import device_key
+
+class FleetExecutor:
+    def __init__(self, max_workers=8, executor_factory=SerialExecutor, **executor_options):
+        """Configure the worker pool and the options passed to each port's executor"""
+        self.max_workers = max_workers
+        self.executor_factory = executor_factory
+        self.executor_options = executor_options
+
+    def run_device(self, port, commands_string):
+        """Run one port's batch in its turn on the port's scheduler, shared with serial sessions"""
+        start_time = time.monotonic()
+        try:
+            with scheduler_for(port).turn(is_read_only(batch_lines(commands_string))):
+                executor = self.executor_factory(port=port, **self.executor_options)
+                result = executor.execute_commands(commands_string)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        result["elapsed"] = round(time.monotonic() - start_time, 3)
+        return result
+
+    def execute(self, batches):
+        """Run {port: commands_string} concurrently and collect per-device results"""
+        devices = {}
+        seen = {}
+        for port in batches:
+            resolved = device_key(port)
+            if resolved in seen:
+                devices[port] = {"success": False, "elapsed": 0.0,
+                                 "error": f"Port {port} is the same device as {seen[resolved]}"}
+            else:
+                seen[resolved] = port
+
+        start_time = time.monotonic()
+        workers = max(1, min(self.max_workers, len(seen)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {port: pool.submit(self.run_device, port, batches[port]) for port in seen.values()}
+            for port, future in futures.items():
+                devices[port] = future.result()
+
+        return {
+            "success": all(result.get("success") for result in devices.values()),
+            "devices": devices,
+            "elapsed": round(time.monotonic() - start_time, 3)
+        }
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Execute command batches on several serial consoles")
+    parser.add_argument('batches', help='JSON file mapping port to commands, e.g. {"/dev/ttyUSB0": "show version"}')
+    parser.add_argument('--workers', type=int, default=8, help="Maximum ports driven at once")
+    parser.add_argument('--password', default='')
+    args = parser.parse_args()
+
+    with open(args.batches) as f:
+        batches = json.load(f)
+
+    result = FleetExecutor(max_workers=args.workers, password=args.password).execute(batches)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
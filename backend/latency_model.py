@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Command latency model for AIConsole
+Learns how long each class of command takes on each device (EWMA of the
+latency plus a variance estimate) and turns that into per-command deadlines
+"""
+
+import argparse
+import json
+import math
+import os
+import tempfile
+import threading
+
+from show_cache import normalize_show
+
+# Smoothing of the running mean/variance, and how many standard deviations
+# above the mean a deadline sits
+EWMA_ALPHA = 0.2
+DEVIATIONS = 4.0
+
+# A class needs this many observations before its own numbers set deadlines
+MIN_SAMPLES = 3
+
+# Deadline bounds (seconds). Each timeout multiplies a class's deadline by
+# TIMEOUT_GROWTH, up to MAX_BACKOFF times what its replies alone call for;
+# every reply lets that backoff fade again at the EWMA rate
+MIN_DEADLINE = 5.0
+MAX_DEADLINE = 900.0
+TIMEOUT_GROWTH = 2.0
+MAX_BACKOFF = 8.0
+
+# The slowest reply seen shrinks by this factor with each reply, so one
+# outlier does not hold deadlines up forever
+MAX_DECAY = 0.98
+
+# Save the profile after this many new observations
+SAVE_EVERY = 20
+
+DEFAULT_PROFILE_PATH = os.path.expanduser(os.environ.get('AICONSOLE_LATENCY_PROFILE', '~/.aiconsole/latency.json'))
+
+# Starting deadlines for command classes known to be slow on IOS
+SLOW_CLASS_DEADLINES = {
+    'write': 60.0,
+    'copy': 120.0,
+    'configure replace': 120.0,
+    'erase': 60.0,
+    'delete': 30.0,
+    'verify': 120.0,
+    'squeeze': 300.0,
+    'ping': 30.0,
+    'traceroute': 120.0,
+    'show tech-support': 600.0,
+    'show running-config': 30.0,
+    'show startup-config': 30.0,
+    'config crypto': 120.0,
+}
+
+# Exec commands whose class is the full keyword: (keyword, shortest abbreviation)
+EXEC_KEYWORDS = (('write', 2), ('copy', 2), ('erase', 2), ('delete', 3), ('verify', 3), ('squeeze', 2),
+                 ('ping', 2), ('traceroute', 4), ('reload', 3), ('configure', 4), ('enable', 2),
+                 ('terminal', 4), ('dir', 3), ('clear', 3))
+
+def command_class(command, mode=None):
+    """Class of command whose latencies are pooled: 'show running-config', 'write', 'config vlan', ...
+
+    Config-mode lines (other than 'do') are classed by their first keyword.
+    """
+    normalized = normalize_show(command)
+    if normalized is not None:
+        words = normalized.split('|')[0].split()
+        if words[1:2] == ['tech-support'] or words[1:2] == ['tech']:
+            return 'show tech-support'
+        return ' '.join(words[:3])
+    words = command.lower().split()
+    if not words:
+        return 'empty'
+    if mode and mode.startswith('config') and words[0] != 'do':
+        return f'config {words[0]}'
+    if words[0] == 'do':
+        words = words[1:] or ['do']
+    for keyword, length in EXEC_KEYWORDS:
+        if len(words[0]) >= length and keyword.startswith(words[0]):
+            if keyword == 'configure' and len(words) > 1 and 'replace'.startswith(words[1]):
+                return 'configure replace'
+            return keyword
+    return words[0]
+
+class LatencyModel:
+    def __init__(self, path=None, alpha=EWMA_ALPHA, deviations=DEVIATIONS):
+        """Per-device, per-class latency estimates, persisted as JSON at path (None: in memory)"""
+        self.path = path
+        self.alpha = alpha
+        self.deviations = deviations
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.unsaved = 0
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            with self.lock:
+                self.profiles = data.get('devices', {})
+
+    def save(self):
+        """Write the profile atomically; a failure to save never breaks command execution"""
+        if not self.path:
+            return
+        with self.lock:
+            payload = json.dumps({"devices": self.profiles}, indent=2, sort_keys=True)
+            self.unsaved = 0
+        directory = os.path.dirname(self.path) or '.'
+        temporary = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # A file of our own, so processes sharing the profile never write into each other's
+            descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w') as f:
+                f.write(payload + '\n')
+            os.replace(temporary, self.path)
+        except OSError:
+            if temporary:
+                try:
+                    os.unlink(temporary)
+                except OSError:
+                    pass
+
+    def estimate(self, device, cls):
+        with self.lock:
+            entry = self.profiles.get(device, {}).get(cls)
+            return dict(entry) if entry else None
+
+    def deadline(self, device, command, mode=None, default=None):
+        """Seconds to wait for command's prompt: learned, else the class's prior, else default"""
+        return self.class_deadline(device, command_class(command, mode), default)
+
+    def class_deadline(self, device, cls, default=None):
+        entry = self.estimate(device, cls)
+        prior = SLOW_CLASS_DEADLINES.get(cls, default if default is not None else MIN_DEADLINE)
+        if entry is None:
+            return min(MAX_DEADLINE, prior)
+        if entry["count"] < MIN_SAMPLES:
+            # Too few replies: never wait less than the prior, nor less than a slow reply needed
+            learned = max(prior, entry["max"] * TIMEOUT_GROWTH)
+        else:
+            learned = entry["mean"] + self.deviations * math.sqrt(entry["variance"])
+            # Leave room for the slowest recent reply; known slow classes keep their prior as a floor
+            learned = max(SLOW_CLASS_DEADLINES.get(cls, MIN_DEADLINE), learned, entry["max"] * 1.5)
+        return min(MAX_DEADLINE, learned * entry.get("backoff", 1.0))
+
+    def observe(self, device, command, mode, elapsed, timed_out=False):
+        """Fold one command's latency into its class; a timeout backs its deadline off instead"""
+        cls = command_class(command, mode)
+        with self.lock:
+            entry = self.profiles.setdefault(device, {}).get(cls)
+            if entry is None:
+                entry = self.profiles[device][cls] = {
+                    "mean": 0.0, "variance": 0.0, "count": 0, "max": 0.0, "timeouts": 0, "backoff": 1.0}
+            backoff = entry.get("backoff", 1.0)
+            if timed_out:
+                # The real latency is unknown, so it stays out of the statistics
+                entry["timeouts"] += 1
+                entry["backoff"] = min(MAX_BACKOFF, backoff * TIMEOUT_GROWTH)
+            else:
+                if entry["count"] == 0:
+                    entry["mean"] = elapsed
+                else:
+                    difference = elapsed - entry["mean"]
+                    entry["mean"] += self.alpha * difference
+                    entry["variance"] = (1 - self.alpha) * (entry["variance"] + self.alpha * difference * difference)
+                entry["max"] = max(elapsed, entry["max"] * MAX_DECAY)
+                entry["count"] += 1
+                backoff = 1.0 + (backoff - 1.0) * (1 - self.alpha)
+                entry["backoff"] = backoff if backoff > 1.001 else 1.0
+            for key in ("mean", "variance", "max", "backoff"):
+                entry[key] = round(entry[key], 6)
+            self.unsaved += 1
+            due = self.path and self.unsaved >= SAVE_EVERY
+        if due:
+            self.save()
+
+    def summary(self, device):
+        """The learned classes of device with their current deadlines"""
+        with self.lock:
+            classes = {cls: dict(entry) for cls, entry in self.profiles.get(device, {}).items()}
+        for cls, entry in classes.items():
+            entry["deadline"] = round(self.class_deadline(device, cls), 3)
+        return classes
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Show the learned command latency profile")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE_PATH, help="Latency profile JSON file")
+    parser.add_argument('device', nargs='?', help="Only this device (serial path or scheme://host:port)")
+    args = parser.parse_args()
+
+    model = LatencyModel(args.profile)
+    devices = [args.device] if args.device else sorted(model.profiles)
+    print(json.dumps({device: model.summary(device) for device in devices}, indent=2))
+
+if __name__ == "__main__":
+    main()
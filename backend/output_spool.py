@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Large output spooling for AIConsole
+Command output above a size threshold is streamed to a spool file instead of
+being kept as one string; results carry a handle, size and SHA-256, and
+readers get memory-mapped access to the file
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import time
+
+# Outputs of at least this many bytes are spooled
+SPOOL_THRESHOLD = 1024 * 1024
+
+# How much of a spooled output is kept inline as the result's "response"
+PREVIEW_BYTES = 4096
+
+# Spool files older than this are removed when new ones are written
+MAX_SPOOL_AGE = 24 * 3600
+
+DEFAULT_SPOOL_DIR = os.environ.get('AICONSOLE_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'aiconsole-spool')
+
+# A handle is the SHA-256 of the output, which also names its file
+HANDLE_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+SPOOL_SUFFIX = '.out'
+
+class SpooledOutput:
+    """A finished spool file; iterating over it yields its lines, read through mmap"""
+
+    def __init__(self, path, size, sha256):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def handle(self):
+        return self.sha256
+
+    def read(self, offset=0, length=None):
+        """Return length bytes (default: the rest) from offset without reading the whole file"""
+        with open(self.path, 'rb') as f:
+            if self.size == 0:
+                return b''
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                end = self.size if length is None else min(self.size, offset + length)
+                return view[offset:end]
+
+    def lines(self):
+        """Yield the decoded lines, without their line breaks"""
+        if self.size == 0:
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for line in iter(view.readline, b''):
+                yield line.rstrip(b'\r\n').decode('utf-8', errors='ignore')
+
+    def __iter__(self):
+        return self.lines()
+
+    def text(self):
+        """The whole output as a string; only for callers that really need it at once"""
+        return self.read().decode('utf-8', errors='ignore')
+
+    def preview(self, length=PREVIEW_BYTES):
+        return self.read(0, length).decode('utf-8', errors='ignore')
+
+    def as_dict(self):
+        return {"handle": self.handle, "path": self.path, "size": self.size, "sha256": self.sha256}
+
+class SpoolWriter:
+    """Receives one output in pieces, hashing it on the way; the file is created on the first write"""
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.threshold = spool.threshold
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.file = None
+        self.temporary = None
+
+    def write(self, data):
+        if not data:
+            return
+        if self.file is None:
+            os.makedirs(self.spool.directory, exist_ok=True)
+            descriptor, self.temporary = tempfile.mkstemp(dir=self.spool.directory, suffix='.tmp')
+            self.file = os.fdopen(descriptor, 'wb')
+        self.file.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def finish(self):
+        """Move the file into place under its hash and return the SpooledOutput, or None if nothing was written"""
+        if self.file is None:
+            return None
+        self.file.close()
+        self.file = None
+        sha256 = self.digest.hexdigest()
+        path = self.spool.path(sha256)
+        # Identical output is already spooled under the same name
+        os.replace(self.temporary, path)
+        self.spool.spilled(self.size)
+        return SpooledOutput(path, self.size, sha256)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            try:
+                os.unlink(self.temporary)
+            except OSError:
+                pass
+
+class OutputSpool:
+    def __init__(self, directory=DEFAULT_SPOOL_DIR, threshold=SPOOL_THRESHOLD, max_age=MAX_SPOOL_AGE):
+        """Directory of spooled outputs, shared by every executor (and the Node backend) that uses it"""
+        self.directory = directory
+        self.threshold = threshold
+        self.max_age = max_age
+        self.spooled = 0
+        self.spooled_bytes = 0
+
+    def writer(self):
+        return SpoolWriter(self)
+
+    def path(self, handle):
+        return os.path.join(self.directory, handle + SPOOL_SUFFIX)
+
+    def get(self, handle):
+        """SpooledOutput for a handle, or None if it is malformed or no longer spooled"""
+        if not isinstance(handle, str) or not HANDLE_PATTERN.match(handle):
+            return None
+        path = self.path(handle)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        return SpooledOutput(path, size, handle)
+
+    def spilled(self, size):
+        self.spooled += 1
+        self.spooled_bytes += size
+        self.prune()
+
+    def prune(self):
+        """Remove spool files older than max_age"""
+        cutoff = time.time() - self.max_age
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "threshold": self.threshold,
+            "spooled": self.spooled,
+            "spooled_bytes": self.spooled_bytes
+        }
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Read a spooled command output")
+    parser.add_argument('handle', help="Handle from a result's 'spooled' field")
+    parser.add_argument('--directory', default=DEFAULT_SPOOL_DIR)
+    parser.add_argument('--offset', type=int, default=0)
+    parser.add_argument('--length', type=int, help="Bytes to print (default: to the end)")
+    parser.add_argument('--info', action='store_true', help="Print size and hash instead of the output")
+    args = parser.parse_args()
+
+    spooled = OutputSpool(args.directory).get(args.handle)
+    if spooled is None:
+        parser.exit(1, f"No spooled output {args.handle}\n")
+    if args.info:
+        print(json.dumps(spooled.as_dict(), indent=2))
+        return
+    sys.stdout.buffer.write(spooled.read(args.offset, args.length))
+
+if __name__ == "__main__":
+    main()
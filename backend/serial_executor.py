@@ -1,100 +1,765 @@
 #!/usr/bin/env python3
 """
 Serial communication module for AIConsole
-Handles USB serial connection to network devices
+Handles USB serial connection to network devices, and telnet/SSH
+connections through the same executor (see transports.py)
 """
 
-import serial
 import time
 import sys
 import json
+import re
+import argparse
+
+from config_delta import parse_config, plan_delta, restore_commands
+from console_log import LOG_LINE_PATTERN, ConsoleLog, message_from_match
+from latency_model import DEFAULT_PROFILE_PATH, MAX_DEADLINE, LatencyModel, command_class
+from output_spool import DEFAULT_SPOOL_DIR, SPOOL_THRESHOLD, OutputSpool
+from show_cache import affected_shows, is_cacheable, normalize_show
+from show_parsers import parse_output, records_as_dicts
+from transports import DEFAULT_POOL, device_key, is_network_port, open_transport
+
+# IOS prompt at the end of the buffer: hostname, optional config mode, '>' or '#'
+# e.g. "Switch>", "Switch#", "SW-Office-Main(config-if)#"
+PROMPT_REGEX = r'(?:^|[\r\n])([A-Za-z0-9][\w.\-]*)(?:\((config[^)]*)\))?([>#])[ \t]*$'
+PROMPT_PATTERN = re.compile(PROMPT_REGEX)
+PROMPT_BYTES_PATTERN = re.compile(PROMPT_REGEX.encode('ascii'))
+
+# Longest time a single blocking read may wait before the deadline is re-checked
+READ_POLL_INTERVAL = 0.05
+
+# While output keeps arriving, a command's deadline stays at least this far ahead
+OUTPUT_GRACE = 5.0
+
+# IOS pager prompt and the backspace/space sequence it prints to erase itself
+MORE_REGEX = r' ?--More-- ?|\x08+ +\x08+'
+MORE_PATTERN = re.compile(MORE_REGEX)
+MORE_BYTES_PATTERN = re.compile(MORE_REGEX.encode('ascii'))
+
+# Receive buffer: initial size, how far back a prompt can start, and how much
+# already-scanned data is rescanned for pager text split across reads
+RECEIVE_BUFFER_SIZE = 64 * 1024
+PROMPT_WINDOW = 256
+PAGER_OVERLAP = 32
+
+# Confirmation questions such as "[confirm]" or "Destination filename [x]? "
+CONFIRM_BYTES_PATTERN = re.compile(rb'(?:\[confirm\]|\[[^\]\r\n]*\]\?)[ \t]*$')
+
+# Console speeds tried by baudrate='auto', most common first
+COMMON_BAUDRATES = (9600, 115200, 19200, 38400, 57600)
+
+# How long a single speed probe waits for the device to answer
+BAUD_PROBE_TIMEOUT = 0.5
+
+# Device replies that mean a command was rejected
+ERROR_MARKERS = ('% Invalid input', '% Incomplete command', '% Ambiguous command', '% Unknown command', '%Error')
+
+# Config sub-modes entered from global config: (keyword, shortest abbreviation, mode)
+CONFIG_SUBMODES = (
+    ('interface', 3, 'config-if'),
+    ('vlan', 2, 'config-vlan'),
+    ('line', 2, 'config-line'),
+    ('router', 3, 'config-router'),
+)
+
+# What iter_commands does after a rejected command
+ON_ERROR_POLICIES = ('continue', 'abort', 'skip_children')
+
+# Device output that means the exec session ended (exec-timeout, 'exit', line cleared)
+LOGOUT_BYTES_PATTERN = re.compile(
+    rb'Press RETURN to get started|User Access Verification|(?:con|aux|tty|vty) ?\d+ is now available')
+
+# Sent once per session so long output arrives without --More--
+PAGING_COMMANDS = ('terminal length 0', 'terminal width 0')
+
+# IOS logs an idle line out after 'exec-timeout' (10 minutes unless configured);
+# keepalives are sent well before that, and at least this often
+EXEC_TIMEOUT = 600.0
+KEEPALIVE_INTERVAL = 60.0
+HEALTH_PROBE_TIMEOUT = 3.0
+
+# Login: overall limit, how long a silent line waits before RETURN is pressed
+# again, and what the line may print on the way to an exec prompt
+LOGIN_TIMEOUT = 20.0
+WAKE_INTERVAL = 1.0
+LOGIN_EVENTS_PATTERN = re.compile(
+    rb'(?P<username>(?:Username|[Ll]ogin): ?$)|(?P<password>[Pp]assword: ?$)'
+    rb'|(?P<dialog>\[yes/no\]: ?$)|(?P<banner>Press RETURN to get started)')
+
+# Reconnect attempts and their exponential backoff bounds (seconds)
+RECONNECT_ATTEMPTS = 5
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+def is_keyword(word, keyword, min_length):
+    """Return True if word is keyword or an IOS abbreviation of it"""
+    return len(word) >= min_length and keyword.startswith(word)
+
+def is_section_header(command):
+    """Return True if command opens a config sub-mode section such as 'interface gi0/1'"""
+    words = command.lower().split()
+    return len(words) > 1 and any(is_keyword(words[0], keyword, min_length)
+                                  for keyword, min_length, _ in CONFIG_SUBMODES)
+
+def next_mode(mode, command):
+    """Predict the CLI mode after command is accepted in mode.
+
+    Modes are 'user', 'privileged', 'config' or a config sub-mode such as
+    'config-if'. Returns None when the result cannot be predicted.
+    """
+    words = command.lower().split()
+    if mode is None or not words:
+        return mode
+    first = words[0]
+    
+    if mode == 'user':
+        if is_keyword(first, 'enable', 2):
+            return 'privileged'
+        if is_keyword(first, 'exit', 3) or is_keyword(first, 'logout', 4):
+            return None
+        return mode
+    
+    if mode == 'privileged':
+        if is_keyword(first, 'disable', 4):
+            return 'user'
+        if is_keyword(first, 'configure', 4) and (len(words) == 1 or is_keyword(words[1], 'terminal', 1)):
+            return 'config'
+        if is_keyword(first, 'exit', 3) or is_keyword(first, 'logout', 4):
+            return None
+        return mode
+    
+    # Global config or one of its sub-modes
+    if first == 'end':
+        return 'privileged'
+    if first == 'do':
+        return mode
+    if is_keyword(first, 'exit', 3):
+        return 'privileged' if mode == 'config' else 'config'
+    for keyword, min_length, submode in CONFIG_SUBMODES:
+        if is_keyword(first, keyword, min_length) and len(words) > 1:
+            if submode == 'config-if' and words[1] == 'range':
+                return 'config-if-range'
+            return submode
+    return mode
+
+def mode_from_prompt(config_mode, prompt_char):
+    """Map the parsed parts of a prompt to a mode name"""
+    if config_mode:
+        return config_mode
+    return 'privileged' if prompt_char == '#' else 'user'
+
+def is_sane_output(text):
+    """Return True if text looks like console output rather than line noise at the wrong speed"""
+    if not text.strip():
+        return False
+    printable = sum(1 for char in text if char.isprintable() or char in '\r\n\t')
+    return printable / len(text) >= 0.9
+
+def baudrate_arg(value):
+    """argparse type for --baudrate: an integer rate or 'auto'"""
+    return value if value == 'auto' else int(value)
+
+def response_has_error(response):
+    """Return True if the device rejected the command or never answered"""
+    if response.startswith(("No response from device", "Command error", "No connection established",
+                            "Session lost")):
+        return True
+    return any(marker in response for marker in ERROR_MARKERS)
 
 class SerialExecutor:
-    def __init__(self, port='/dev/ttyUSB0', baudrate=9600, timeout=3, password=''):
-        """Initialize serial connection parameters"""
+    def __init__(self, port='/dev/ttyUSB0', baudrate=9600, timeout=3, password='',
+                 command_timeout=10, upshift_baudrate=None, metrics_hook=None, show_cache=None,
+                 archive_url=None, username=None, transport_pool=None, exec_timeout=EXEC_TIMEOUT,
+                 console_log=None, latency_model=None, output_spool=None, trust_unknown_hosts=None):
+        """Initialize serial connection parameters
+
+        port is a serial device or a 'telnet://host:port' / 'ssh://user@host'
+        URL; network connections are taken from transport_pool (default:
+        transports.DEFAULT_POOL) and handed back to it, still logged in, on
+        close. username answers a 'Username:' login prompt. SSH host keys
+        must be in known_hosts unless trust_unknown_hosts is set (default:
+        transports.TRUST_UNKNOWN_HOSTS). exec_timeout is the line's idle
+        logout in seconds (0: never), which keepalives beat.
+        Log messages the device prints on its own (%LINK-3-UPDOWN, ...) are
+        cut out of command output into console_log (a console_log.ConsoleLog,
+        created if not given).
+
+        Commands sent without an explicit timeout wait as long as
+        latency_model (a latency_model.LatencyModel, in memory if not given)
+        expects their class of command to take on this device, with
+        command_timeout as the starting point for classes it knows nothing
+        about; every reply is fed back into the model.
+
+        With output_spool (an output_spool.OutputSpool), command output of at
+        least its threshold is streamed to a spool file while it is read: the
+        result's "response" is only a preview, "spooled" holds the handle,
+        size and SHA-256, and parsers and the config differ read the file
+        through mmap.
+
+        baudrate='auto' probes COMMON_BAUDRATES on connect. upshift_baudrate
+        raises the console line speed for the session and restores it on close.
+        metrics_hook(event, data) is called with the phase timings of every
+        'connect', 'command' and 'batch'. show_cache (a show_cache.ShowCache,
+        which may be shared between executors) answers repeated show commands
+        in execute_commands batches without a round trip. archive_url (e.g.
+        'flash:aiconsole-rollback.cfg') is where transactional batches save
+        their snapshot on the device so a rollback is one 'configure replace'.
+        """
         self.port = port
-        self.baudrate = baudrate
+        self.is_network = is_network_port(port)
+        self.transport_pool = transport_pool
+        self.username = username
+        self.trust_unknown_hosts = trust_unknown_hosts
+        self.auto_baudrate = baudrate == 'auto'
+        self.baudrate = COMMON_BAUDRATES[0] if self.auto_baudrate else baudrate
+        self.upshift_baudrate = upshift_baudrate
+        self.original_baudrate = None
         self.timeout = timeout
         self.password = password
+        self.command_timeout = command_timeout
         self.connection = None
         self.authenticated = False
+        self.last_prompt = None
+        self.last_command_time = 0.0
+        self.paging_disabled = False
+        self.receive_buffer = bytearray(RECEIVE_BUFFER_SIZE)
+        self.metrics_hook = metrics_hook
+        self.archive_url = archive_url
+        self.batch_error = None
+        self.batch_aborted = None
+        self.last_snapshot = None
+        self.last_rollback = None
+        self.show_cache = show_cache
+        self.console_log = console_log if console_log is not None else ConsoleLog()
+        self.latency_model = latency_model if latency_model is not None else LatencyModel()
+        self.output_spool = output_spool
+        self.last_spooled = None
+        self.exec_timeout = exec_timeout
+        
+        # Session health: why the session was lost (None while healthy), the
+        # last time anything was sent or received, and terminal settings to
+        # re-apply after a reconnect
+        self.session_lost = None
+        self.last_activity = None
+        self.last_known_mode = None
+        
+        # A command that timed out and whose prompt has not come back yet, and
+        # the output it printed after its deadline
+        self.busy_with = None
+        self.late_output = None
+        self.session_commands = []
+        
+        # Phase timings (seconds, time.monotonic) of the last connect and command
+        self.connect_timings = {}
+        self.last_command_stats = {}
+        self.first_byte_at = None
+        self.bytes_received = 0
+        
+        # Cached CLI state; mode is None until a prompt is seen or after a timeout
+        self.hostname = None
+        self.mode = None
     
     def connect(self):
-        """Establish serial connection and authenticate"""
+        """Establish serial connection and authenticate
+
+        Phase timings, including the time the login itself took, are left in
+        connect_timings and passed to the metrics hook.
+        """
+        timings = self.connect_timings = {}
+        phase_start = connect_start = time.monotonic()
+        
+        def end_phase(name):
+            nonlocal phase_start
+            now = time.monotonic()
+            timings[name] = round(now - phase_start, 6)
+            phase_start = now
+        
+        if self.connection:
+            # Reconnecting: hand back (or close) the current connection first
+            self.close()
+        self.session_lost = None
+        self.busy_with = None
+        self.late_output = None
         try:
-            self.connection = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=self.timeout
-            )
-            time.sleep(2)
-            
-            # Send multiple enters to wake up device
-            for _ in range(3):
-                self.connection.write(b'\r\n')
-                time.sleep(0.3)
-            
-            # Wait for initial output
-            time.sleep(2)
-            initial_output = ""
-            if self.connection.in_waiting:
-                initial_output = self.connection.read(self.connection.in_waiting).decode('utf-8', errors='ignore')
-            
-            # Check if password is required
-            if 'Password:' in initial_output or 'password:' in initial_output:
-                # Send password (empty string + Enter)
-                self.connection.write(f"{self.password}\r\n".encode('utf-8'))
-                time.sleep(1)
-                
-                # Read response
-                if self.connection.in_waiting:
-                    auth_response = self.connection.read(self.connection.in_waiting).decode('utf-8', errors='ignore')
-                    
-                    # Check if we got to a prompt
-                    if '>' in auth_response or '#' in auth_response:
-                        self.authenticated = True
-                        
-                        # Try to enter privileged mode
-                        self.connection.write(b"enable\r\n")
-                        time.sleep(1)
-                        if self.connection.in_waiting:
-                            enable_response = self.connection.read(self.connection.in_waiting).decode('utf-8', errors='ignore')
-                            
-                            # If it asks for password again, send empty
-                            if 'Password:' in enable_response:
-                                self.connection.write(f"{self.password}\r\n".encode('utf-8'))
-                                time.sleep(1)
-                                if self.connection.in_waiting:
-                                    self.connection.read(self.connection.in_waiting)
-            else:
-                # No password required, try to get to prompt
-                self.authenticated = True
+            self.connection = self.open_connection()
+            end_phase('port_open')
+            if self.resume_session():
+                end_phase('resume')
+                self.last_activity = time.monotonic()
+                timings['total'] = round(time.monotonic() - connect_start, 6)
+                self._emit_metrics('connect', timings)
+                return True
+            if self.auto_baudrate and not self.is_network:
+                if self.detect_baudrate() is None:
+                    print(f"Connection error: no console speed in {COMMON_BAUDRATES} answered", file=sys.stderr)
+                    self.close()
+                    return False
+                end_phase('baud_detect')
+            
+            error = self.login(time.monotonic() + LOGIN_TIMEOUT)
+            if error:
+                print(f"Connection error: {error}", file=sys.stderr)
+                self.close()
+                return False
+            end_phase('login')
             
+            self.disable_paging()
+            end_phase('paging')
+            if self.upshift_baudrate and self.upshift_baudrate != self.baudrate and not self.is_network:
+                if self.upshift():
+                    end_phase('upshift')
+                else:
+                    print(f"Connection warning: console speed left at {self.baudrate}, "
+                          f"upshift to {self.upshift_baudrate} failed", file=sys.stderr)
+                    end_phase('upshift_failed')
+            self.last_activity = time.monotonic()
+            timings['total'] = round(time.monotonic() - connect_start, 6)
+            self._emit_metrics('connect', timings)
             return True
         except Exception as e:
-            print(f"Connection error: {e}")
+            print(f"Connection error: {e}", file=sys.stderr)
             return False
     
-    def get_current_prompt(self):
-        """Get the current prompt from the switch (e.g., Switch>, Switch#, Switch(config)#)"""
+    def open_connection(self):
+        """Open the serial port, or take a telnet/SSH connection from the pool"""
+        if self.is_network:
+            pool = self.transport_pool or DEFAULT_POOL
+            return pool.acquire(self.port, timeout=self.timeout, username=self.username,
+                                password=self.password, trust_unknown_hosts=self.trust_unknown_hosts)
+        return open_transport(self.port, self.baudrate, self.timeout)
+    
+    def resume_session(self):
+        """Pick up a pooled connection that is still logged in; False for a fresh one"""
+        state = getattr(self.connection, 'session_state', None)
+        if not state:
+            return False
+        self.connection.session_state = {}
+        self.hostname = state.get('hostname')
+        self.mode = None
+        self.get_current_prompt(refresh=True)
+        if self.mode not in ('user', 'privileged'):
+            # The line was logged out or left somewhere unexpected: log in again
+            self.mode = None
+            return False
+        self.authenticated = True
+        self.paging_disabled = state.get('paging_disabled', False)
+        return True
+    
+    def release_connection(self):
+        """Hand a logged-in network connection back to the pool at the exec prompt"""
+        connection = self.connection
+        try:
+            if self.mode is not None and self.mode.startswith('config'):
+                self.send_command("end")
+        except Exception:
+            pass
+        if self.mode not in ('user', 'privileged') or not connection.is_open:
+            connection.close()
+            return
+        connection.session_state = {
+            "hostname": self.hostname,
+            "paging_disabled": self.paging_disabled
+        }
+        (self.transport_pool or DEFAULT_POOL).release(connection)
+    
+    def detect_baudrate(self, candidates=COMMON_BAUDRATES):
+        """Find the console speed by probing candidate rates for a sane prompt"""
+        for rate in candidates:
+            self.connection.baudrate = rate
+            self.connection.reset_input_buffer()
+            self.connection.write(b'\r\n')
+            response, prompt_seen = self.read_until_prompt(time.monotonic() + BAUD_PROBE_TIMEOUT)
+            if is_sane_output(response) and (prompt_seen or 'assword:' in response or 'RETURN' in response):
+                self.baudrate = rate
+                return rate
+        return None
+    
+    def set_line_speed(self, rate):
+        """Change 'line con 0' speed on the device and follow it locally.
+
+        Must be called from privileged or global config mode. Returns True if
+        the device answered at the new rate.
+        """
+        previous_rate = self.connection.baudrate
+        from_privileged = self.mode == 'privileged'
+        if from_privileged:
+            self.send_command("configure terminal")
+        self.send_command("line con 0")
+        
+        # The reply to 'speed' arrives at either rate, so drain it blind and switch
+        self.connection.reset_input_buffer()
+        self.connection.write(f"speed {rate}\r\n".encode('utf-8'))
+        self.connection.flush()
+        self.connection.baudrate = rate
+        
+        changed = self._probe_prompt()
+        if not changed:
+            # Device kept the old speed (command rejected or not supported)
+            self.connection.baudrate = previous_rate
+            self._probe_prompt()
+        
+        self.send_command("end" if from_privileged else "exit")
+        if changed:
+            self.baudrate = rate
+        return changed
+    
+    def _probe_prompt(self, attempts=3):
+        for _ in range(attempts):
+            self.connection.reset_input_buffer()
+            self.connection.write(b'\r\n')
+            response, prompt_seen = self.read_until_prompt(time.monotonic() + BAUD_PROBE_TIMEOUT)
+            if prompt_seen and is_sane_output(response):
+                return True
+        self.mode = None
+        return False
+    
+    def upshift(self):
+        """Raise the console speed for this session; close() restores it.
+
+        'line con 0' needs privileged exec, so a console at user exec is
+        enabled first and stays enabled.
+        """
+        if not self.ensure_privileged():
+            return False
+        original_rate = self.baudrate
+        if self.set_line_speed(self.upshift_baudrate):
+            self.original_baudrate = original_rate
+            return True
+        return False
+    
+    def ensure_privileged(self):
+        """Send 'enable' from user exec; True once in privileged exec or config mode"""
+        if self.mode is None:
+            self.get_current_prompt(refresh=True)
+        if self.mode == 'user':
+            self.enable(time.monotonic() + LOGIN_TIMEOUT)
+        return self.mode is not None and (self.mode == 'privileged' or self.mode.startswith('config'))
+    
+    def disable_paging(self):
+        """Turn off the pager once per session so long output arrives in one pass.
+
+        'terminal' commands only exist in exec mode, so a console left in
+        config mode is taken out of it first. If the device rejects
+        'terminal length 0', paging stays on and --More-- keeps being answered.
+        """
+        if self.paging_disabled or not self.leave_config_mode():
+            return
+        accepted = True
+        for command in PAGING_COMMANDS:
+            response = self.send_command(command)
+            if command.startswith('terminal length') and (
+                    self.mode is None or response_has_error(response)
+                    or any(line.lstrip().startswith('%') for line in response.splitlines())):
+                accepted = False
+        self.paging_disabled = accepted
+    
+    def read_until_prompt(self, deadline, confirm=False, separate_logs=True, hard_deadline=None, spool=None):
+        """Read until the device prints a prompt or the deadline passes.
+
+        Bytes land directly in the preallocated receive buffer, only the newly
+        arrived tail is scanned, and the text is decoded once at the end.
+        With confirm=True, confirmation questions are answered with RETURN.
+        With separate_logs, complete log lines are moved to console_log as
+        they arrive, so they never hide the prompt or reach the response.
+        With a hard_deadline, output that is still arriving pushes the
+        deadline out by OUTPUT_GRACE, up to hard_deadline. With a spool (an
+        output_spool.SpoolWriter), output beyond its threshold goes to the
+        spool file as it arrives and the response comes back empty.
+        Returns a tuple (response, prompt_seen).
+        """
+        buffer = self.receive_buffer
+        length = 0
+        answered = 0
+        lines_checked = 0
+        self.first_byte_at = None
+        self.bytes_received = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._finish_received(length, spool), False
+            
+            # Block for the first byte instead of sleeping, then drain what is queued
+            self.connection.timeout = min(remaining, READ_POLL_INTERVAL)
+            wanted = max(1, self.connection.in_waiting)
+            if length + wanted > len(buffer):
+                buffer.extend(bytes(max(len(buffer), wanted)))
+            with memoryview(buffer) as view:
+                received = self.connection.readinto(view[length:length + wanted])
+            if not received:
+                continue
+            if self.first_byte_at is None:
+                self.first_byte_at = time.monotonic()
+            self.bytes_received += received
+            if hard_deadline is not None:
+                deadline = max(deadline, min(hard_deadline, time.monotonic() + OUTPUT_GRACE))
+            
+            scan_start = max(0, length - PAGER_OVERLAP)
+            length += received
+            
+            # Fallback when paging is still on: answer --More-- and drop it from the output
+            if buffer.find(b'--More--', scan_start, length) != -1 or buffer.find(b'\x08', scan_start, length) != -1:
+                length = self._strip_pager(scan_start, length)
+            
+            if separate_logs:
+                line_end = buffer.rfind(b'\n', lines_checked, length) + 1
+                if line_end:
+                    if buffer.find(b'%', lines_checked, line_end) != -1:
+                        length, line_end = self._separate_logs(lines_checked, line_end, length)
+                    lines_checked = line_end
+            
+            if LOGOUT_BYTES_PATTERN.search(buffer, scan_start, length):
+                self.mark_session_lost("the device ended the exec session (exec-timeout or logout)")
+                return self._finish_received(length, spool), False
+            
+            if confirm:
+                question = CONFIRM_BYTES_PATTERN.search(buffer, max(answered, length - PROMPT_WINDOW), length)
+                if question:
+                    self.connection.write(b'\r')
+                    answered = length
+                    continue
+            
+            if self._take_prompt(length):
+                return self._finish_received(length, spool), True
+            
+            if spool is not None and length >= spool.threshold:
+                # Keep the last complete line: a log message may still take its line break
+                complete = lines_checked - 2 if separate_logs else length
+                cut = self._spill(spool, min(complete, length - PROMPT_WINDOW), length)
+                length -= cut
+                lines_checked = max(0, lines_checked - cut)
+                answered = max(0, answered - cut)
+    
+    def _spill(self, spool, limit, length):
+        """Move the whole lines before buffer[limit] to spool; returns how many bytes went"""
+        buffer = self.receive_buffer
+        cut = buffer.rfind(b'\n', 0, limit) + 1 if limit > 0 else 0
+        if cut:
+            with memoryview(buffer) as view:
+                spool.write(view[:cut])
+                view[:length - cut] = view[cut:length]
+        return cut
+    
+    def _finish_received(self, length, spool):
+        """Decode the received output, or hand it to spool if it is spooled"""
+        if spool is not None and (spool.size or length >= spool.threshold):
+            with memoryview(self.receive_buffer) as view:
+                spool.write(view[:length])
+            response = ''
+        else:
+            response = self._decode_received(length)
+        self._shrink_receive_buffer()
+        return response
+    
+    def _shrink_receive_buffer(self):
+        """Give back what one large output grew the buffer to, once it has been read out"""
+        if len(self.receive_buffer) > RECEIVE_BUFFER_SIZE:
+            self.receive_buffer = bytearray(RECEIVE_BUFFER_SIZE)
+    
+    def _separate_logs(self, start, end, length):
+        """Move log lines in the complete lines buffer[start:end] to console_log.
+
+        Each message goes together with the line break the device prints
+        ahead of it, which also rejoins a line the message interrupted.
+        Returns the new (length, end).
+        """
+        buffer = self.receive_buffer
+        matches = list(LOG_LINE_PATTERN.finditer(buffer, start, end))
+        if not matches:
+            return length, end
+        spans = []
+        previous_finish = 0
+        for match in matches:
+            self.console_log.put(message_from_match(match))
+            begin, finish = match.span()
+            if begin - 2 >= previous_finish and buffer[begin - 2:begin] == b'\r\n':
+                begin -= 2
+            elif begin - 1 >= previous_finish and buffer[begin - 1] == 0x0a:
+                begin -= 1
+            spans.append((begin, finish))
+            previous_finish = finish
+        with memoryview(buffer) as view:
+            for begin, finish in reversed(spans):
+                view[begin:length - (finish - begin)] = view[finish:length]
+                length -= finish - begin
+                end -= finish - begin
+        return length, end
+    
+    def drain_unsolicited(self):
+        """Discard pending input before a command, keeping any log messages in it"""
+        waiting = self.connection.in_waiting
+        if not waiting:
+            return
+        buffer = self.receive_buffer
+        if waiting > len(buffer):
+            buffer.extend(bytes(waiting - len(buffer)))
+        self.connection.timeout = 0
+        with memoryview(buffer) as view:
+            length = self.connection.readinto(view[:waiting])
+        if buffer.find(b'%', 0, length) != -1:
+            self._separate_logs(0, buffer.rfind(b'\n', 0, length) + 1, length)
+        self.connection.reset_input_buffer()
+        self._shrink_receive_buffer()
+    
+    def _take_prompt(self, length):
+        """If buffer[:length] ends in a prompt, adopt its hostname and mode"""
+        match = PROMPT_BYTES_PATTERN.search(self.receive_buffer, max(0, length - PROMPT_WINDOW), length)
+        if not match:
+            return False
+        self.last_prompt = match.group(0).strip().decode('utf-8', errors='ignore')
+        self.hostname = match.group(1).decode('utf-8', errors='ignore')
+        config_mode = match.group(2).decode('utf-8', errors='ignore') if match.group(2) else None
+        self.mode = self.last_known_mode = mode_from_prompt(config_mode, match.group(3).decode('ascii'))
+        self.last_activity = time.monotonic()
+        return True
+    
+    def wait_login_event(self, deadline):
+        """Read until the line prints something login has to react to.
+
+        Returns 'prompt', 'username', 'password', 'dialog' (the initial
+        configuration dialog question), 'banner' (Press RETURN), or None if
+        the line stayed quiet until the deadline. Pager prompts are answered
+        on the way.
+        """
+        buffer = self.receive_buffer
+        length = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.connection.timeout = min(remaining, READ_POLL_INTERVAL)
+            wanted = max(1, self.connection.in_waiting)
+            if length + wanted > len(buffer):
+                buffer.extend(bytes(max(len(buffer), wanted)))
+            with memoryview(buffer) as view:
+                received = self.connection.readinto(view[length:length + wanted])
+            if not received:
+                continue
+            scan_start = max(0, length - PAGER_OVERLAP)
+            length += received
+            if buffer.find(b'--More--', scan_start, length) != -1:
+                length = self._strip_pager(scan_start, length)
+            
+            event = LOGIN_EVENTS_PATTERN.search(buffer, max(0, length - PROMPT_WINDOW), length)
+            if event:
+                return event.lastgroup
+            if self._take_prompt(length):
+                return 'prompt'
+    
+    def login(self, deadline):
+        """Event-driven login: answer what the line prints until an exec prompt shows.
+
+        A line already at a prompt takes one RETURN and one round trip. With a
+        password set, a session that lands in user mode (also one that SSH
+        authenticated without an in-band prompt) is taken to privileged mode.
+        Returns None on success or the reason the login failed.
+        """
+        self.mode = None
+        self.session_lost = None
+        self.connection.reset_input_buffer()
+        self.connection.write(b'\r')
+        answered = {'username': 0, 'password': 0}
+        while True:
+            event = self.wait_login_event(min(deadline, time.monotonic() + WAKE_INTERVAL))
+            if event == 'prompt':
+                break
+            if event is None:
+                if time.monotonic() >= deadline:
+                    return f"no prompt within {LOGIN_TIMEOUT:g}s"
+                # Quiet line (asleep or still booting): press RETURN again
+                self.connection.write(b'\r')
+            elif event == 'banner':
+                self.connection.write(b'\r')
+            elif event == 'dialog':
+                self.connection.write(b'no\r')
+            elif answered[event]:
+                return f"{event} rejected"
+            elif event == 'username' and not self.username:
+                return "the line asks for a username and none was given"
+            else:
+                answered[event] += 1
+                secret = self.username if event == 'username' else self.password
+                self.connection.write(f"{secret}\r".encode('utf-8'))
+        self.authenticated = True
+        
+        if self.password and self.mode == 'user' and not self.enable(deadline):
+            print("Connection warning: enable password rejected, staying in user mode", file=sys.stderr)
+        return None
+    
+    def enable(self, deadline):
+        """Send 'enable', answering the password prompt; True once the '#' prompt is back"""
+        self.connection.write(b'enable\r')
+        event = self.wait_login_event(deadline)
+        if event == 'password':
+            self.connection.write(f"{self.password}\r".encode('utf-8'))
+            event = self.wait_login_event(deadline)
+            # A rejected password is asked for again; empty answers let IOS give up
+            while event == 'password':
+                self.connection.write(b'\r')
+                event = self.wait_login_event(deadline)
+        if event != 'prompt':
+            self.mode = None
+        return self.mode == 'privileged'
+    
+    def _strip_pager(self, start, length):
+        """Answer a pending --More-- and remove pager text from buffer[start:length]"""
+        buffer = self.receive_buffer
+        more = buffer.rfind(b'--More--', start, length)
+        if more != -1 and not buffer[more + 8:length].strip():
+            self.connection.write(b' ')
+        
+        matches = list(MORE_BYTES_PATTERN.finditer(buffer, start, length))
+        with memoryview(buffer) as view:
+            for match in reversed(matches):
+                begin, end = match.span()
+                view[begin:length - (end - begin)] = view[end:length]
+                length -= end - begin
+        return length
+    
+    def _decode_received(self, length):
+        with memoryview(self.receive_buffer) as view:
+            return str(view[:length], 'utf-8', 'ignore')
+    
+    def cached_prompt(self):
+        """Build the prompt from the tracked state, or None if the mode is unknown"""
+        if self.mode is None or not self.hostname:
+            return None
+        if self.mode == 'user':
+            return f"{self.hostname}>"
+        if self.mode == 'privileged':
+            return f"{self.hostname}#"
+        return f"{self.hostname}({self.mode})#"
+    
+    def get_current_prompt(self, refresh=False):
+        """Get the current prompt from the switch (e.g., Switch>, Switch#, Switch(config)#)
+
+        The tracked mode is answered without touching the port; the device is
+        only probed when the mode is unknown (first call, error or timeout) or
+        when refresh is True.
+        """
         if not self.connection:
             return "Switch>"
         
+        prompt = self.cached_prompt()
+        if prompt and not refresh:
+            return prompt
+        
         try:
-            # Clear buffer
-            self.connection.reset_input_buffer()
+            # RETURN must not reach a command that is still running, nor take its prompt
+            if self.busy_with and not self.finish_timed_out(time.monotonic() + 2):
+                return "Switch>"
+            if self.mode is not None and not refresh:
+                return self.last_prompt
+            
+            # Clear buffer, keeping log messages
+            self.drain_unsolicited()
             
             # Send enter to get prompt
             self.connection.write(b"\r\n")
-            time.sleep(0.5)
+            response, prompt_seen = self.read_until_prompt(time.monotonic() + 2)
+            if prompt_seen:
+                return self.last_prompt
             
-            # Read response
-            response = ""
-            if self.connection.in_waiting:
-                response = self.connection.read(self.connection.in_waiting).decode('utf-8', errors='ignore')
+            self.mode = None
             
             # Extract the last line which should be the prompt
             lines = [line.strip() for line in response.split('\n') if line.strip()]
@@ -105,89 +770,700 @@ class SerialExecutor:
             
             return "Switch>"
         except:
+            self.mode = None
             return "Switch>"
     
-    def send_command(self, command):
-        """Send single command and get response"""
+    def send_command(self, command, timeout=None, confirm=False, spool=False):
+        """Send single command and read the response up to the next prompt
+
+        confirm=True accepts the default answer of any confirmation question.
+        With spool=True and an output_spool, a large output is spooled: the
+        preview is returned and the SpooledOutput is left in last_spooled.
+        Without a timeout the deadline comes from the latency model. A
+        command that times out is still running as far as the device is
+        concerned: the next command first waits up to its own deadline for
+        that prompt, leaving the late output in late_output, and is not sent
+        while the device is still busy. Phase timings, byte counts, the
+        deadline and whether it passed are left in last_command_stats.
+        """
+        self.last_command_time = 0.0
+        self.last_command_stats = {}
+        self.last_spooled = None
         if not self.connection:
             return "No connection established"
+        if self.session_lost:
+            # Fail at once instead of waiting out the timeout on a dead line
+            return f"Session lost: {self.session_lost}"
         
+        writer = self.output_spool.writer() if spool and self.output_spool is not None else None
         try:
-            # Clear input buffer
-            self.connection.reset_input_buffer()
+            if timeout is None:
+                timeout = self.latency_model.deadline(self.latency_device(), command, self.mode,
+                                                      self.command_timeout)
+            if self.busy_with and not self.finish_timed_out(time.monotonic() + timeout):
+                self.last_command_stats = {"timed_out": True, "deadline": timeout}
+                return f"No response from device: still busy with '{self.busy_with}'"
+            
+            # Clear input buffer; log messages that arrived since the last prompt are kept
+            self.drain_unsolicited()
+            
+            mode = self.mode
+            start_time = time.monotonic()
+            deadline = start_time + timeout
             
             # Send command with \r\n (carriage return + line feed)
-            self.connection.write(f"{command}\r\n".encode('utf-8'))
-            
-            # Wait longer for response
-            time.sleep(2)
-            
-            # Read response with longer timeout
-            response = ""
-            max_wait = 5  # Wait up to 5 seconds
-            start_time = time.time()
-            
-            while time.time() - start_time < max_wait:
-                if self.connection.in_waiting:
-                    data = self.connection.read(self.connection.in_waiting)
-                    response += data.decode('utf-8', errors='ignore')
-                    time.sleep(0.2)
-                    
-                    # If we got some response, wait a bit more for complete output
-                    if response and time.time() - start_time > 1:
-                        # Check if output seems complete (ends with prompt or similar)
-                        if any(marker in response for marker in ['#', '>', 'Switch', 'Router']):
-                            break
-                else:
-                    time.sleep(0.1)
+            payload = f"{command}\r\n".encode('utf-8')
+            self.connection.write(payload)
+            written_at = time.monotonic()
+            
+            # Predict the new mode; the prompt that comes back overrides it
+            self.mode = next_mode(self.mode, command)
+            
+            # Return as soon as the prompt comes back; the deadline only bounds silent devices
+            normalized = normalize_show(command)
+            # 'show logging' output is made of log lines that were asked for
+            separate_logs = normalized is None or not normalized.startswith('show logging')
+            response, prompt_seen = self.read_until_prompt(deadline, confirm, separate_logs,
+                                                           start_time + max(timeout, MAX_DEADLINE), writer)
+            end_time = time.monotonic()
+            self.last_command_time = end_time - start_time
+            self._record_command_stats(len(payload), start_time, written_at, end_time,
+                                       command_class(command, mode), timeout)
+            if self.session_lost:
+                return f"Session lost: {self.session_lost}"
+            self.latency_model.observe(self.latency_device(), command, mode, self.last_command_time,
+                                       timed_out=not prompt_seen)
+            if writer is not None and writer.size:
+                self.last_spooled = writer.finish()
+                response = self.last_spooled.preview()
+            self.last_command_stats["timed_out"] = not prompt_seen
+            if not prompt_seen:
+                # Timed out: the device may still be working on it, and the
+                # tracked mode can no longer be trusted
+                self.mode = None
+                self.busy_with = command
+            elif command.lower().startswith('term') and not response_has_error(response):
+                self.remember_terminal_setting(command)
             
             return response.strip() if response else "No response from device"
+        except OSError as e:
+            # Port unplugged or network connection dropped
+            self.mark_session_lost(str(e) or type(e).__name__)
+            return f"Session lost: {self.session_lost}"
         except Exception as e:
+            self.mode = None
             return f"Command error: {e}"
+        finally:
+            if writer is not None:
+                writer.discard()
     
-    def execute_commands(self, commands_string):
-        """Execute multiple commands from string"""
-        if not self.connect():
-            return {"success": False, "error": "Failed to connect"}
-        
+    def finish_timed_out(self, deadline):
+        """Wait for the prompt of the command that timed out; True once the device is free.
+
+        Whatever it printed in the meantime is added to late_output.
+        """
+        response, prompt_seen = self.read_until_prompt(deadline, hard_deadline=deadline)
+        if self.late_output is None or self.late_output["command"] != self.busy_with:
+            self.late_output = {"command": self.busy_with, "response": ""}
+        self.late_output["response"] += response
+        if prompt_seen:
+            self.late_output["response"] = self.late_output["response"].strip()
+            self.busy_with = None
+        return prompt_seen
+    
+    def latency_device(self):
+        """Name the latency model files this device's timings under: the port, not the
+        hostname, which factory-default devices share and 'hostname' changes"""
+        return device_key(self.port)
+    
+    def remember_terminal_setting(self, command):
+        """Keep a 'terminal ...' line to re-apply after a reconnect (latest value per setting)"""
+        setting = ' '.join(command.lower().split()[:2])
+        self.session_commands = [saved for saved in self.session_commands
+                                 if ' '.join(saved.lower().split()[:2]) != setting]
+        self.session_commands.append(command)
+    
+    def mark_session_lost(self, reason):
+        """Record that the session is gone; commands fail fast until reconnect()"""
+        self.session_lost = reason
+        self.authenticated = False
+        self.mode = None
+    
+    def keepalive_interval(self):
+        """Seconds of idleness after which a keepalive is due: well inside exec-timeout"""
+        if not self.exec_timeout:
+            return KEEPALIVE_INTERVAL
+        return min(KEEPALIVE_INTERVAL, self.exec_timeout / 2)
+    
+    def idle_time(self):
+        if self.last_activity is None:
+            return None
+        return time.monotonic() - self.last_activity
+    
+    def probe(self, timeout=HEALTH_PROBE_TIMEOUT):
+        """Keepalive and health check: press RETURN and expect a prompt.
+
+        Also resets the line's exec-timeout. Returns False, with
+        session_lost set, if the session is gone.
+        """
+        if not self.is_connected() or self.session_lost:
+            return False
+        try:
+            if self.busy_with:
+                # A command is still running, so the line is not idle and RETURN would reach it
+                self.finish_timed_out(time.monotonic() + timeout)
+                return True
+            self.drain_unsolicited()
+            self.connection.write(b'\r')
+            response, prompt_seen = self.read_until_prompt(time.monotonic() + timeout)
+        except OSError as e:
+            self.mark_session_lost(str(e) or type(e).__name__)
+            return False
+        if not prompt_seen and not self.session_lost:
+            self.mark_session_lost(f"no prompt within {timeout:g}s of a keepalive")
+        return prompt_seen and not self.session_lost
+    
+    def reconnect(self, attempts=RECONNECT_ATTEMPTS, base_delay=RECONNECT_BASE_DELAY,
+                  max_delay=RECONNECT_MAX_DELAY):
+        """Log in again with exponential backoff and restore the session state.
+
+        Privileged mode and 'terminal' settings from the lost session are
+        re-applied. Returns True once connected.
+        """
+        wanted_mode = self.last_known_mode
+        saved_commands = list(self.session_commands)
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(min(max_delay, base_delay * 2 ** (attempt - 1)))
+            self.close()
+            if self.connect():
+                self.restore_session_state(wanted_mode, saved_commands)
+                return True
+        self.close()
+        return False
+    
+    def restore_session_state(self, mode, commands):
+        if mode and mode != 'user' and self.mode == 'user':
+            self.enable(time.monotonic() + HEALTH_PROBE_TIMEOUT)
+        for command in commands:
+            # connect() has already turned the pager off
+            if ' '.join(command.lower().split()) not in PAGING_COMMANDS:
+                self.send_command(command)
+    
+    def _record_command_stats(self, bytes_sent, start_time, written_at, end_time, latency_class, deadline):
+        first_byte_at = self.first_byte_at
+        self.last_command_stats = {
+            "write": round(written_at - start_time, 6),
+            "first_byte": round(first_byte_at - written_at, 6) if first_byte_at is not None else None,
+            "prompt_wait": round(end_time - (first_byte_at or written_at), 6),
+            "total": round(end_time - start_time, 6),
+            "bytes_sent": bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_class": latency_class,
+            "deadline": round(deadline, 3)
+        }
+        self._emit_metrics('command', self.last_command_stats)
+    
+    def _emit_metrics(self, event, data):
+        """Hand a copy of the timings to metrics_hook; a failing hook never breaks a batch"""
+        if not self.metrics_hook:
+            return
+        try:
+            self.metrics_hook(event, dict(data))
+        except Exception:
+            pass
+    
+    def is_connected(self):
+        """Return True while the serial port or network connection is open"""
+        return bool(self.connection and self.connection.is_open)
+    
+    def close(self):
+        """Close the serial port, restoring the console speed if it was raised.
+
+        Logged-in network connections go back to the pool instead.
+        """
+        if self.original_baudrate and self.is_connected():
+            try:
+                if self.ensure_privileged():
+                    self.set_line_speed(self.original_baudrate)
+            except Exception:
+                pass
+        self.original_baudrate = None
+        if self.connection:
+            if self.is_network and self.authenticated:
+                self.release_connection()
+            else:
+                self.connection.close()
+        self.connection = None
+        self.authenticated = False
+        self.latency_model.save()
+        self.paging_disabled = False
+        self.mode = None
+    
+    def iter_commands(self, commands_string, parse=False, delta=False, on_error='continue',
+                      transaction=False):
+        """Execute commands on the open connection, yielding each result as its prompt returns
+
+        With parse=True, show commands that have a parser in show_parsers also
+        carry their output as a list of records under "parsed". With
+        delta=True, configure blocks are compared with the running-config and
+        lines that are already present come back with "skipped" set instead
+        of being sent.
+
+        on_error decides what happens after the device rejects a command:
+        'continue' sends the rest anyway, 'abort' skips everything after the
+        first error, and 'skip_children' skips only the lines under a failed
+        section header (interface, vlan, line, router) up to its exit.
+
+        transaction=True snapshots the running-config before the first
+        command that could change it, aborts on the first error and then
+        restores the snapshot; the outcome is left in last_rollback.
+
+        An aborted batch never leaves the console in config mode (its own
+        'end' was skipped): 'end' is sent, and the reason is left in
+        batch_aborted.
+        """
+        if on_error not in ON_ERROR_POLICIES:
+            raise ValueError(f"on_error must be one of {ON_ERROR_POLICIES}")
+        if transaction:
+            on_error = 'abort'
         commands = [cmd.strip() for cmd in commands_string.split('\n') if cmd.strip()]
-        results = []
+        self.batch_error = None
+        self.batch_aborted = None
+        self.last_snapshot = None
+        self.last_rollback = None
+        failed_section = None
         
+        # Execute commands as-is, without forcing any mode
+        for command, skip_reason in self.plan_commands(commands, delta, on_error == 'abort', transaction):
+            if skip_reason is None and self.batch_error and on_error == 'abort':
+                skip_reason = f"aborted after '{self.batch_error}' failed"
+            elif skip_reason is None and failed_section:
+                if is_section_header(command) or command.split()[0].lower() == 'end':
+                    failed_section = None
+                else:
+                    skip_reason = f"parent '{failed_section}' failed"
+                    if is_keyword(command.split()[0].lower(), 'exit', 3):
+                        failed_section = None
+            if skip_reason is not None:
+                yield self.skipped_result(command, skip_reason)
+                continue
+            
+            mode = self.mode
+            result = self.command_result(command, parse)
+            if result["error"]:
+                self.batch_error = self.batch_error or command
+                if (on_error == 'skip_children' and mode and mode.startswith('config')
+                        and is_section_header(command)):
+                    failed_section = command
+            yield result
+        
+        if on_error == 'abort' and self.batch_error:
+            self.batch_aborted = f"aborted after '{self.batch_error}' failed"
+            self.leave_config_mode()
+        if transaction and self.batch_error and self.last_snapshot:
+            self.last_rollback = self.rollback(self.last_snapshot)
+    
+    def leave_config_mode(self):
+        """Return to privileged exec if the console is (or may be) in config mode; True once out"""
+        if not self.is_connected() or self.session_lost:
+            return False
+        if self.mode is None:
+            self.get_current_prompt(refresh=True)
+        if self.mode and self.mode.startswith('config'):
+            self.send_command("end")
+            if self.mode is None:
+                self.get_current_prompt(refresh=True)
+        return self.mode is not None and not self.mode.startswith('config')
+    
+    def plan_commands(self, commands, delta=False, stop_on_error=False, transaction=False):
+        """Yield (command, skip_reason) pairs, diffing configure blocks when delta is set.
+
+        Lazy on purpose: for delta, the running-config is fetched only once
+        the batch has reached privileged mode and is about to enter config
+        mode. A transaction is snapshotted before the first command that runs
+        outside user mode (where nothing can change), whatever mode the batch
+        starts in, and is refused if that fails.
+        """
+        for index, command in enumerate(commands):
+            if (transaction and self.last_snapshot is None and self.mode != 'user'
+                    and not (stop_on_error and self.batch_error)):
+                if self.mode is None:
+                    self.get_current_prompt(refresh=True)
+                self.last_snapshot = self.snapshot_config() if self.mode != 'user' else None
+                if self.last_snapshot is None and self.mode != 'user':
+                    # Never change a device that could not be snapshotted
+                    self.batch_error = command
+                    for remaining in commands[index:]:
+                        yield remaining, "no pre-change snapshot"
+                    return
+            entering_config = (self.mode == 'privileged' and next_mode(self.mode, command) == 'config'
+                               and not (stop_on_error and self.batch_error))
+            if entering_config and delta:
+                if self.last_snapshot:
+                    running = {"error": False, "response": self.last_snapshot["config"]}
+                else:
+                    # Straight from the device: a stale cached config would skip lines that are needed
+                    running = self.run_command("show running-config")
+                if not running["error"]:
+                    yield from plan_delta(parse_config(self.full_output(running)), commands[index:])
+                    return
+                # Without the running-config there is nothing to compare against
+                delta = False
+            yield command, None
+    
+    def snapshot_config(self):
+        """Capture the running-config before a change, from privileged exec or
+        (with 'do') from config mode.
+
+        With archive_url set, the snapshot is also copied to the device so
+        rollback() can use 'configure replace'. Returns None on failure.
+        """
+        if self.mode is None or not (self.mode == 'privileged' or self.mode.startswith('config')):
+            return None
+        prefix = 'do ' if self.mode.startswith('config') else ''
+        start_time = time.monotonic()
+        response = self.send_command(f"{prefix}show running-config", spool=True)
+        if response_has_error(response) or 'hostname' not in response:
+            return None
+        snapshot = {"config": self.last_spooled or response, "url": None}
+        if self.archive_url:
+            copied = self.send_command(f"{prefix}copy running-config {self.archive_url}", confirm=True)
+            if not response_has_error(copied):
+                snapshot["url"] = self.archive_url
+        snapshot["elapsed"] = round(time.monotonic() - start_time, 6)
+        return snapshot
+    
+    def rollback(self, snapshot):
+        """Restore a snapshot taken by snapshot_config().
+
+        Uses 'configure replace' when the snapshot was archived on the device,
+        otherwise pushes the inverse delta between the snapshot and the
+        current running-config in one configure block.
+        """
+        start_time = time.monotonic()
+        if self.mode and self.mode.startswith('config'):
+            self.send_command("end")
+        
+        method = None
+        failed = []
+        commands = []
+        if snapshot.get("url"):
+            commands = [f"configure replace {snapshot['url']} force"]
+            response = self.send_command(commands[0], confirm=True)
+            if not response_has_error(response):
+                method = 'configure_replace'
+        
+        if method is None:
+            method = 'inverse_delta'
+            current = self.send_command("show running-config", spool=True)
+            if response_has_error(current):
+                failed.append("show running-config")
+                commands = []
+            else:
+                commands = restore_commands(parse_config(snapshot["config"]),
+                                            parse_config(self.last_spooled or current))
+                if commands:
+                    commands = ["configure terminal"] + commands + ["end"]
+            for command in commands:
+                if response_has_error(self.send_command(command)):
+                    failed.append(command)
+        
+        if self.show_cache is not None:
+            self.show_cache.invalidate(self.port)
+        return {
+            "success": not failed,
+            "method": method,
+            "commands": commands,
+            "failed": failed,
+            "snapshot_time": snapshot.get("elapsed"),
+            "elapsed": round(time.monotonic() - start_time, 6)
+        }
+    
+    def skipped_result(self, command, reason):
+        return {
+            "command": command,
+            "response": "",
+            "elapsed": 0.0,
+            "error": False,
+            "skipped": reason,
+            "timings": {"write": 0.0, "first_byte": None, "prompt_wait": 0.0, "total": 0.0},
+            "bytes_sent": 0,
+            "bytes_received": 0
+        }
+    
+    def command_result(self, command, parse=False):
+        """Result for one command, from the show cache when possible"""
+        result = self.cached_result(command)
+        if result is None:
+            result = self.run_command(command)
+        if parse and not result["error"]:
+            parsed = records_as_dicts(parse_output(command, self.full_output(result)))
+            if parsed is not None:
+                result["parsed"] = parsed
+        return result
+    
+    def run_command(self, command):
+        """Send command and build its result, keeping the show cache in step"""
+        mode = self.mode
+        response = self.send_command(command, spool=True)
+        stats = self.last_command_stats
+        result = {
+            "command": command,
+            "response": response,
+            "elapsed": round(self.last_command_time, 3),
+            "error": response_has_error(response) or stats.get("timed_out", False),
+            "timings": {phase: stats.get(phase) for phase in ("write", "first_byte", "prompt_wait", "total")},
+            "bytes_sent": stats.get("bytes_sent", 0),
+            "bytes_received": stats.get("bytes_received", 0)
+        }
+        if self.last_spooled is not None:
+            result["spooled"] = self.last_spooled.as_dict()
+        if stats.get("timed_out"):
+            result["timed_out"] = True
+        if self.late_output is not None and not self.busy_with:
+            # The earlier command that timed out finished while this one waited
+            result["late_output"], self.late_output = self.late_output, None
+        
+        if self.show_cache is not None:
+            normalized = normalize_show(command)
+            if normalized is None:
+                # Anything that may change the device drops the show output it affects
+                stale = affected_shows(mode, command)
+                if stale != ():
+                    self.show_cache.invalidate(self.port, stale)
+            elif (is_cacheable(normalized) and self.can_use_cached_show(mode, command) and not result["error"]
+                  and "spooled" not in result):
+                self.show_cache.put(self.port, normalized, response)
+        return result
+    
+    def full_output(self, result):
+        """A result's whole output: its response, or its spool file (iterable over lines) if it was spooled"""
+        spooled = result.get("spooled")
+        if spooled and self.output_spool is not None:
+            output = self.output_spool.get(spooled["handle"])
+            if output is not None:
+                return output
+        return result["response"]
+    
+    @staticmethod
+    def can_use_cached_show(mode, command):
+        # Cached output is only valid where the device would have run the show:
+        # privileged exec, or 'do show' from config
+        if mode == 'privileged':
+            return True
+        return bool(mode) and mode.startswith('config') and command.lstrip().lower().startswith('do ')
+    
+    def cached_result(self, command):
+        """Result for command from the show cache, or None if it has to go to the device"""
+        if self.show_cache is None or not self.can_use_cached_show(self.mode, command):
+            return None
+        normalized = normalize_show(command)
+        if not is_cacheable(normalized):
+            return None
+        response = self.show_cache.get(self.port, normalized)
+        if response is None:
+            return None
+        return {
+            "command": command,
+            "response": response,
+            "elapsed": 0.0,
+            "error": False,
+            "cached": True,
+            "timings": {"write": 0.0, "first_byte": None, "prompt_wait": 0.0, "total": 0.0},
+            "bytes_sent": 0,
+            "bytes_received": 0
+        }
+    
+    def run_commands(self, commands_string, parse=False, delta=False, on_error='continue',
+                     transaction=False):
+        """Execute multiple commands on the already open connection
+
+        Besides the per-command results, the batch lists which commands were
+        applied, which failed and which were skipped, and for a transaction
+        that failed, how the rollback went.
+        """
         try:
             # Get current prompt state
+            start_time = time.monotonic()
             current_prompt = self.get_current_prompt()
+            probed_at = time.monotonic()
+            results = list(self.iter_commands(commands_string, parse, delta, on_error, transaction))
+            end_time = time.monotonic()
             
-            # Execute commands as-is, without forcing any mode
-            for command in commands:
-                response = self.send_command(command)
-                results.append({
-                    "command": command,
-                    "response": response
-                })
-                time.sleep(0.5)
+            timings = {"prompt_probe": round(probed_at - start_time, 6)}
+            for phase in ("write", "first_byte", "prompt_wait"):
+                timings[phase] = round(sum(result["timings"][phase] or 0 for result in results), 6)
+            timings["commands"] = round(end_time - probed_at, 6)
+            timings["total"] = round(end_time - start_time, 6)
+            batch = {
+                "applied": [result["command"] for result in results
+                            if not result["error"] and not result.get("skipped")],
+                "failed": [result["command"] for result in results if result["error"]],
+                "skipped": [result["command"] for result in results if result.get("skipped")],
+                "timings": timings,
+                "bytes_sent": sum(result["bytes_sent"] for result in results),
+                "bytes_received": sum(result["bytes_received"] for result in results)
+            }
+            if transaction:
+                batch["rollback"] = self.last_rollback
+            self._emit_metrics('batch', batch)
             
+            error = None
+            if self.session_lost:
+                # The rest of the batch failed fast; report why instead of a pile of timeouts
+                error = f"Session lost: {self.session_lost}"
+            elif self.batch_aborted:
+                error = f"Batch {self.batch_aborted}"
+            if error:
+                return {
+                    "success": False,
+                    "error": error,
+                    "results": results,
+                    "initial_prompt": current_prompt,
+                    **batch
+                }
             return {
                 "success": True, 
                 "results": results,
-                "initial_prompt": current_prompt
+                "initial_prompt": current_prompt,
+                **batch
             }
         
         except Exception as e:
             return {"success": False, "error": str(e)}
+    
+    def stream_commands(self, commands_string, parse=False, delta=False, on_error='continue',
+                        transaction=False):
+        """Connect, then yield one result per command; the port is closed when the stream ends"""
+        if not self.connect():
+            yield {"success": False, "error": "Failed to connect"}
+            return
         
+        try:
+            yield from self.iter_commands(commands_string, parse, delta, on_error, transaction)
+            if self.last_rollback:
+                yield {"rollback": self.last_rollback}
+            if self.batch_aborted:
+                yield {"success": False, "error": f"Batch {self.batch_aborted}"}
+        except Exception as e:
+            yield {"success": False, "error": str(e)}
         finally:
-            if self.connection:
-                self.connection.close()
+            self.close()
+    
+    def execute_commands(self, commands_string, parse=False, delta=False, on_error='continue',
+                         transaction=False):
+        """Execute multiple commands from string
+
+        The batch timings include the connect phases as connect_<phase>:
+        port_open, then resume for a pooled session, or baud_detect, login,
+        paging and upshift.
+        """
+        start_time = time.monotonic()
+        if not self.connect():
+            return {"success": False, "error": "Failed to connect", "timings": dict(self.connect_timings)}
+        
+        try:
+            result = self.run_commands(commands_string, parse, delta, on_error, transaction)
+        finally:
+            self.close()
+        
+        timings = {f"connect_{phase}": elapsed for phase, elapsed in self.connect_timings.items()}
+        timings.update(result.get("timings", {}))
+        timings["total"] = round(time.monotonic() - start_time, 6)
+        result["timings"] = timings
+        return result
+
+def read_batch(args):
+    """The command batch from argv, --file, or stdin ('-' or no argument)"""
+    if args.file:
+        with open(args.file) as f:
+            return f.read()
+    if args.commands is None or args.commands == '-':
+        return sys.stdin.read()
+    return args.commands
+
+def serve_batches(executor, lines, output=sys.stdout):
+    """Run one JSON batch request per input line over a single open session.
+
+    Each line is {"commands": "...", "parse": false, "delta": false,
+    "on_error": "continue", "transaction": false}; each answer is one JSON
+    line. The port is reopened if it drops between batches.
+    """
+    options = ('parse', 'delta', 'on_error', 'transaction')
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                commands = request["commands"]
+                kwargs = {name: request[name] for name in options if name in request}
+            except (ValueError, KeyError, TypeError) as e:
+                result = {"success": False, "error": f"Invalid request: {e}"}
+            else:
+                if (executor.session_lost or not executor.is_connected()) and not executor.reconnect():
+                    result = {"success": False, "error": "Failed to connect"}
+                else:
+                    result = executor.run_commands(commands, **kwargs)
+                    if not result.get("success"):
+                        executor.close()
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    finally:
+        executor.close()
 
 def main():
     """Main function for CLI usage"""
-    if len(sys.argv) < 2:
-        print("Usage: python serial_executor.py '<commands>'")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Execute commands on a serial console")
+    parser.add_argument('commands', nargs='?',
+                        help="Commands to run, one per line ('-' or omitted: read from stdin)")
+    parser.add_argument('--file', help="Read the commands from this file")
+    parser.add_argument('--persistent', action='store_true',
+                        help="Keep the session open and run one JSON batch request per stdin line")
+    parser.add_argument('--port', default='/dev/ttyUSB0',
+                        help="Serial port of the console, or a telnet://host:port or ssh://user@host URL")
+    parser.add_argument('--username', help="Login username for vty lines that ask for one")
+    parser.add_argument('--trust-unknown-hosts', action='store_true', default=None,
+                        help="Accept SSH host keys that are not in known_hosts (open to man-in-the-middle)")
+    parser.add_argument('--baudrate', type=baudrate_arg, default=9600, help="Console speed or 'auto'")
+    parser.add_argument('--upshift', type=int, help="Raise the console speed to this rate for the session")
+    parser.add_argument('--password', default='')
+    parser.add_argument('--stream', action='store_true',
+                        help="Print one JSON line per command as soon as it completes")
+    parser.add_argument('--parse', action='store_true',
+                        help="Add structured records for show commands that have a parser")
+    parser.add_argument('--delta', action='store_true',
+                        help="Skip config lines that are already in the running-config")
+    parser.add_argument('--on-error', choices=ON_ERROR_POLICIES, default='continue',
+                        help="After a rejected command: send the rest, abort, or skip the failed section's lines")
+    parser.add_argument('--transaction', action='store_true',
+                        help="Snapshot the config first and roll back if any command fails")
+    parser.add_argument('--archive-url', help="Device file for the snapshot, e.g. flash:aiconsole-rollback.cfg")
+    parser.add_argument('--latency-profile', default=DEFAULT_PROFILE_PATH,
+                        help="JSON file of learned command latencies ('' keeps them in memory)")
+    parser.add_argument('--spool-threshold', type=int, default=SPOOL_THRESHOLD,
+                        help="Spool outputs of at least this many bytes to a file (0 disables spooling)")
+    parser.add_argument('--spool-dir', default=DEFAULT_SPOOL_DIR, help="Directory of spooled outputs")
+    args = parser.parse_args()
+    
+    output_spool = OutputSpool(args.spool_dir, args.spool_threshold) if args.spool_threshold > 0 else None
+    executor = SerialExecutor(port=args.port, baudrate=args.baudrate, password=args.password,
+                              upshift_baudrate=args.upshift, archive_url=args.archive_url,
+                              username=args.username, latency_model=LatencyModel(args.latency_profile or None),
+                              output_spool=output_spool, trust_unknown_hosts=args.trust_unknown_hosts)
+    if args.persistent:
+        serve_batches(executor, sys.stdin)
+        return
+    
+    commands = read_batch(args)
+    if args.stream:
+        for result in executor.stream_commands(commands, args.parse, args.delta, args.on_error,
+                                              args.transaction):
+            print(json.dumps(result), flush=True)
+        return
     
-    commands = sys.argv[1]
-    executor = SerialExecutor()
-    result = executor.execute_commands(commands)
+    result = executor.execute_commands(commands, args.parse, args.delta, args.on_error, args.transaction)
     print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
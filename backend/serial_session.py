@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Persistent serial session service for AIConsole
+Keeps the console port open and authenticated between backend requests,
+taking them in turn through the device's scheduler, and keeps the line
+alive (or logs in again) while no requests come in
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from console_log import message_as_dict
+from device_scheduler import batch_lines, coalesce_key, is_read_only, scheduler_for
+from latency_model import DEFAULT_PROFILE_PATH, LatencyModel
+from output_spool import DEFAULT_SPOOL_DIR, SPOOL_THRESHOLD, OutputSpool
+from serial_executor import EXEC_TIMEOUT, ON_ERROR_POLICIES, SerialExecutor, baudrate_arg
+from show_cache import DEFAULT_TTL, ShowCache
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_LISTEN_PORT = int(os.environ.get('AICONSOLE_SESSION_PORT', 3001))
+
+# How often the keepalive thread checks whether the line has been idle too long
+KEEPALIVE_TICK = 1.0
+
+# Logins tried per request before it fails (with exponential backoff between them)
+SESSION_RECONNECT_ATTEMPTS = 3
+
+class SerialSession:
+    def __init__(self, executor, reconnect_attempts=SESSION_RECONNECT_ATTEMPTS):
+        """Wrap an executor whose connection is kept open across calls"""
+        self.executor = executor
+        self.scheduler = scheduler_for(executor.port)
+        self.reconnect_attempts = reconnect_attempts
+        self.keepalive_thread = None
+        self.stopping = threading.Event()
+        self.keepalive_count = 0
+        self.probe_failures = 0
+        self.last_probe_at = None
+        self.last_lost_reason = None
+        self.started_at = time.time()
+        self.connected_at = None
+        self.connect_count = 0
+        self.request_count = 0
+
+    def ensure_connected(self):
+        """Open and authenticate the port unless the session is already up.
+
+        A lost session (exec-timeout, dropped line) is logged in again with
+        backoff and gets its privileged mode and terminal settings back.
+        """
+        idle = self.executor.idle_time()
+        if idle is not None and idle >= self.executor.keepalive_interval() and self.executor.is_connected():
+            # Idle long enough for the line to have timed out: check before trusting it
+            self.executor.probe()
+        if self.executor.is_connected() and not self.executor.session_lost:
+            return True
+        if self.executor.session_lost:
+            self.last_lost_reason = self.executor.session_lost
+        if not self.executor.reconnect(self.reconnect_attempts):
+            return False
+        self.connected_at = time.time()
+        self.connect_count += 1
+        return True
+
+    def prompt(self, refresh=False):
+        """Return the device's current prompt, from the tracked mode when it is known"""
+        self.request_count += 1
+        return self.scheduler.run(lambda: self._prompt(refresh), read_only=True, key=('prompt', refresh))
+
+    def _prompt(self, refresh):
+        if not self.ensure_connected():
+            return {"success": False, "error": "Failed to connect"}
+        prompt = self.executor.get_current_prompt(refresh=refresh)
+        return {"success": True, "prompt": prompt, "mode": self.executor.mode}
+
+    def execute(self, commands_string, parse=False, delta=False, on_error='continue', transaction=False):
+        """Run a batch of commands over the open session.
+
+        Show-only batches queue ahead of config pushes, and an identical
+        show batch already waiting or running is joined instead of re-run.
+        """
+        self.request_count += 1
+        commands = batch_lines(commands_string)
+        return self.scheduler.run(
+            lambda: self._execute(commands_string, parse, delta, on_error, transaction),
+            read_only=is_read_only(commands), key=coalesce_key(commands, parse, on_error))
+
+    def _execute(self, commands_string, parse, delta, on_error, transaction):
+        if not self.ensure_connected():
+            return {"success": False, "error": "Failed to connect"}
+        result = self.executor.run_commands(commands_string, parse, delta, on_error, transaction)
+        if not result.get("success"):
+            # Drop the port so the next call starts from a fresh login
+            self.executor.close()
+        return result
+
+    def execute_stream(self, commands_string, parse=False, delta=False, on_error='continue',
+                       transaction=False):
+        """Run a batch, yielding each command's result as soon as it completes"""
+        self.request_count += 1
+        with self.scheduler.turn(is_read_only(batch_lines(commands_string))):
+            if not self.ensure_connected():
+                yield {"success": False, "error": "Failed to connect"}
+                return
+            try:
+                yield from self.executor.iter_commands(commands_string, parse, delta, on_error, transaction)
+                if self.executor.last_rollback:
+                    yield {"rollback": self.executor.last_rollback}
+                if self.executor.batch_aborted:
+                    yield {"success": False, "error": f"Batch {self.executor.batch_aborted}"}
+            except Exception as e:
+                self.executor.close()
+                yield {"success": False, "error": str(e)}
+
+    def start_keepalive(self):
+        """Probe the line in the background whenever it has been idle for keepalive_interval()"""
+        self.stopping.clear()
+        self.keepalive_thread = threading.Thread(target=self.keepalive_loop, daemon=True)
+        self.keepalive_thread.start()
+
+    def keepalive_loop(self):
+        while not self.stopping.wait(KEEPALIVE_TICK):
+            idle = self.executor.idle_time()
+            if idle is None or idle < self.executor.keepalive_interval() or not self.scheduler.idle():
+                continue
+            with self.scheduler.turn(read_only=True):
+                if self.executor.is_connected():
+                    self.keepalive()
+
+    def keepalive(self):
+        """One keepalive; a failed probe logs in again right away so the next request does not wait"""
+        self.keepalive_count += 1
+        self.last_probe_at = time.time()
+        if self.executor.probe():
+            return True
+        self.probe_failures += 1
+        self.ensure_connected()
+        return False
+
+    def status(self):
+        """Describe the session without touching the device"""
+        return {
+            "success": True,
+            "port": self.executor.port,
+            "baudrate": self.executor.baudrate,
+            "connected": self.executor.is_connected(),
+            "authenticated": self.executor.authenticated,
+            "last_prompt": self.executor.last_prompt,
+            "hostname": self.executor.hostname,
+            "mode": self.executor.mode,
+            "connect_timings": self.executor.connect_timings,
+            "show_cache": self.executor.show_cache.stats() if self.executor.show_cache else None,
+            "queue": self.scheduler.stats(),
+            "console_log": self.executor.console_log.stats(),
+            "latency": self.executor.latency_model.summary(self.executor.latency_device()),
+            "spool": self.executor.output_spool.stats() if self.executor.output_spool else None,
+            "health": {
+                "session_lost": self.executor.session_lost,
+                "last_lost_reason": self.last_lost_reason,
+                "idle": round(self.executor.idle_time(), 3) if self.executor.idle_time() is not None else None,
+                "keepalive_interval": self.executor.keepalive_interval() if self.keepalive_thread else None,
+                "keepalives": self.keepalive_count,
+                "probe_failures": self.probe_failures,
+                "last_probe_at": self.last_probe_at
+            },
+            "connect_count": self.connect_count,
+            "request_count": self.request_count,
+            "uptime": round(time.time() - self.started_at, 3)
+        }
+
+    def logs(self):
+        """Take the log messages the device printed on its own since the last call"""
+        return {
+            "success": True,
+            "messages": [message_as_dict(message) for message in self.executor.console_log.drain()],
+            **self.executor.console_log.stats()
+        }
+
+    def spooled(self, handle):
+        """The spooled output behind a result's handle, or None"""
+        if self.executor.output_spool is None:
+            return None
+        return self.executor.output_spool.get(handle)
+    
+    def close(self):
+        """Stop the keepalive and close the underlying port"""
+        self.stopping.set()
+        with self.scheduler.turn():
+            self.executor.close()
+
+class SessionRequestHandler(BaseHTTPRequestHandler):
+    """JSON API: GET /status, GET /prompt[?refresh=1], GET /logs, POST /execute {"commands": "...", "stream": false, "parse": false, "delta": false,
+    "on_error": "continue", "transaction": false}
+
+    With "stream": true the reply is NDJSON, one line per command. With
+    "parse": true, supported show commands also carry "parsed" records. With
+    "delta": true, config lines already in the running-config are skipped.
+    "on_error" is "continue", "abort" or "skip_children". With "transaction":
+    true a failed batch is rolled back to the config it started from.
+    GET /logs returns (and clears) the unsolicited log messages, such as
+    %LINK-3-UPDOWN, that were separated from command output.
+    Outputs too large to inline carry "spooled": {"handle", "size", "sha256",
+    ...}; GET /spool/<handle>[?offset=N&length=N] returns their bytes.
+    """
+
+    session = None
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, results):
+        # No Content-Length: the HTTP/1.0 connection closes when the batch ends
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        for result in results:
+            self.wfile.write((json.dumps(result) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+    def send_spooled(self, handle, query):
+        spooled = self.session.spooled(handle)
+        if spooled is None:
+            self.send_json({"success": False, "error": f"No spooled output {handle}"}, 404)
+            return
+        try:
+            offset = int(query.get('offset', ['0'])[0])
+            length = int(query['length'][0]) if 'length' in query else None
+        except ValueError:
+            self.send_json({"success": False, "error": "'offset' and 'length' must be integers"}, 400)
+            return
+        data = spooled.read(max(0, offset), length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Spool-Size', str(spooled.size))
+        self.send_header('X-Spool-Sha256', spooled.sha256)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        if path == '/status':
+            self.send_json(self.session.status())
+        elif path == '/prompt':
+            refresh = parse_qs(url.query).get('refresh', ['0'])[0] not in ('', '0', 'false')
+            self.send_json(self.session.prompt(refresh=refresh))
+        elif path == '/logs':
+            self.send_json(self.session.logs())
+        elif path.startswith('/spool/'):
+            self.send_spooled(path[len('/spool/'):], parse_qs(url.query))
+        else:
+            self.send_json({"success": False, "error": f"Unknown endpoint {path}"}, 404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path != '/execute':
+            self.send_json({"success": False, "error": f"Unknown endpoint {path}"}, 404)
+            return
+
+        try:
+            payload = self.read_json()
+        except ValueError as e:
+            self.send_json({"success": False, "error": f"Invalid JSON: {e}"}, 400)
+            return
+
+        commands = payload.get('commands')
+        if not isinstance(commands, str) or not commands.strip():
+            self.send_json({"success": False, "error": "Missing 'commands'"}, 400)
+            return
+
+        parse = bool(payload.get('parse'))
+        delta = bool(payload.get('delta'))
+        on_error = payload.get('on_error') or 'continue'
+        if on_error not in ON_ERROR_POLICIES:
+            self.send_json({"success": False, "error": f"'on_error' must be one of {ON_ERROR_POLICIES}"}, 400)
+            return
+        transaction = bool(payload.get('transaction'))
+        if payload.get('stream'):
+            self.send_stream(self.session.execute_stream(commands, parse, delta, on_error, transaction))
+        else:
+            self.send_json(self.session.execute(commands, parse, delta, on_error, transaction))
+
+    def log_message(self, format, *args):
+        # Keep stdout quiet; the Node backend logs requests itself
+        pass
+
+def serve(session, host=DEFAULT_HOST, listen_port=DEFAULT_LISTEN_PORT):
+    """Serve the session API until interrupted"""
+    handler = type('BoundSessionRequestHandler', (SessionRequestHandler,), {'session': session})
+    server = ThreadingHTTPServer((host, listen_port), handler)
+    print(f"AIConsole serial session on http://{host}:{listen_port} ({session.executor.port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        session.close()
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Persistent serial session service")
+    parser.add_argument('--device', default='/dev/ttyUSB0',
+                        help="Serial port of the console, or a telnet://host:port or ssh://user@host URL")
+    parser.add_argument('--username', help="Login username for vty lines that ask for one")
+    parser.add_argument('--trust-unknown-hosts', action='store_true', default=None,
+                        help="Accept SSH host keys that are not in known_hosts (open to man-in-the-middle)")
+    parser.add_argument('--baudrate', type=baudrate_arg, default=9600, help="Console speed or 'auto'")
+    parser.add_argument('--upshift', type=int, help="Raise the console speed to this rate while connected")
+    parser.add_argument('--password', default='')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL,
+                        help="Seconds to reuse show output between requests (0 disables the cache)")
+    parser.add_argument('--archive-url', help="Device file for transaction snapshots, e.g. flash:aiconsole-rollback.cfg")
+    parser.add_argument('--exec-timeout', type=float, default=EXEC_TIMEOUT,
+                        help="The line's exec-timeout in seconds (0: never); keepalives are sent well inside it")
+    parser.add_argument('--no-keepalive', action='store_true', help="Do not probe the line while idle")
+    parser.add_argument('--latency-profile', default=DEFAULT_PROFILE_PATH,
+                        help="JSON file of learned command latencies ('' keeps them in memory)")
+    parser.add_argument('--spool-threshold', type=int, default=SPOOL_THRESHOLD,
+                        help="Spool outputs of at least this many bytes to a file (0 disables spooling)")
+    parser.add_argument('--spool-dir', default=DEFAULT_SPOOL_DIR, help="Directory of spooled outputs")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--listen-port', type=int, default=DEFAULT_LISTEN_PORT)
+    args = parser.parse_args()
+
+    show_cache = ShowCache(ttl=args.cache_ttl) if args.cache_ttl > 0 else None
+    output_spool = OutputSpool(args.spool_dir, args.spool_threshold) if args.spool_threshold > 0 else None
+    executor = SerialExecutor(port=args.device, baudrate=args.baudrate, password=args.password,
+                              upshift_baudrate=args.upshift, show_cache=show_cache,
+                              archive_url=args.archive_url, username=args.username,
+                              exec_timeout=args.exec_timeout,
+                              latency_model=LatencyModel(args.latency_profile or None),
+                              output_spool=output_spool, trust_unknown_hosts=args.trust_unknown_hosts)
+    session = SerialSession(executor)
+    if not args.no_keepalive:
+        session.start_keepalive()
+    serve(session, args.host, args.listen_port)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,167 @@
 import express from 'express';
 import OpenAI from 'openai';
-import { exec } from 'child_process';
+import { exec, spawn } from 'child_process';
 import { promisify } from 'util';
 import dotenv from 'dotenv';
+import fs from 'fs';
+import http from 'http';
+import os from 'os';
+import path from 'path';
 
 // Load environment variables
 dotenv.config();
 
 const execAsync = promisify(exec);
 
+// Run a python script with input on stdin, so batches never pass through the shell or argv
+function runPython(args, input) {
+  return new Promise((resolve, reject) => {
+    const child = spawn('python3', args);
+    let stdout = '';
+    let stderr = '';
+    child.stdout.on('data', data => { stdout += data; });
+    child.stderr.on('data', data => { stderr += data; });
+    child.on('error', reject);
+    child.on('close', code => {
+      if (code !== 0 && !stdout) {
+        reject(new Error(stderr || `python3 exited with code ${code}`));
+      } else {
+        resolve({ stdout, stderr });
+      }
+    });
+    child.stdin.end(input);
+  });
+}
+
+// Persistent serial session service (serial_session.py); falls back to one-shot python when absent
+const SERIAL_SESSION_URL = process.env.SERIAL_SESSION_URL || 'http://127.0.0.1:3001';
+
+// Errors meaning the session service is not running, so nothing reached the device
+const SESSION_UNAVAILABLE = ['ECONNREFUSED', 'ENOENT'];
+
+function sessionUnavailable(error) {
+  return SESSION_UNAVAILABLE.includes(error.code);
+}
+
+// Plain http without a timeout: a batch may run for minutes (copy, transactions
+// on a slow line), and fetch would give up on it after 300 s without headers
+function callSerialSession(path, body) {
+  return new Promise((resolve, reject) => {
+    const payload = body === undefined ? undefined : JSON.stringify(body);
+    const headers = payload === undefined
+      ? {}
+      : { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(payload) };
+    const request = http.request(new URL(path, SERIAL_SESSION_URL),
+      { method: payload === undefined ? 'GET' : 'POST', headers }, response => {
+        let data = '';
+        response.setEncoding('utf8');
+        response.on('data', chunk => { data += chunk; });
+        response.on('error', reject);
+        response.on('end', () => {
+          try {
+            resolve(JSON.parse(data));
+          } catch (error) {
+            reject(error);
+          }
+        });
+      });
+    request.on('error', reject);
+    request.end(payload);
+  });
+}
+
+// Spawned serial_executor.py processes all open /dev/ttyUSB0, so they run one
+// at a time: show-only batches go first (a waiting config push lets at most
+// MAX_OVERTAKES of them ahead), and an identical show batch already queued or
+// running is joined instead of being sent again
+const MAX_OVERTAKES = 8;
+const WAIT_SAMPLES = 256;
+const SHOW_LINE = /^(do\s+)?sh(o|ow)?(\s|$)/i;
+const READ_ONLY_LINE = /^(enable|terminal\s+(length|width)\b)/i;
+
+function batchLines(commands) {
+  return commands.split(/\r?\n/).map(line => line.trim()).filter(Boolean);
+}
+
+function isReadOnlyBatch(commands) {
+  const lines = batchLines(commands);
+  return lines.length > 0 && lines.every(line => SHOW_LINE.test(line) || READ_ONLY_LINE.test(line));
+}
+
+class DeviceQueue {
+  constructor() {
+    this.reads = [];
+    this.writes = [];
+    this.busy = false;
+    this.inflight = new Map();
+    this.completed = 0;
+    this.coalesced = 0;
+    this.maxDepth = 0;
+    this.waits = { read: [], write: [] };
+  }
+
+  // Run task() in turn; tasks sharing a key while one is in flight share its result
+  run(task, { readOnly = false, key = null } = {}) {
+    if (key !== null && this.inflight.has(key)) {
+      this.coalesced++;
+      return this.inflight.get(key).then(result => ({ ...result, coalesced: true }));
+    }
+    const promise = new Promise((resolve, reject) => {
+      const entry = { task, resolve, reject, readOnly, overtaken: 0, enqueuedAt: Date.now() };
+      (readOnly ? this.reads : this.writes).push(entry);
+      this.maxDepth = Math.max(this.maxDepth, this.reads.length + this.writes.length);
+      this.next();
+    });
+    if (key !== null) {
+      this.inflight.set(key, promise);
+      const forget = () => this.inflight.delete(key);
+      promise.then(forget, forget);
+    }
+    return promise;
+  }
+
+  next() {
+    if (this.busy) return;
+    const writeDue = this.writes.length && (!this.reads.length || this.writes[0].overtaken >= MAX_OVERTAKES);
+    const entry = writeDue ? this.writes.shift() : this.reads.shift();
+    if (!entry) return;
+    if (entry.readOnly && this.writes.length) this.writes[0].overtaken++;
+
+    const waits = this.waits[entry.readOnly ? 'read' : 'write'];
+    waits.push(Date.now() - entry.enqueuedAt);
+    if (waits.length > WAIT_SAMPLES) waits.shift();
+
+    this.busy = true;
+    Promise.resolve()
+      .then(entry.task)
+      .then(entry.resolve, entry.reject)
+      .finally(() => {
+        this.busy = false;
+        this.completed++;
+        this.next();
+      });
+  }
+
+  stats() {
+    const summarize = samples => samples.length ? {
+      samples: samples.length,
+      avg_ms: Math.round(samples.reduce((sum, value) => sum + value, 0) / samples.length),
+      max_ms: Math.max(...samples)
+    } : { samples: 0 };
+    return {
+      queued_reads: this.reads.length,
+      queued_writes: this.writes.length,
+      busy: this.busy,
+      max_depth: this.maxDepth,
+      completed: this.completed,
+      coalesced: this.coalesced,
+      wait: { read: summarize(this.waits.read), write: summarize(this.waits.write) }
+    };
+  }
+}
+
+const serialQueue = new DeviceQueue();
+
 // Function to extract commands marked with CMD: prefix
 function extractCommands(rawOutput) {
   // Strategy 1: Extract lines marked with CMD:
@@ -301,9 +454,24 @@ function generateRuleBased(prompt, switchPrompt = 'Switch>') {
 
 // Function to get current switch prompt state (fast version)
 async function getCurrentPrompt() {
+  try {
+    const session = await callSerialSession('/prompt');
+    if (session.success) {
+      return session.prompt;
+    }
+    // The session holds the port; probing it directly would interleave with it
+    return 'Switch>';
+  } catch (error) {
+    if (!sessionUnavailable(error)) {
+      console.error('Serial session prompt error:', error.message);
+      return 'Switch>';
+    }
+    console.log('Serial session unavailable, probing port directly');
+  }
+
   try {
     // Quick prompt check without full authentication
-    const { stdout } = await execAsync(`python3 -c "
+    const { stdout } = await serialQueue.run(() => execAsync(`python3 -c "
 import serial
 import time
 
@@ -323,7 +491,7 @@ try:
         print('Switch>')
 except:
     print('Switch>')
-"`);
+"`), { readOnly: true, key: 'prompt' });
     
     return stdout.trim() || 'Switch>';
   } catch (error) {
@@ -503,18 +671,37 @@ async function callOllamaModel(prompt) {
 */
 
 // Function to execute commands on serial device
-async function executeOnSerial(commands) {
+// With delta, config lines already in the running-config are skipped;
+// onError is 'continue', 'abort' or 'skip_children'; a failed transaction is rolled back
+async function executeOnSerial(commands, delta = false, onError = 'continue', transaction = false) {
   try {
     console.log('Executing commands on serial device:', commands);
     
-    const { stdout, stderr } = await execAsync(`python3 serial_executor.py '${commands}'`);
-    
-    if (stderr) {
-      console.error('Serial execution stderr:', stderr);
+    try {
+      return await callSerialSession('/execute', { commands, delta, on_error: onError, transaction });
+    } catch (error) {
+      if (!sessionUnavailable(error)) {
+        // The session may already be running the batch: never send it a second time
+        throw error;
+      }
+      console.log('Serial session unavailable, spawning serial_executor.py');
     }
     
-    const result = JSON.parse(stdout);
-    return result;
+    const args = ['serial_executor.py', '-'];
+    if (delta) args.push('--delta');
+    if (['abort', 'skip_children'].includes(onError)) args.push('--on-error', onError);
+    if (transaction) args.push('--transaction');
+    const readOnly = isReadOnlyBatch(commands);
+    const key = readOnly ? JSON.stringify([batchLines(commands), onError]) : null;
+    return await serialQueue.run(async () => {
+      const { stdout, stderr } = await runPython(args, commands);
+      
+      if (stderr) {
+        console.error('Serial execution stderr:', stderr);
+      }
+      
+      return JSON.parse(stdout);
+    }, { readOnly, key });
   } catch (error) {
     console.error('Serial execution error:', error);
     return {
@@ -528,6 +715,9 @@ async function executeOnSerial(commands) {
 app.post('/comando', async (req, res) => {
   const prompt = req.body.mensaje;
   const executeSerial = req.body.execute || false; // Optional parameter to execute on device
+  const delta = req.body.delta || false; // Only push config lines the device does not have yet
+  const onError = req.body.on_error || 'continue'; // What to do after the device rejects a line
+  const transaction = req.body.transaction || false; // Roll the device back if any line fails
   
   console.log('Receiving request:', req.body.mensaje);
   console.log('Execute on serial:', executeSerial);
@@ -555,14 +745,17 @@ app.post('/comando', async (req, res) => {
     // If execution is requested, try to execute on serial device
     if (executeSerial) {
       console.log('Attempting serial execution...');
-      const executionResult = await executeOnSerial(generatedCommands);
+      const executionResult = await executeOnSerial(generatedCommands, delta, onError, transaction);
       
       response.execution = executionResult;
       response.executed = executionResult.success;
       
-      if (executionResult.success) {
+      // An aborted batch still reports what ran and what was skipped
+      if (executionResult.results) {
         response.device_responses = executionResult.results;
-      } else {
+        response.skipped_commands = executionResult.skipped || [];
+      }
+      if (!executionResult.success) {
         response.execution_error = executionResult.error;
       }
     }
@@ -590,11 +783,14 @@ no shutdown`;
 // New endpoint for direct serial execution
 app.post('/execute', async (req, res) => {
   const commands = req.body.commands;
+  const delta = req.body.delta || false;
+  const onError = req.body.on_error || 'continue';
+  const transaction = req.body.transaction || false;
   
   console.log('Direct execution request:', commands);
   
   try {
-    const result = await executeOnSerial(commands);
+    const result = await executeOnSerial(commands, delta, onError, transaction);
     res.json(result);
   } catch (error) {
     console.error('Direct execution error:', error);
@@ -605,11 +801,42 @@ app.post('/execute', async (req, res) => {
   }
 });
 
+// Outputs too large to inline are spooled by the python executors (output_spool.py);
+// results carry "spooled": {handle, size, sha256} and the bytes are read from here
+const SPOOL_DIR = process.env.AICONSOLE_SPOOL_DIR || path.join(os.tmpdir(), 'aiconsole-spool');
+const SPOOL_HANDLE = /^[0-9a-f]{64}$/;
+
+app.get('/spool/:handle', (req, res) => {
+  const handle = req.params.handle;
+  if (!SPOOL_HANDLE.test(handle)) {
+    return res.status(400).json({ success: false, error: 'Invalid spool handle' });
+  }
+  const file = path.join(SPOOL_DIR, `${handle}.out`);
+  fs.stat(file, (error, stats) => {
+    if (error) {
+      return res.status(404).json({ success: false, error: `No spooled output ${handle}` });
+    }
+    // Ranged reads so the frontend can page through large outputs
+    const start = Math.max(0, parseInt(req.query.offset, 10) || 0);
+    const length = parseInt(req.query.length, 10);
+    const end = Number.isNaN(length) ? stats.size : Math.min(stats.size, start + length);
+    res.set({
+      'Content-Type': 'text/plain; charset=utf-8',
+      'Content-Length': String(Math.max(0, end - start)),
+      'X-Spool-Size': String(stats.size),
+      'X-Spool-Sha256': handle
+    });
+    if (end <= start) {
+      return res.end();
+    }
+    fs.createReadStream(file, { start, end: end - 1 }).pipe(res);
+  });
+});
+
 // New endpoint to test serial connection
 app.get('/connection-status', async (req, res) => {
   try {
     // Quick check: does the serial port exist?
-    const fs = await import('fs');
     const portExists = fs.existsSync('/dev/ttyUSB0');
     
     if (!portExists) {
@@ -622,7 +849,8 @@ app.get('/connection-status', async (req, res) => {
     // Port exists, assume connection will work
     res.json({ 
       connected: true,
-      message: 'Switch detectado en /dev/ttyUSB0'
+      message: 'Switch detectado en /dev/ttyUSB0',
+      queue: serialQueue.stats()
     });
     
   } catch (error) {
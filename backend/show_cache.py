@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Show output cache for AIConsole
+Keeps recent read-only show replies per device with a TTL and LRU eviction
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 256
+
+# Show commands whose keywords are expanded from IOS abbreviations, longest first
+SHOW_COMMANDS = (
+    ('show', 'ip', 'interface', 'brief'),
+    ('show', 'mac', 'address-table'),
+    ('show', 'interfaces', 'status'),
+    ('show', 'vlan', 'brief'),
+    ('show', 'cdp', 'neighbors'),
+    ('show', 'ip', 'route'),
+    ('show', 'ip', 'arp'),
+    ('show', 'running-config'),
+    ('show', 'startup-config'),
+    ('show', 'spanning-tree'),
+    ('show', 'interfaces'),
+    ('show', 'version'),
+    ('show', 'vlan'),
+    ('show', 'arp'),
+)
+
+# Output that changes on its own and is never cached
+UNCACHED_SHOWS = ('show clock', 'show logging', 'show users', 'show processes')
+
+# Show output affected by each kind of change; None means everything on the device
+INTERFACE_SHOWS = ('show running-config', 'show ip interface brief', 'show interfaces', 'show vlan',
+                   'show arp', 'show ip arp', 'show ip route', 'show mac address-table',
+                   'show spanning-tree')
+VLAN_SHOWS = ('show running-config', 'show vlan', 'show interfaces status', 'show mac address-table')
+ROUTING_SHOWS = ('show running-config', 'show ip route', 'show arp', 'show ip arp')
+GLOBAL_SHOWS = ('show running-config',)
+
+def normalize_show(command):
+    """Canonical form of a show command, or None if command is not a show.
+
+    'sh ip int br' and 'do show ip interface  brief' both become
+    'show ip interface brief'; arguments and filters are kept as typed.
+    """
+    command, pipe, output_filter = command.partition('|')
+    words = command.split()
+    if words[:1] == ['do']:
+        words = words[1:]
+    if not words or len(words[0]) < 2 or not 'show'.startswith(words[0].lower()):
+        return None
+
+    lowered = [word.lower() for word in words]
+    for template in SHOW_COMMANDS:
+        if len(lowered) >= len(template) and all(
+                keyword.startswith(word) for word, keyword in zip(lowered, template)):
+            words = list(template) + words[len(template):]
+            break
+    else:
+        words = ['show'] + words[1:]
+
+    normalized = ' '.join(words)
+    if pipe:
+        normalized += ' | ' + ' '.join(output_filter.split())
+    return normalized
+
+def is_cacheable(normalized):
+    return normalized is not None and not normalized.startswith(UNCACHED_SHOWS)
+
+def copies_to_running_config(arguments):
+    """True if the arguments of a 'copy' name the running-config as destination"""
+    destination = arguments[1].lower() if len(arguments) > 1 else ''
+    destination = destination.rpartition(':')[2] or destination
+    return len(destination) >= 3 and 'running-config'.startswith(destination)
+
+def affected_shows(mode, command):
+    """Show prefixes made stale by sending command in mode.
+
+    Returns () when nothing changes and None when every entry for the
+    device must go (hostname changes, reloads, config replaced or copied
+    into the running-config, unknown effects).
+    """
+    if normalize_show(command) is not None:
+        return ()
+    words = command.lower().split()
+    if not words or mode is None:
+        return None if words else ()
+    if words[0] == 'no':
+        words = words[1:]
+        if not words:
+            return ()
+    first = words[0]
+
+    if mode in ('user', 'privileged'):
+        if 'configure'.startswith(first) and len(first) >= 4:
+            # Only 'configure terminal' just enters config mode; replace, memory, network... load a config
+            if len(words) == 1 or 'terminal'.startswith(words[1]):
+                return ()
+            return None
+        if 'copy'.startswith(first) and len(first) >= 2 and copies_to_running_config(words[1:]):
+            return None
+        if 'write'.startswith(first) or 'copy'.startswith(first) or 'erase'.startswith(first):
+            return ('show startup-config',)
+        if first == 'clear' or 'clear'.startswith(first) and len(first) >= 3:
+            return ('show mac address-table', 'show arp', 'show ip arp', 'show interfaces')
+        if 'reload'.startswith(first) and len(first) >= 3:
+            return None
+        return ()
+
+    # Global config and its sub-modes
+    if first == 'do':
+        return affected_shows('privileged', ' '.join(words[1:]))
+    if first == 'end' or 'exit'.startswith(first) and len(first) >= 3:
+        return ()
+    if mode.startswith('config-if'):
+        return INTERFACE_SHOWS
+    if mode == 'config-vlan':
+        return VLAN_SHOWS
+    if 'hostname'.startswith(first) and len(first) >= 3:
+        return None
+    if 'interface'.startswith(first) and len(first) >= 3:
+        return INTERFACE_SHOWS
+    if 'vlan'.startswith(first) and len(first) >= 2:
+        return VLAN_SHOWS
+    if first in ('ip', 'router') or mode == 'config-router':
+        return ROUTING_SHOWS
+    if first == 'spanning-tree':
+        return GLOBAL_SHOWS + ('show spanning-tree',)
+    return GLOBAL_SHOWS
+
+class ShowCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """TTL + LRU cache of show replies keyed by (device, normalized command)"""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, device, normalized):
+        """Return the cached response, or None on a miss or an expired entry"""
+        key = (device, normalized)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, device, normalized, response):
+        with self.lock:
+            self.entries[(device, normalized)] = (time.monotonic(), response)
+            self.entries.move_to_end((device, normalized))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, device, prefixes=None):
+        """Drop the device's entries starting with any of prefixes (all of them if None)"""
+        with self.lock:
+            stale = [key for key in self.entries
+                     if key[0] == device and (prefixes is None or key[1].startswith(tuple(prefixes)))]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries
+            }
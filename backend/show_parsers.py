@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Show command parsers for AIConsole
+Turns IOS show output into typed records, one line at a time
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import namedtuple
+
+# Records produced by the parsers
+IpInterface = namedtuple('IpInterface', 'interface ip_address ok method status protocol')
+Vlan = namedtuple('Vlan', 'vlan_id name status ports')
+MacEntry = namedtuple('MacEntry', 'vlan mac_address type ports')
+Version = namedtuple('Version', 'hostname software version uptime image model serial_number '
+                                'memory_kb base_mac_address config_register')
+InterfaceStatus = namedtuple('InterfaceStatus', 'port name status vlan duplex speed type')
+ArpEntry = namedtuple('ArpEntry', 'protocol address age mac_address type interface')
+
+# Line templates, compiled once at import. Whitespace classes stay within one
+# line so the same template can scan a whole reply with finditer
+IP_INTERFACE_PATTERN = re.compile(
+    r'^(\S+)[ \t]+(\S+)[ \t]+(YES|NO)[ \t]+(\S+)[ \t]+(administratively down|up|down|deleted)[ \t]+(up|down)[ \t\r]*$',
+    re.MULTILINE)
+VLAN_PATTERN = re.compile(r'^(\d+)\s+(\S+)\s+(active|act/unsup|act/lshut|sus/lshut|suspended)(?:\s+(.*?))?\s*$')
+VLAN_PORTS_PATTERN = re.compile(r'^\s{20,}(\S.*?)\s*$')
+MAC_ENTRY_PATTERN = re.compile(
+    r'^[ \t]*(\d+|All)[ \t]+([0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4})[ \t]+(\S+)(?:[ \t]+pv)?'
+    r'[ \t]+(\S[^\r\n]*?)[ \t\r]*$', re.MULTILINE)
+INTERFACE_STATUS_PATTERN = re.compile(
+    r'^(\S+)[ \t]+([^\r\n]*?)[ \t]*\b(connected|notconnect|disabled|err-disabled|inactive|monitoring|suspended)'
+    r'[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]*([^\r\n]*?)[ \t\r]*$', re.MULTILINE)
+ARP_ENTRY_PATTERN = re.compile(
+    r'^(Internet)[ \t]+(\S+)[ \t]+(\d+|-)[ \t]+(\S+)[ \t]+(\S+)[ \t]*(\S*)[ \t\r]*$', re.MULTILINE)
+
+# show version fields: (record field, template)
+VERSION_PATTERNS = (
+    ('software', re.compile(r'^Cisco IOS Software, .*?\((\S+)\), Version ([^,\s]+)')),
+    ('uptime', re.compile(r'^(\S+) uptime is (.+?)\s*$')),
+    ('image', re.compile(r'^System image file is "([^"]+)"')),
+    ('memory_kb', re.compile(r'^[Cc]isco (\S+) .*with (\d+)K(?:/(\d+)K)? bytes of memory')),
+    ('model', re.compile(r'^Model number\s*:\s*(\S+)')),
+    ('serial_number', re.compile(r'^System serial number\s*:\s*(\S+)')),
+    ('base_mac_address', re.compile(r'^Base ethernet MAC Address\s*:\s*(\S+)')),
+    ('config_register', re.compile(r'^Configuration register is (\S+)')),
+)
+
+def iter_lines(output):
+    """Yield the lines of output, which is either a string or an iterable of lines"""
+    if isinstance(output, str):
+        output = output.splitlines()
+    for line in output:
+        yield line.rstrip('\r\n')
+
+def iter_rows(pattern, output):
+    """Yield the matches of a row template: one pass over a string, or line by line"""
+    if isinstance(output, str):
+        yield from pattern.finditer(output)
+        return
+    for line in output:
+        row = pattern.match(line.rstrip('\r\n'))
+        if row:
+            yield row
+
+def split_ports(text):
+    if not text:
+        return ()
+    if ',' not in text:
+        return (text.strip(),)
+    return tuple(port.strip() for port in text.split(',') if port.strip())
+
+def parse_ip_interface_brief(output):
+    """Yield an IpInterface per row of 'show ip interface brief'"""
+    for row in iter_rows(IP_INTERFACE_PATTERN, output):
+        interface, address, ok, method, status, protocol = row.groups()
+        yield IpInterface(interface, None if address == 'unassigned' else address,
+                          ok == 'YES', method, status, protocol)
+
+def parse_vlan_brief(output):
+    """Yield a Vlan per VLAN of 'show vlan brief', joining wrapped port lists"""
+    current = None
+    for line in iter_lines(output):
+        row = VLAN_PATTERN.match(line)
+        if row:
+            if current:
+                yield current
+            vlan_id, name, status, ports = row.groups()
+            current = Vlan(int(vlan_id), name, status, split_ports(ports))
+            continue
+        row = VLAN_PORTS_PATTERN.match(line)
+        if row and current:
+            current = current._replace(ports=current.ports + split_ports(row.group(1)))
+    if current:
+        yield current
+
+def parse_mac_address_table(output):
+    """Yield a MacEntry per row of 'show mac address-table'"""
+    for row in iter_rows(MAC_ENTRY_PATTERN, output):
+        vlan, mac_address, entry_type, ports = row.groups()
+        yield MacEntry(int(vlan) if vlan.isdigit() else vlan, mac_address.lower(),
+                       entry_type.upper(), split_ports(ports))
+
+def parse_version(output):
+    """Yield one Version record for 'show version' (fields not found are None)"""
+    fields = dict.fromkeys(Version._fields)
+    for line in iter_lines(output):
+        for field, pattern in VERSION_PATTERNS:
+            if fields[field] is not None:
+                continue
+            row = pattern.match(line)
+            if not row:
+                continue
+            if field == 'software':
+                fields['software'], fields['version'] = row.groups()
+            elif field == 'uptime':
+                fields['hostname'], fields['uptime'] = row.groups()
+            elif field == 'memory_kb':
+                memory = int(row.group(2)) + int(row.group(3) or 0)
+                fields['model'] = fields['model'] or row.group(1)
+                fields['memory_kb'] = memory
+            else:
+                fields[field] = row.group(1)
+            break
+    if any(value is not None for value in fields.values()):
+        yield Version(**fields)
+
+def parse_interfaces_status(output):
+    """Yield an InterfaceStatus per row of 'show interfaces status'"""
+    for row in iter_rows(INTERFACE_STATUS_PATTERN, output):
+        if row.group(1) != 'Port':
+            yield InterfaceStatus(*row.groups())
+
+def parse_arp(output):
+    """Yield an ArpEntry per row of 'show arp' / 'show ip arp'"""
+    for row in iter_rows(ARP_ENTRY_PATTERN, output):
+        protocol, address, age, mac_address, entry_type, interface = row.groups()
+        yield ArpEntry(protocol, address, None if age == '-' else int(age),
+                       mac_address.lower(), entry_type, interface or None)
+
+# Full command words and the parser for their output
+PARSERS = (
+    (('show', 'ip', 'interface', 'brief'), parse_ip_interface_brief),
+    (('show', 'vlan', 'brief'), parse_vlan_brief),
+    (('show', 'mac', 'address-table'), parse_mac_address_table),
+    (('show', 'mac-address-table'), parse_mac_address_table),
+    (('show', 'version'), parse_version),
+    (('show', 'interfaces', 'status'), parse_interfaces_status),
+    (('show', 'arp'), parse_arp),
+    (('show', 'ip', 'arp'), parse_arp),
+)
+
+def parser_for(command):
+    """Return the parser for command (IOS abbreviations allowed), or None.
+
+    Trailing filters and arguments are accepted, e.g. 'sh mac add vlan 10'.
+    """
+    words = command.lower().split('|')[0].split()
+    if words[:1] == ['do']:
+        words = words[1:]
+    for template, parser in PARSERS:
+        if len(words) >= len(template) and all(
+                word and keyword.startswith(word) for word, keyword in zip(words, template)):
+            return parser
+    return None
+
+def parse_output(command, output):
+    """Parse the output of command into a list of records, or None if there is no parser"""
+    parser = parser_for(command)
+    if parser is None:
+        return None
+    return list(parser(output))
+
+def records_as_dicts(records):
+    """JSON-friendly form of a parse_output result"""
+    if records is None:
+        return None
+    return [record._asdict() for record in records]
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Parse IOS show output read from stdin into JSON")
+    parser.add_argument('command', help="The show command that produced the output")
+    args = parser.parse_args()
+
+    show_parser = parser_for(args.command)
+    if show_parser is None:
+        print(json.dumps({"success": False, "error": f"No parser for '{args.command}'"}))
+        sys.exit(1)
+    print(json.dumps({"success": True, "records": records_as_dicts(show_parser(sys.stdin))}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Tests for the running-config delta engine"""
+
+from config_delta import (SKIP_NO_CHANGES, SKIP_PRESENT, SKIP_SECTION_UNCHANGED, PlannedCommand,
+                          canonical, parse_config, plan_delta, restore_commands)
+
+RUNNING = parse_config("""Building configuration...
+
+Current configuration : 312 bytes
+!
+hostname SW1
+!
+interface GigabitEthernet0/1
+ switchport mode access
+ switchport access vlan 10
+!
+interface GigabitEthernet0/2
+ switchport mode access
+!
+vlan 10
+ name Employees
+!
+end
+""")
+
+def reasons(plan):
+    return [item.skip_reason for item in plan]
+
+def test_parse_config_builds_sections():
+    assert list(RUNNING) == ['hostname SW1', 'interface GigabitEthernet0/1',
+                             'interface GigabitEthernet0/2', 'vlan 10']
+    assert list(RUNNING['interface GigabitEthernet0/1']) == ['switchport mode access',
+                                                             'switchport access vlan 10']
+
+def test_canonical_expands_interface_abbreviations():
+    assert canonical('int gi0/1') == 'interface GigabitEthernet0/1'
+    assert canonical('no  shutdown') == 'no shutdown'
+
+def test_plan_has_one_entry_per_command():
+    commands = ['enable', 'configure terminal', 'hostname SW2', 'interface gi0/1',
+                'switchport mode access', 'exit', 'vlan 20', 'name Guests', 'end']
+    plan = plan_delta(RUNNING, commands)
+    assert [item.command for item in plan] == commands
+
+def test_unchanged_section_is_skipped_with_its_header():
+    commands = ['configure terminal', 'interface gi0/1', 'switchport mode access', 'exit', 'end']
+    assert reasons(plan_delta(RUNNING, commands)) == [
+        SKIP_NO_CHANGES, SKIP_SECTION_UNCHANGED, SKIP_PRESENT, SKIP_SECTION_UNCHANGED, SKIP_NO_CHANGES]
+
+def test_changed_section_sends_its_header_in_place():
+    commands = ['configure terminal', 'interface gi0/1', 'switchport mode access',
+                'switchport access vlan 20', 'exit', 'end']
+    assert plan_delta(RUNNING, commands) == [
+        PlannedCommand('configure terminal', None),
+        PlannedCommand('interface gi0/1', None),
+        PlannedCommand('switchport mode access', SKIP_PRESENT),
+        PlannedCommand('switchport access vlan 20', None),
+        PlannedCommand('exit', None),
+        PlannedCommand('end', None)]
+
+def test_new_section_is_sent_even_without_children():
+    plan = plan_delta(RUNNING, ['configure terminal', 'vlan 30', 'end'])
+    assert reasons(plan) == [None, None, None]
+
+def test_interface_range_is_unchanged_only_if_every_member_is():
+    unchanged = plan_delta(RUNNING, ['configure terminal', 'interface range gi0/1 - 2',
+                                     'switchport mode access', 'end'])
+    assert reasons(unchanged)[1:3] == [SKIP_SECTION_UNCHANGED, SKIP_PRESENT]
+    changed = plan_delta(RUNNING, ['configure terminal', 'interface range gi0/1 - 2',
+                                   'switchport access vlan 10', 'end'])
+    assert reasons(changed)[1:3] == [None, None]
+
+def test_global_lines_and_negations():
+    plan = plan_delta(RUNNING, ['configure terminal', 'hostname SW1', 'no vlan 20', 'no vlan 10', 'end'])
+    assert reasons(plan) == [None, SKIP_PRESENT, SKIP_PRESENT, None, None]
+
+def test_disabling_a_default_that_is_on_is_sent():
+    # Enabled defaults are not in the running-config; only their 'no' form is
+    plan = plan_delta(RUNNING, ['configure terminal', 'no ip domain-lookup', 'no cdp run', 'end'])
+    assert reasons(plan) == [None, None, None, None]
+    disabled = parse_config("no ip domain-lookup\n")
+    assert reasons(plan_delta(disabled, ['configure terminal', 'no ip domain-lookup', 'end'])) == [
+        SKIP_NO_CHANGES, SKIP_PRESENT, SKIP_NO_CHANGES]
+
+def test_negating_a_shown_when_set_line():
+    plan = plan_delta(RUNNING, ['configure terminal', 'interface gi0/2', 'no shutdown',
+                                'no description', 'exit', 'end'])
+    assert reasons(plan)[2:4] == [SKIP_PRESENT, SKIP_PRESENT]
+
+def test_exec_commands_are_always_sent():
+    assert reasons(plan_delta(RUNNING, ['show running-config', 'write memory'])) == [None, None]
+
+def test_restore_commands_undo_changes():
+    current = parse_config("""hostname SW2
+interface GigabitEthernet0/1
+ switchport mode access
+ switchport access vlan 20
+interface GigabitEthernet0/2
+ switchport mode access
+vlan 10
+ name Employees
+vlan 30
+""")
+    assert restore_commands(RUNNING, current) == [
+        'no hostname SW2', 'no vlan 30', 'hostname SW1',
+        'interface GigabitEthernet0/1', 'no switchport access vlan 20', 'switchport access vlan 10', 'exit']
@@ -0,0 +1,81 @@
+"""Tests for separating unsolicited log messages from command output"""
+
+import time
+
+from console_log import ConsoleLog, parse_log_line
+from device_simulator import start_simulator
+from latency_model import LatencyModel
+from serial_executor import SerialExecutor
+from show_parsers import parse_output
+
+def test_parse_log_line():
+    message = parse_log_line('000123: *Oct 17 06:34:18.123: %LINK-3-UPDOWN: Interface Gi0/1, changed state to up')
+    assert (message.facility, message.severity, message.mnemonic) == ('LINK', 3, 'UPDOWN')
+    assert message.text == 'Interface Gi0/1, changed state to up'
+    assert message.timestamp == '*Oct 17 06:34:18.123' and message.sequence == 123
+    bare = parse_log_line(b'%SYS-5-CONFIG_I: Configured from console by console\r\n')
+    assert bare.timestamp is None and bare.sequence is None
+    assert parse_log_line('Gi0/1  connected  1  a-full a-1000 10/100/1000BaseTX') is None
+    assert parse_log_line('SW1#') is None
+
+def test_console_log_is_bounded_and_calls_back():
+    seen = []
+    log = ConsoleLog(max_messages=2, callback=seen.append)
+    for number in range(3):
+        log.put(parse_log_line(f'%SYS-5-CONFIG_I: change {number}'))
+    assert [message.text for message in seen] == ['change 0', 'change 1', 'change 2']
+    assert log.stats() == {"queued": 2, "received": 3, "dropped": 1, "max_messages": 2}
+    assert log.get().text == 'change 1'
+    assert [message.text for message in log.drain()] == ['change 2']
+    assert log.get(timeout=0.01) is None
+
+def connect(console):
+    executor = SerialExecutor(port=console.port, latency_model=LatencyModel())
+    assert executor.connect()
+    executor.send_command("enable")
+    return executor
+
+def test_link_messages_leave_the_command_output():
+    console = start_simulator(hostname='SW1', console_logging=True)
+    executor = connect(console)
+    try:
+        result = executor.run_commands("configure terminal\ninterface gi0/1\nshutdown\nno shutdown\nend\n"
+                                       "show ip interface brief")
+        assert result['success']
+        assert not any('%LINK' in entry['response'] or '%LINEPROTO' in entry['response']
+                       for entry in result['results'])
+        time.sleep(0.1)
+        executor.send_command("show clock")
+        mnemonics = [(message.facility, message.mnemonic) for message in executor.console_log.drain()]
+        assert ('LINK', 'CHANGED') in mnemonics and ('LINK', 'UPDOWN') in mnemonics
+        assert ('LINEPROTO', 'UPDOWN') in mnemonics
+    finally:
+        executor.close()
+        console.stop()
+
+def test_message_while_a_command_runs():
+    console = start_simulator(hostname='SW1', mac_entries=2000, latency={'show mac': 0.3}, console_logging=True)
+    executor = connect(console)
+    try:
+        # Arrives after the echo, ahead of the table
+        console.device.log('%SYS-5-CONFIG_I: Configured from console by vty0', delay=0.1)
+        response = executor.send_command("show mac address-table")
+        assert '%SYS' not in response
+        assert len(parse_output('show mac address-table', response)) == 2000
+        message = executor.console_log.get(timeout=1)
+        assert (message.facility, message.severity, message.mnemonic) == ('SYS', 5, 'CONFIG_I')
+    finally:
+        executor.close()
+        console.stop()
+
+def test_message_between_commands_is_kept():
+    console = start_simulator(hostname='SW1', console_logging=True)
+    executor = connect(console)
+    try:
+        console.device.log('%SYS-5-RESTART: System restarted --')
+        time.sleep(0.1)
+        assert 'Cisco IOS Software' in executor.send_command("show version")
+        assert executor.console_log.get(timeout=1).mnemonic == 'RESTART'
+    finally:
+        executor.close()
+        console.stop()
@@ -0,0 +1,122 @@
+"""Tests for per-device turn-taking and merging of identical show batches"""
+
+import threading
+import time
+
+import pytest
+
+from device_scheduler import DeviceScheduler, coalesce_key, is_read_only, scheduler_for
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+def queue_behind_holder(scheduler, batches):
+    """Queue batches ((name, read_only), ...) while the device is held; return the order they ran in"""
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with scheduler.turn():
+            release.wait()
+
+    def take(name, read_only):
+        with scheduler.turn(read_only):
+            order.append(name)
+
+    threads = [start(hold)]
+    wait_until(lambda: scheduler.stats()['busy'])
+    for queued, (name, read_only) in enumerate(batches, 1):
+        threads.append(start(take, name, read_only))
+        wait_until(lambda: sum(scheduler.stats()[key] for key in ('queued_reads', 'queued_writes')) == queued)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return order
+
+def test_read_only_batches():
+    assert is_read_only(['enable', 'terminal length 0', 'sh ip int br', 'do show vlan'])
+    assert not is_read_only(['show version', 'configure terminal'])
+    assert not is_read_only([])
+    assert coalesce_key(['sh ver'], True) == coalesce_key(['show  version'], True) == (('show version',), True)
+    assert coalesce_key(['write memory']) is None
+
+def test_shows_run_ahead_of_a_waiting_config():
+    scheduler = DeviceScheduler()
+    order = queue_behind_holder(scheduler, [('config', False), ('show 1', True), ('show 2', True)])
+    assert order == ['show 1', 'show 2', 'config']
+    assert scheduler.idle()
+
+def test_config_is_not_starved_by_shows():
+    scheduler = DeviceScheduler(max_overtakes=2)
+    order = queue_behind_holder(scheduler, [('config', False)] + [(f'show {n}', True) for n in range(4)])
+    assert order == ['show 0', 'show 1', 'config', 'show 2', 'show 3']
+
+def test_identical_keyed_runs_share_one_call():
+    scheduler = DeviceScheduler()
+    calls = []
+    release = threading.Event()
+    results = []
+
+    def show():
+        calls.append(1)
+        release.wait()
+        return {"success": True}
+
+    threads = [start(lambda: results.append(scheduler.run(show, read_only=True, key='k'))) for _ in range(3)]
+    wait_until(lambda: scheduler.stats()['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(result.get('coalesced', False) for result in results) == [False, True, True]
+    # A finished run is not reused
+    assert scheduler.run(show, read_only=True, key='k') == {"success": True}
+    assert len(calls) == 2
+
+def test_joined_callers_see_the_error():
+    scheduler = DeviceScheduler()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait()
+        raise RuntimeError('port gone')
+
+    def call():
+        try:
+            scheduler.run(fail, read_only=True, key='k')
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [start(call) for _ in range(2)]
+    wait_until(lambda: scheduler.stats()['coalesced'] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ['port gone', 'port gone']
+    assert scheduler.idle()
+
+def test_stats_count_turns_and_waits():
+    scheduler = DeviceScheduler()
+    assert scheduler.run(lambda: 1) == 1
+    assert scheduler.run(lambda: 2, read_only=True) == 2
+    with pytest.raises(ValueError):
+        scheduler.run(lambda: int('x'))
+    stats = scheduler.stats()
+    assert stats['completed'] == 3 and not stats['busy']
+    assert stats['wait']['read']['samples'] == 1 and stats['wait']['write']['samples'] == 2
+
+def test_one_scheduler_per_device(tmp_path):
+    link = tmp_path / 'console'
+    link.symlink_to('/dev/null')
+    assert scheduler_for(str(link)) is scheduler_for('/dev/null')
+    assert scheduler_for('telnet://admin:x@10.0.0.1:2001') is scheduler_for('telnet://10.0.0.1:2001')
+    assert scheduler_for('telnet://10.0.0.1:2002') is not scheduler_for('telnet://10.0.0.1:2001')
@@ -0,0 +1,88 @@
+"""Tests for the command latency model"""
+
+import asyncio
+import json
+import os
+
+from async_serial_executor import AsyncSerialExecutor
+from latency_model import (MAX_BACKOFF, MAX_DEADLINE, MIN_DEADLINE, SLOW_CLASS_DEADLINES, LatencyModel,
+                           command_class)
+from serial_executor import SerialExecutor
+from transports import device_key
+
+def observe(model, seconds, times=1, timed_out=False, command='show version'):
+    for _ in range(times):
+        model.observe('sw', command, 'privileged', seconds, timed_out=timed_out)
+
+def test_command_classes():
+    assert command_class('sh run') == 'show running-config'
+    assert command_class('show tech') == 'show tech-support'
+    assert command_class('wr mem') == 'write'
+    assert command_class('conf replace flash:x force') == 'configure replace'
+    assert command_class('switchport mode access', 'config-if') == 'config switchport'
+    assert command_class('do copy run start', 'config') == 'copy'
+
+def test_priors_before_enough_samples():
+    model = LatencyModel()
+    assert model.deadline('sw', 'show version') == MIN_DEADLINE
+    assert model.deadline('sw', 'copy run start') == SLOW_CLASS_DEADLINES['copy']
+    assert model.deadline('sw', 'show version', default=12.0) == 12.0
+
+def test_learned_deadline_follows_replies():
+    model = LatencyModel()
+    observe(model, 8.0, times=10)
+    assert 8.0 < model.deadline('sw', 'show version') <= 12.0
+
+def test_timeouts_back_off_within_bounds():
+    model = LatencyModel()
+    observe(model, 1.0, times=5)
+    deadlines = [model.deadline('sw', 'show version')]
+    for _ in range(5):
+        observe(model, deadlines[-1], timed_out=True)
+        deadlines.append(model.deadline('sw', 'show version'))
+    assert deadlines[:4] == [MIN_DEADLINE, MIN_DEADLINE * 2, MIN_DEADLINE * 4, MIN_DEADLINE * 8]
+    assert max(deadlines) == MIN_DEADLINE * MAX_BACKOFF
+    # A timeout is not a latency sample
+    entry = model.estimate('sw', 'show version')
+    assert entry['max'] == 1.0 and entry['count'] == 5 and entry['timeouts'] == 5
+
+def test_backoff_and_slowest_reply_decay():
+    model = LatencyModel()
+    observe(model, 0.05, times=5)
+    observe(model, 10.0, times=3, timed_out=True)
+    observe(model, 60.0)
+    assert model.deadline('sw', 'show version') > 60.0
+    observe(model, 0.05, times=200)
+    assert model.deadline('sw', 'show version') == MIN_DEADLINE
+    assert model.estimate('sw', 'show version')['backoff'] == 1.0
+
+def test_deadline_never_exceeds_maximum():
+    model = LatencyModel()
+    observe(model, 600.0, times=5, command='show tech-support')
+    observe(model, 900.0, times=3, timed_out=True, command='show tech-support')
+    assert model.deadline('sw', 'show tech-support') == MAX_DEADLINE
+
+def test_profile_round_trip(tmp_path):
+    path = tmp_path / 'profiles' / 'latency.json'
+    model = LatencyModel(str(path))
+    observe(model, 2.0, times=4)
+    model.save()
+    assert os.listdir(path.parent) == ['latency.json']
+    assert json.loads(path.read_text())['devices']['sw']['show version']['count'] == 4
+    assert LatencyModel(str(path)).estimate('sw', 'show version') == model.estimate('sw', 'show version')
+
+def test_both_executors_share_device_keys_and_classes(simulator):
+    batch = "enable\nconfigure terminal\nvlan 10\nhostname NEWNAME\nend"
+    model = LatencyModel()
+    executor = SerialExecutor(port=simulator.port, latency_model=model)
+    assert executor.connect()
+    executor.run_commands(batch)
+    executor.close()
+    learned = set(model.profiles)
+    classes = set(model.profiles[device_key(simulator.port)])
+
+    model = LatencyModel()
+    asyncio.run(AsyncSerialExecutor(port=simulator.port, latency_model=model).execute_commands(batch))
+    assert set(model.profiles) == learned == {device_key(simulator.port)}
+    assert set(model.profiles[device_key(simulator.port)]) == classes
+    assert 'config vlan' in classes and 'config hostname' in classes
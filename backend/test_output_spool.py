@@ -0,0 +1,73 @@
+"""Tests for spooling large command output to files"""
+
+import hashlib
+import os
+import time
+
+from device_simulator import start_simulator
+from latency_model import LatencyModel
+from output_spool import OutputSpool
+from serial_executor import SerialExecutor
+from show_parsers import parse_output
+
+def test_writer_spools_under_the_hash(tmp_path):
+    spool = OutputSpool(str(tmp_path), threshold=16)
+    writer = spool.writer()
+    data = b''.join(f'line {number}\r\n'.encode() for number in range(1000))
+    for start in range(0, len(data), 777):
+        writer.write(data[start:start + 777])
+    spooled = writer.finish()
+    assert spooled.sha256 == hashlib.sha256(data).hexdigest() and spooled.size == len(data)
+    assert os.listdir(tmp_path) == [spooled.handle + '.out']
+    assert spool.stats()['spooled'] == 1 and spool.stats()['spooled_bytes'] == len(data)
+
+    again = spool.get(spooled.handle)
+    assert again.read() == data
+    assert again.read(5, 3) == b'0\r\n' and again.read(len(data) - 4) == b'99\r\n'
+    assert list(again)[998:] == ['line 998', 'line 999']
+    assert again.preview(6) == 'line 0'
+
+def test_unknown_handles_and_empty_writers(tmp_path):
+    spool = OutputSpool(str(tmp_path))
+    assert spool.get('0' * 64) is None
+    assert spool.get('../../etc/passwd') is None
+    assert spool.writer().finish() is None
+    writer = spool.writer()
+    writer.write(b'partial')
+    writer.discard()
+    assert os.listdir(tmp_path) == []
+
+def test_old_spool_files_are_pruned(tmp_path):
+    spool = OutputSpool(str(tmp_path), max_age=60)
+    old = spool.writer()
+    old.write(b'old output')
+    old = old.finish()
+    os.utime(old.path, (time.time() - 120, time.time() - 120))
+    new = spool.writer()
+    new.write(b'new output')
+    new = new.finish()
+    assert spool.get(old.handle) is None
+    assert spool.get(new.handle).read() == b'new output'
+
+def test_executor_spools_large_output(tmp_path):
+    console = start_simulator(hostname='SW1', mac_entries=5000)
+    spool = OutputSpool(str(tmp_path), threshold=64 * 1024)
+    executor = SerialExecutor(port=console.port, output_spool=spool, latency_model=LatencyModel())
+    try:
+        assert executor.connect()
+        executor.send_command("enable")
+        large, small = executor.run_commands("show mac address-table\nshow version", parse=True)['results']
+        assert 'spooled' not in small and 'Cisco IOS Software' in small['response']
+
+        spooled = spool.get(large['spooled']['handle'])
+        assert spooled.size == large['spooled']['size'] >= spool.threshold
+        assert hashlib.sha256(spooled.read()).hexdigest() == spooled.handle
+        assert len(large['response']) < spooled.size
+        assert large['response'] in spooled.text()
+        # Parsers read the spool file, and it holds the whole table
+        assert len(large['parsed']) == 5000
+        assert large['parsed'] == [entry._asdict() for entry in parse_output('show mac address-table', spooled)]
+        assert executor.mode == 'privileged'
+    finally:
+        executor.close()
+        console.stop()
@@ -0,0 +1,135 @@
+"""Simulator-backed tests for SerialExecutor batches: abort, rollback and mode recovery"""
+
+from device_simulator import start_simulator
+from latency_model import LatencyModel
+from serial_executor import RECEIVE_BUFFER_SIZE, SerialExecutor
+from show_cache import ShowCache
+
+def test_abort_skips_the_rest_and_leaves_config_mode(executor):
+    result = executor.run_commands("configure terminal\nhostname SW2\nbogus command\nhostname SW3\nend",
+                                   on_error='abort')
+    assert not result['success']
+    assert result['error'] == "Batch aborted after 'bogus command' failed"
+    assert result['failed'] == ['bogus command']
+    assert result['skipped'] == ['hostname SW3', 'end']
+    assert executor.mode == 'privileged'
+    assert executor.run_commands("show version")['success']
+
+def test_transaction_rolls_back_on_failure(executor, simulator):
+    result = executor.run_commands("configure terminal\nhostname SW2\nvlan 30\nbogus command\nend",
+                                   transaction=True)
+    assert not result['success']
+    assert result['rollback']['success']
+    assert simulator.device.hostname == 'SW1'
+    running = executor.send_command("show running-config")
+    assert 'hostname SW1' in running and 'vlan 30' not in running
+    assert executor.mode == 'privileged'
+
+def test_transaction_started_in_config_mode_is_snapshotted(executor, simulator):
+    executor.send_command("configure terminal")
+    result = executor.run_commands("hostname SW2\nbogus command", transaction=True)
+    assert result['rollback']['success']
+    assert simulator.device.hostname == 'SW1'
+
+def test_successful_transaction_keeps_its_changes(executor, simulator):
+    result = executor.run_commands("configure terminal\nhostname SW2\nend", transaction=True)
+    assert result['success'] and result['rollback'] is None
+    assert simulator.device.hostname == 'SW2'
+
+def test_delta_skips_lines_already_present(executor):
+    batch = "configure terminal\ninterface gi0/1\nswitchport mode access\nexit\nend"
+    executor.run_commands(batch)
+    result = executor.run_commands(batch, delta=True)
+    assert result['success']
+    assert result['applied'] == []
+    assert len(result['results']) == 5
+
+def test_connect_recovers_from_a_config_submode(simulator):
+    first = SerialExecutor(port=simulator.port, latency_model=LatencyModel())
+    assert first.connect()
+    for command in ("enable", "configure terminal", "interface gi0/1"):
+        first.send_command(command)
+    assert first.mode == 'config-if'
+    first.connection.close()
+
+    second = SerialExecutor(port=simulator.port, latency_model=LatencyModel())
+    try:
+        assert second.connect()
+        assert second.mode == 'privileged'
+        assert second.paging_disabled
+        assert second.run_commands("show vlan brief")['success']
+    finally:
+        second.close()
+
+def test_slow_command_times_out_without_losing_the_session():
+    console = start_simulator(hostname='SW1', latency={'show clock': 6})
+    executor = SerialExecutor(port=console.port, command_timeout=5, latency_model=LatencyModel())
+    try:
+        assert executor.connect()
+        result = executor.run_commands("show clock\nshow version")
+        clock, version = result['results']
+        assert clock['timed_out'] and clock['error']
+        # The next command waited for the late prompt and kept the output
+        assert version['late_output']['command'] == 'show clock'
+        assert 'UTC' in version['late_output']['response']
+        assert not version['error'] and 'Cisco IOS Software' in version['response']
+        assert executor.session_lost is None
+    finally:
+        executor.close()
+        console.stop()
+
+def test_command_is_not_sent_while_the_device_is_busy():
+    console = start_simulator(hostname='SW1', latency={'show clock': 8})
+    executor = SerialExecutor(port=console.port, latency_model=LatencyModel())
+    try:
+        assert executor.connect()
+        # The echo pushes the deadline out by OUTPUT_GRACE, still short of the reply
+        executor.send_command("show clock", timeout=0.5)
+        assert executor.last_command_stats['timed_out']
+        assert executor.send_command("show version", timeout=0.5) == \
+            "No response from device: still busy with 'show clock'"
+        assert executor.probe(timeout=5)
+        assert executor.session_lost is None and executor.busy_with is None
+        assert 'Cisco IOS Software' in executor.send_command("show version", timeout=5)
+    finally:
+        executor.close()
+        console.stop()
+
+def test_upshift_from_user_exec_and_restore_on_close():
+    console = start_simulator(hostname='SW1', baudrate=9600)
+    executor = SerialExecutor(port=console.port, upshift_baudrate=115200, latency_model=LatencyModel())
+    try:
+        assert executor.connect()
+        assert 'upshift' in executor.connect_timings
+        assert executor.baudrate == console.device.line_speed == 115200
+        assert executor.run_commands("show version")['success']
+        executor.close()
+        assert console.device.line_speed == 9600
+    finally:
+        executor.close()
+        console.stop()
+
+def test_receive_buffer_shrinks_after_a_large_output():
+    console = start_simulator(hostname='SW1', mac_entries=20000)
+    executor = SerialExecutor(port=console.port, latency_model=LatencyModel())
+    try:
+        assert executor.connect()
+        response = executor.send_command("show mac address-table")
+        assert len(response) > 4 * RECEIVE_BUFFER_SIZE
+        assert len(executor.receive_buffer) == RECEIVE_BUFFER_SIZE
+    finally:
+        executor.close()
+        console.stop()
+
+def test_interface_change_drops_cached_spanning_tree(simulator):
+    executor = SerialExecutor(port=simulator.port, show_cache=ShowCache(), latency_model=LatencyModel())
+    try:
+        assert executor.connect()
+        executor.send_command("enable")
+        # The simulator has no spanning tree, so seed the entry a real switch would leave
+        executor.show_cache.put(executor.port, 'show spanning-tree', 'VLAN0001 ...')
+        assert executor.run_commands("show spanning-tree")['results'][0].get('cached')
+        executor.run_commands("configure terminal\ninterface gi0/1\nspanning-tree portfast\nend")
+        assert executor.show_cache.get(executor.port, 'show spanning-tree') is None
+    finally:
+        executor.close()
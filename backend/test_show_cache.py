@@ -0,0 +1,72 @@
+"""Tests for show normalization, invalidation rules and the show cache"""
+
+import time
+
+from show_cache import GLOBAL_SHOWS, INTERFACE_SHOWS, VLAN_SHOWS, ShowCache, affected_shows, normalize_show
+
+def test_normalize_show_expands_abbreviations():
+    assert normalize_show('sh ip int br') == 'show ip interface brief'
+    assert normalize_show('do show  vlan brief') == 'show vlan brief'
+    assert normalize_show('sh run | inc hostname') == 'show running-config | inc hostname'
+    assert normalize_show('configure terminal') is None
+
+def test_shows_and_plain_exec_commands_change_nothing():
+    assert affected_shows('privileged', 'show running-config') == ()
+    assert affected_shows('privileged', 'ping 10.0.0.1') == ()
+    assert affected_shows('privileged', 'configure terminal') == ()
+    assert affected_shows('privileged', 'conf t') == ()
+    assert affected_shows('privileged', 'configure') == ()
+
+def test_loading_a_config_invalidates_everything():
+    assert affected_shows('privileged', 'configure replace flash:backup.cfg force') is None
+    assert affected_shows('privileged', 'configure memory') is None
+    assert affected_shows('privileged', 'configure network') is None
+    assert affected_shows('privileged', 'copy flash:backup.cfg running-config') is None
+    assert affected_shows('privileged', 'copy tftp://10.0.0.5/sw1.cfg system:running-config') is None
+    assert affected_shows('privileged', 'copy start run') is None
+    assert affected_shows('privileged', 'reload') is None
+
+def test_saving_only_touches_the_startup_config():
+    assert affected_shows('privileged', 'write memory') == ('show startup-config',)
+    assert affected_shows('privileged', 'copy running-config startup-config') == ('show startup-config',)
+
+def test_config_lines_invalidate_what_they_change():
+    assert affected_shows('config', 'hostname SW2') is None
+    assert affected_shows('config', 'interface gi0/1') == INTERFACE_SHOWS
+    assert affected_shows('config-if', 'shutdown') == INTERFACE_SHOWS
+    assert 'show spanning-tree' in affected_shows('config-if', 'spanning-tree portfast')
+    assert affected_shows('config', 'vlan 20') == VLAN_SHOWS
+    assert affected_shows('config', 'no vlan 20') == VLAN_SHOWS
+    assert affected_shows('config', 'service timestamps') == GLOBAL_SHOWS
+    assert affected_shows('config', 'end') == ()
+
+def test_do_runs_with_exec_rules():
+    assert affected_shows('config', 'do show vlan') == ()
+    assert affected_shows('config', 'do write memory') == ('show startup-config',)
+    assert affected_shows('config', 'do copy flash:x.cfg running-config') is None
+
+def test_unknown_mode_invalidates_everything():
+    assert affected_shows(None, 'shutdown') is None
+
+def test_cache_expires_and_evicts():
+    cache = ShowCache(ttl=0.05, max_entries=2)
+    cache.put('sw', 'show version', 'v1')
+    assert cache.get('sw', 'show version') == 'v1'
+    time.sleep(0.06)
+    assert cache.get('sw', 'show version') is None
+
+    cache = ShowCache(max_entries=2)
+    for command in ('show version', 'show vlan', 'show arp'):
+        cache.put('sw', command, command)
+    assert cache.get('sw', 'show version') is None
+    assert cache.stats()['evictions'] == 1
+
+def test_invalidate_by_prefix_and_device():
+    cache = ShowCache()
+    cache.put('sw1', 'show vlan brief', 'a')
+    cache.put('sw1', 'show version', 'b')
+    cache.put('sw2', 'show vlan brief', 'c')
+    assert cache.invalidate('sw1', VLAN_SHOWS) == 1
+    assert cache.get('sw1', 'show version') == 'b'
+    assert cache.get('sw2', 'show vlan brief') == 'c'
+    assert cache.invalidate('sw1') == 1
@@ -0,0 +1,96 @@
+"""Tests for the show command parsers"""
+
+from device_simulator import SimulatedDevice
+from show_parsers import (ArpEntry, IpInterface, MacEntry, parse_output, parse_vlan_brief, parser_for,
+                          records_as_dicts)
+
+IP_INTERFACE_BRIEF = """Interface              IP-Address      OK? Method Status                Protocol
+Vlan1                  10.0.0.1        YES manual up                    up
+GigabitEthernet0/1     unassigned      YES unset  administratively down down
+"""
+
+VLAN_BRIEF = """
+VLAN Name                             Status    Ports
+---- -------------------------------- --------- -------------------------------
+1    default                          active    Gi0/1, Gi0/2
+                                                Gi0/3
+20   VOICE                            active
+1002 fddi-default                     act/unsup
+"""
+
+MAC_ADDRESS_TABLE = """          Mac Address Table
+-------------------------------------------
+
+Vlan    Mac Address       Type        Ports
+----    -----------       --------    -----
+ All    0100.0CCC.CCCC    STATIC      CPU
+  10    0011.2233.44AA    dynamic     Gi0/1
+Total Mac Addresses for this criterion: 2
+"""
+
+ARP = """Protocol  Address          Age (min)  Hardware Addr   Type   Interface
+Internet  10.0.0.1                -   0011.2233.4455  ARPA   Vlan1
+Internet  10.0.0.7               12   AABB.CCDD.EEFF  ARPA   Vlan1
+"""
+
+def test_parser_for_accepts_abbreviations_filters_and_do():
+    assert parser_for('sh ip int br') is parser_for('show ip interface brief')
+    assert parser_for('sh mac add vlan 10') is parser_for('show mac-address-table')
+    assert parser_for('do show vlan brief | exclude unsup') is parse_vlan_brief
+    assert parser_for('show running-config') is None
+    assert parse_output('show clock', '*12:00:00.000 UTC Mon Mar 1 1993') is None
+
+def test_ip_interface_brief():
+    assert parse_output('show ip interface brief', IP_INTERFACE_BRIEF) == [
+        IpInterface('Vlan1', '10.0.0.1', True, 'manual', 'up', 'up'),
+        IpInterface('GigabitEthernet0/1', None, True, 'unset', 'administratively down', 'down'),
+    ]
+
+def test_vlan_brief_joins_wrapped_port_lists():
+    vlans = parse_output('show vlan brief', VLAN_BRIEF)
+    assert [(vlan.vlan_id, vlan.name, vlan.status) for vlan in vlans] == [
+        (1, 'default', 'active'), (20, 'VOICE', 'active'), (1002, 'fddi-default', 'act/unsup')]
+    assert vlans[0].ports == ('Gi0/1', 'Gi0/2', 'Gi0/3')
+    assert vlans[1].ports == ()
+
+def test_mac_address_table():
+    assert parse_output('show mac address-table', MAC_ADDRESS_TABLE) == [
+        MacEntry('All', '0100.0ccc.cccc', 'STATIC', ('CPU',)),
+        MacEntry(10, '0011.2233.44aa', 'DYNAMIC', ('Gi0/1',)),
+    ]
+
+def test_arp():
+    assert parse_output('show ip arp', ARP) == [
+        ArpEntry('Internet', '10.0.0.1', None, '0011.2233.4455', 'ARPA', 'Vlan1'),
+        ArpEntry('Internet', '10.0.0.7', 12, 'aabb.ccdd.eeff', 'ARPA', 'Vlan1'),
+    ]
+
+def test_strings_and_line_iterables_parse_alike():
+    device = SimulatedDevice(hostname='SW1')
+    for command, lines in (('show ip interface brief', device.show_ip_interface_brief()),
+                           ('show interfaces status', device.show_interfaces_status()),
+                           ('show mac address-table', device.show_mac_address_table())):
+        records = parse_output(command, '\r\n'.join(lines) + '\r\n')
+        assert records and records == parse_output(command, iter(lines))
+    # The header row is not an interface
+    ports = [row.port for row in parse_output('show interfaces status', device.show_interfaces_status())]
+    assert 'Port' not in ports and 'Gi0/1' in ports
+
+def test_version_fields():
+    version, = parse_output('show version', SimulatedDevice(hostname='SW1').show_version())
+    assert version.hostname == 'SW1'
+    assert version.software == 'C2960-LANBASEK9-M' and version.version == '15.0(2)SE11'
+    assert version.config_register and version.serial_number
+    assert parse_output('show version', 'nothing to see') == []
+
+def test_records_as_dicts():
+    assert records_as_dicts(None) is None
+    assert records_as_dicts(parse_output('show arp', ARP))[1] == {
+        'protocol': 'Internet', 'address': '10.0.0.7', 'age': 12, 'mac_address': 'aabb.ccdd.eeff',
+        'type': 'ARPA', 'interface': 'Vlan1'}
+
+def test_executor_attaches_parsed_records(executor):
+    result = executor.run_commands("show vlan brief\nshow clock", parse=True)
+    vlan, clock = result['results']
+    assert vlan['parsed'][0]['vlan_id'] == 1
+    assert 'parsed' not in clock
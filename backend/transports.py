@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Console transports for AIConsole
+Serial, telnet and SSH connections behind the pyserial-style interface that
+SerialExecutor drives (read, readinto, write, in_waiting, timeout, ...), so
+prompt detection, paging and the CLI mode state machine are shared by all
+"""
+
+import hashlib
+import os
+import select
+import socket
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+import serial
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+DEFAULT_PORTS = {'telnet': 23, 'ssh': 22}
+NETWORK_SCHEMES = tuple(DEFAULT_PORTS)
+
+# How long a network login may take, and how long an idle pooled connection is kept
+CONNECT_TIMEOUT = 10.0
+POOL_IDLE_TIMEOUT = 300.0
+POOL_MAX_IDLE = 4
+
+RECEIVE_CHUNK = 64 * 1024
+
+# SSH host keys are checked against these known_hosts files; a host that is in
+# none of them is refused unless unknown keys are trusted explicitly
+KNOWN_HOSTS_FILES = ('/etc/ssh/ssh_known_hosts', os.path.expanduser('~/.ssh/known_hosts'))
+TRUST_UNKNOWN_HOSTS = os.environ.get('AICONSOLE_TRUST_UNKNOWN_HOSTS') == '1'
+
+# Telnet commands (RFC 854) and the options a console client cares about
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO, SGA = 1, 3
+
+def transport_scheme(port):
+    """'telnet', 'ssh' or 'serial' for a port such as 'telnet://10.0.0.1:2001' or '/dev/ttyUSB0'"""
+    scheme = port.partition('://')[0].lower() if '://' in port else 'serial'
+    return scheme if scheme in NETWORK_SCHEMES else 'serial'
+
+def is_network_port(port):
+    return transport_scheme(port) != 'serial'
+
+def parse_port(port):
+    """Split a port into (scheme, host, tcp_port, username, password); serial paths have no host"""
+    scheme = transport_scheme(port)
+    if scheme == 'serial':
+        return scheme, None, None, None, None
+    url = urlsplit(port)
+    return (scheme, url.hostname, url.port or DEFAULT_PORTS[scheme],
+            unquote(url.username) if url.username else None,
+            unquote(url.password) if url.password else None)
+
+def device_key(port):
+    """Stable identity of the device behind port: the resolved path of a serial
+    port, or scheme://host:port of a network one (credentials left out)"""
+    scheme, host, tcp_port, _, _ = parse_port(port)
+    if scheme == 'serial':
+        return os.path.realpath(port)
+    return f'{scheme}://{host}:{tcp_port}'
+
+class TelnetCodec:
+    """Strips telnet commands from received data and answers option negotiation.
+
+    peer_options are the options the other side may enable (a console client
+    lets the device ECHO and suppress go-ahead); local_options are the ones
+    this side agrees to enable. Everything else is refused, and an option is
+    only ever answered once so negotiation cannot loop.
+    """
+
+    def __init__(self, peer_options=(ECHO, SGA), local_options=(SGA,)):
+        self.peer_options = frozenset(peer_options)
+        self.local_options = frozenset(local_options)
+        self.answered = set()
+        self.state = None
+        self.verb = None
+
+    def offer(self, option):
+        """IAC WILL option, sent unprompted (servers offering ECHO and SGA)"""
+        self.answered.add((DO, option))
+        return bytes((IAC, WILL, option))
+
+    def answer(self, verb, option):
+        if verb in (WONT, DONT) or (verb, option) in self.answered:
+            return b''
+        self.answered.add((verb, option))
+        if verb == WILL:
+            return bytes((IAC, DO if option in self.peer_options else DONT, option))
+        return bytes((IAC, WILL if option in self.local_options else WONT, option))
+
+    def decode(self, data):
+        """Return (payload, replies) for a chunk of received bytes"""
+        if self.state is None and IAC not in data:
+            return data.replace(b'\x00', b''), b''
+        payload = bytearray()
+        replies = bytearray()
+        for byte in data:
+            state = self.state
+            if state is None:
+                if byte == IAC:
+                    self.state = IAC
+                elif byte:
+                    payload.append(byte)
+            elif state == IAC:
+                if byte == IAC:
+                    payload.append(IAC)
+                    self.state = None
+                elif byte in (WILL, WONT, DO, DONT):
+                    self.verb = byte
+                    self.state = 'option'
+                elif byte == SB:
+                    self.state = SB
+                else:
+                    self.state = None
+            elif state == 'option':
+                replies += self.answer(self.verb, byte)
+                self.state = None
+            elif state == SB:
+                if byte == IAC:
+                    self.state = 'sb_iac'
+            elif state == 'sb_iac':
+                self.state = None if byte == SE else SB
+        return bytes(payload), bytes(replies)
+
+    @staticmethod
+    def encode(data):
+        """Escape literal 0xff bytes in outgoing data"""
+        return bytes(data).replace(b'\xff', b'\xff\xff')
+
+class StreamTransport:
+    """pyserial-compatible reads over a byte stream (socket or SSH channel).
+
+    Received data is decoded into a pending buffer; in_waiting polls without
+    blocking and readinto waits up to timeout, as pyserial does. Subclasses
+    implement _receive(timeout), _send(data) and _close().
+    """
+
+    scheme = None
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.baudrate = None
+        self.is_open = True
+        self.pending = bytearray()
+        # Session state kept while the connection sits in a TransportPool
+        self.session_state = {}
+
+    def _fill(self, timeout):
+        if not self.is_open:
+            raise ConnectionError("Connection is closed")
+        data = self._receive(timeout)
+        if data is None:
+            return 0
+        if not data:
+            self.is_open = False
+            raise ConnectionError("Connection closed by device")
+        self.pending += data
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        if not self.pending:
+            self._fill(0)
+        return len(self.pending)
+
+    def readinto(self, buffer):
+        if not self.pending:
+            self._fill(self.timeout)
+        count = min(len(buffer), len(self.pending))
+        buffer[:count] = self.pending[:count]
+        del self.pending[:count]
+        return count
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(self.pending) < size:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            self._fill(remaining)
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        return data
+
+    def write(self, data):
+        self._send(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.pending.clear()
+        while self.is_open and self._fill(0):
+            self.pending.clear()
+
+    def is_alive(self):
+        """True if the connection is open and the device has not hung up"""
+        try:
+            self.in_waiting
+        except (ConnectionError, OSError):
+            self.is_open = False
+        return self.is_open
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            try:
+                self._close()
+            except OSError:
+                pass
+
+class TelnetTransport(StreamTransport):
+    """Telnet to a device vty or a terminal server port"""
+
+    scheme = 'telnet'
+
+    def __init__(self, host, port=DEFAULT_PORTS['telnet'], timeout=None, connect_timeout=CONNECT_TIMEOUT):
+        super().__init__(timeout)
+        self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.codec = TelnetCodec()
+
+    def _receive(self, timeout):
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return None
+        try:
+            data = self.sock.recv(RECEIVE_CHUNK)
+        except BlockingIOError:
+            return None
+        if not data:
+            return data
+        payload, replies = self.codec.decode(data)
+        if replies:
+            self.sock.sendall(replies)
+        # A chunk of pure negotiation is not end of file
+        return payload if payload else None
+
+    def _send(self, data):
+        self.sock.setblocking(True)
+        try:
+            self.sock.sendall(self.codec.encode(data))
+        finally:
+            self.sock.setblocking(False)
+
+    def _close(self):
+        self.sock.close()
+
+class SshTransport(StreamTransport):
+    """Interactive SSH shell channel (needs the optional paramiko package).
+
+    The host key must be in one of KNOWN_HOSTS_FILES; with
+    trust_unknown_hosts a host that is in none of them is accepted for this
+    connection (a changed key is still refused).
+    """
+
+    scheme = 'ssh'
+
+    def __init__(self, host, port=DEFAULT_PORTS['ssh'], username=None, password=None, timeout=None,
+                 connect_timeout=CONNECT_TIMEOUT, trust_unknown_hosts=None):
+        if paramiko is None:
+            raise RuntimeError("SSH transport needs paramiko: pip install paramiko")
+        super().__init__(timeout)
+        if trust_unknown_hosts is None:
+            trust_unknown_hosts = TRUST_UNKNOWN_HOSTS
+        self.client = paramiko.SSHClient()
+        for path in KNOWN_HOSTS_FILES:
+            if os.path.exists(path):
+                self.client.load_system_host_keys(path)
+        self.client.set_missing_host_key_policy(
+            paramiko.AutoAddPolicy() if trust_unknown_hosts else paramiko.RejectPolicy())
+        self.client.connect(host, port=port, username=username, password=password,
+                            timeout=connect_timeout, banner_timeout=connect_timeout,
+                            auth_timeout=connect_timeout, look_for_keys=not password,
+                            allow_agent=not password)
+        self.channel = self.client.invoke_shell(term='vt100', width=0, height=0)
+
+    def _receive(self, timeout):
+        if not self.channel.recv_ready():
+            if self.channel.exit_status_ready() or self.channel.closed:
+                return b''
+            if timeout == 0:
+                return None
+            self.channel.settimeout(timeout)
+            try:
+                return self.channel.recv(RECEIVE_CHUNK)
+            except socket.timeout:
+                return None
+        return self.channel.recv(RECEIVE_CHUNK)
+
+    def _send(self, data):
+        self.channel.sendall(data)
+
+    def _close(self):
+        self.channel.close()
+        self.client.close()
+
+def open_transport(port, baudrate=9600, timeout=None, username=None, password=None,
+                   trust_unknown_hosts=None):
+    """Open the connection named by port: a serial device path, telnet:// or ssh:// URL.
+
+    Credentials in the URL win over the username/password arguments. Serial
+    ports come back as plain serial.Serial objects, opened exclusively.
+    trust_unknown_hosts (default: TRUST_UNKNOWN_HOSTS) accepts SSH hosts
+    missing from known_hosts.
+    """
+    scheme, host, tcp_port, url_username, url_password = parse_port(port)
+    if scheme == 'telnet':
+        return TelnetTransport(host, tcp_port, timeout=timeout)
+    if scheme == 'ssh':
+        return SshTransport(host, tcp_port, username=url_username or username,
+                            password=url_password or password, timeout=timeout,
+                            trust_unknown_hosts=trust_unknown_hosts)
+    return serial.Serial(
+        port=port,
+        baudrate=baudrate,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=timeout,
+        # Refuse a port another process already has open instead of interleaving with it
+        exclusive=True
+    )
+
+class TransportPool:
+    def __init__(self, idle_timeout=POOL_IDLE_TIMEOUT, max_idle=POOL_MAX_IDLE):
+        """Logged-in network connections kept open for reuse, keyed by port URL and credentials"""
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        # Salts the password digests in the keys, which are never stored in the clear
+        self.salt = os.urandom(16)
+
+    def key(self, port, username=None, password=None, trust_unknown_hosts=None):
+        """Connections are only shared by callers with the same user, password and host-key trust"""
+        scheme, host, tcp_port, url_username, url_password = parse_port(port)
+        secret = (url_password or password or '').encode('utf-8')
+        if trust_unknown_hosts is None:
+            trust_unknown_hosts = TRUST_UNKNOWN_HOSTS
+        return (scheme, host, tcp_port, url_username or username,
+                hashlib.sha256(self.salt + secret).hexdigest(), bool(trust_unknown_hosts))
+
+    def acquire(self, port, timeout=None, username=None, password=None, trust_unknown_hosts=None):
+        """Return an idle live connection opened with the same credentials, or open a new one"""
+        key = self.key(port, username, password, trust_unknown_hosts)
+        while True:
+            with self.lock:
+                entries = self.idle.get(key)
+                if not entries:
+                    break
+                released_at, transport = entries.pop()
+            if time.monotonic() - released_at <= self.idle_timeout and transport.is_alive():
+                transport.timeout = timeout
+                with self.lock:
+                    self.reused += 1
+                return transport
+            transport.close()
+        transport = open_transport(port, timeout=timeout, username=username, password=password,
+                                   trust_unknown_hosts=trust_unknown_hosts)
+        with self.lock:
+            self.opened += 1
+        transport.pool_key = key
+        return transport
+
+    def release(self, transport):
+        """Keep a healthy connection for the next acquire; close it if the pool is full"""
+        key = getattr(transport, 'pool_key', None)
+        if key is None or not transport.is_alive():
+            transport.close()
+            return
+        with self.lock:
+            entries = self.idle.setdefault(key, [])
+            if len(entries) < self.max_idle:
+                entries.append((time.monotonic(), transport))
+                return
+        transport.close()
+
+    def close_all(self):
+        with self.lock:
+            entries = [transport for idle in self.idle.values() for _, transport in idle]
+            self.idle.clear()
+        for transport in entries:
+            transport.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "idle": sum(len(entries) for entries in self.idle.values()),
+                "opened": self.opened,
+                "reused": self.reused
+            }
+
+# Shared by every executor that is not given its own pool
+DEFAULT_POOL = TransportPool()
@@ -20,6 +20,9 @@ from datetime import datetime
 BACKEND_URL = "http://localhost:3000"
 SWITCH_NAME = "SW-Office-Main"
 
+# Skip reason of config lines the delta engine found in the running-config (config_delta.SKIP_PRESENT)
+SKIP_PRESENT = "already in running-config"
+
 # Project configuration steps
 PROJECT_STEPS = [
     {
@@ -85,7 +88,10 @@ def execute_configuration_step(step):
             f"{BACKEND_URL}/comando",
             json={
                 "mensaje": step['prompt'],
-                "execute": True
+                "execute": True,
+                "delta": True,
+                "on_error": "abort",
+                "transaction": True
             },
             timeout=120
         )
@@ -105,7 +111,15 @@ def execute_configuration_step(step):
                 device_responses = result.get('device_responses', [])
                 errors_found = []
                 
+                # Lines skipped after an abort or rollback are not "already present"
+                present = [cmd_result for cmd_result in device_responses
+                           if cmd_result.get('skipped') == SKIP_PRESENT]
+                if present:
+                    print(f"\nSkipped {len(present)} line(s) already in the running-config")
+                
                 for cmd_result in device_responses:
+                    if cmd_result.get('skipped'):
+                        continue
                     response_text = cmd_result.get('response', '')
                     if any(err in response_text for err in ['Invalid', 'Error', 'Incomplete', '%']):
                         errors_found.append(cmd_result.get('command', ''))
@@ -114,12 +128,21 @@ def execute_configuration_step(step):
                     print(f"\n⚠ ERRORS detected in {len(errors_found)} command(s)")
                     for cmd in errors_found:
                         print(f"  - {cmd}")
+                    rollback = result.get('execution', {}).get('rollback')
+                    if rollback:
+                        state = "restored" if rollback.get('success') else "NOT restored"
+                        print(f"  Configuration {state} by {rollback.get('method')} "
+                              f"in {rollback.get('elapsed', 0):.2f}s")
                     return False
                 else:
                     print(f"\n✓ Step completed successfully")
                     return True
             else:
-                print(f"\n✗ Execution failed")
+                print(f"\n✗ Execution failed: {result.get('execution_error') or 'unknown error'}")
+                rollback = result.get('execution', {}).get('rollback')
+                if rollback:
+                    state = "restored" if rollback.get('success') else "NOT restored"
+                    print(f"  Configuration {state} by {rollback.get('method')}")
                 return False
         else:
             print(f"\n✗ Server error: HTTP {response.status_code}")